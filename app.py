@@ -1,50 +1,125 @@
-from flask import Flask, render_template, request, jsonify
+import json
+import time
+from flask import Flask, g, render_template, request, jsonify, Response, stream_with_context
+from engine import metrics
 from engine.query_parser import parse_query
 from engine.retriever import retrieve_clauses
-from engine.reasoner import decide
+from engine.reasoner import decide, stream_llm_reasoning, preload, rule_fast_path
+from engine.batch_runner import process_batch, record_error
+from engine.alternate_policy_recommender import AlternativesClient
 from engine.formatter import format_response
-from engine.session_manager import get_session_context, update_session
+from engine.session_manager import get_session_context, resolve_session, update_session
 from engine.db import log_user_query
-import requests
-
-# Optional: Load in-memory plan data if needed for UI fallback
-from utils.load_data import load_plan_data
-plan_df, rate_df, benefits_df = load_plan_data()
+from engine.partitions import PARTITION_FIELDS
+from config import Config
 
 app = Flask(__name__)
 
-# External alternate policy API URL
-ALT_API_URL = "https://bajaj-alianz-health-insurance-lznkjuhdddi3v9weyxgshc.streamlit.app/api/alternatives"
+# With `gunicorn --preload` (see gunicorn.conf.py) weights load once in the
+# master and forked workers share them copy-on-write
+if Config.PRELOAD_MODELS:
+    preload()
+
+# Pooled, cached, circuit-broken client for the external alternate policy API
+alternatives = AlternativesClient()
+
+# Per-request stage timings (Server-Timing header, "debug" field) and /metrics.
+# Each gunicorn worker keeps its own registry; scrape workers individually.
+if metrics.ENABLED:
+    metrics.register_collector("alternatives", alternatives.stats)
+
+    @app.before_request
+    def begin_request_trace():
+        g.request_started = time.perf_counter()
+        g.trace = metrics.begin_trace()
+
+    @app.after_request
+    def finish_request_trace(response):
+        endpoint, started = request.endpoint or "unknown", g.request_started
+        if g.trace.stages:
+            response.headers["Server-Timing"] = g.trace.server_timing()
+
+        def record():  # after the body is sent, so streamed responses count in full
+            metrics.observe("policy_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+            metrics.inc("policy_requests_total", endpoint=endpoint, status=response.status_code)
+        response.call_on_close(record)
+        return response
+
+SESSION_COOKIE = "session_id"
+
+def current_session() -> str:
+    """
+    Session ID from the cookie, an X-Session-ID header or "session_id" in the
+    JSON body. Unknown or expired IDs get a new session, sent back as a cookie.
+    """
+    body = request.get_json(silent=True) if request.is_json else None
+    candidate = (request.cookies.get(SESSION_COOKIE) or request.headers.get("X-Session-ID")
+                 or (body or {}).get("session_id"))
+    session_id, created = resolve_session(candidate)
+    g.session_id, g.new_session = session_id, created
+    return session_id
+
+@app.after_request
+def set_session_cookie(response):
+    if g.get("new_session"):
+        response.set_cookie(SESSION_COOKIE, g.session_id, max_age=Config.SESSION_TTL_MINUTES * 60,
+                            httponly=True, samesite="Lax")
+    return response
+
+def request_timings():
+    trace = metrics.current_trace()
+    return trace.to_dict() if trace else None
+
+def json_object():
+    """The JSON request body if it is an object, else None (answered with a 400)."""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+def filters_error(filters):
+    """Why `filters` is not a valid retrieval filter, or None when it is (or absent)."""
+    if filters is None:
+        return None
+    if not isinstance(filters, dict):
+        return f"filters must be an object with fields {list(PARTITION_FIELDS)}"
+    unknown = sorted(str(field) for field in filters if field not in PARTITION_FIELDS)
+    if unknown:
+        return f"Unknown filter fields {unknown}, allowed: {list(PARTITION_FIELDS)}"
+    for field, value in filters.items():
+        if not (value is None or isinstance(value, str)
+                or isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            return f"Filter '{field}' must be a string or a list of strings"
+    return None
 
 def fetch_alternates_from_external(parsed):
-    try:
-        payload = {
-            "age": parsed.get("age"),
-            "state": parsed.get("location"),
-            "coverage": parsed.get("coverage", 30000),
-            "plan_type": parsed.get("plan_type", "Any")
-        }
-        res = requests.post(ALT_API_URL, json=payload, timeout=10)
-        if res.status_code == 200:
-            return res.json().get("plans", [])
-        else:
-            print(f"⚠️ Failed to fetch alternates from external recommender. Status: {res.status_code}")
-            return []
-    except Exception as e:
-        print("❌ Error fetching external alternatives:", e)
-        return []
+    return alternatives.fetch(parsed)
+
+SUGGESTIONS_MODES = ("sync", "deferred")
+
+def suggestions_for(decision, parsed, mode):
+    """
+    (suggestions, token) for a decision. "sync" waits for the lookup
+    (bounded by ALT_API_TIMEOUT_SECONDS); "deferred" starts it in the
+    background and returns a token for GET /api/suggestions/<token>. The
+    token is only known to this worker, so deferred mode needs a single
+    worker or sticky routing; elsewhere the poll answers "unknown".
+    """
+    if decision.get("decision", "").lower() != "rejected":
+        return [], None
+    if mode == "deferred":
+        return None, alternatives.defer(parsed)
+    return fetch_alternates_from_external(parsed), None
 
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
         user_query = request.form.get("query", "")
-        session_id = request.remote_addr
+        session_id = current_session()
 
         parsed = parse_query(user_query)
         matched_clauses = retrieve_clauses(parsed)
         decision = decide(parsed, matched_clauses)
         response_json = format_response(user_query, parsed, matched_clauses, decision)
-        log_user_query(session_id, user_query, response_json)
+        log_user_query(session_id, user_query, dict(decision, parsed=parsed, matched_clauses=matched_clauses))
         update_session(session_id, user_query, response_json)
 
         alt_suggestions = []
@@ -57,30 +132,159 @@ def index():
 
 @app.route("/api/query", methods=["POST"])
 def api_query():
-    data = request.json
+    """
+    Body: {"query": ..., "filters": {"doc_type"|"source"|"insurer": value or list},
+    "suggestions_mode": "sync" | "deferred", "debug": bool}. Filters are optional
+    and restrict retrieval to the matching documents (other fields are a 400);
+    the mode defaults to ALT_SUGGESTIONS_MODE. Queries an explicit policy rule
+    answers skip retrieval and the LLM. With "debug", per-stage timings and token counts are returned.
+    """
+    data = json_object()
+    if data is None:
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    error = filters_error(data.get("filters"))
+    if error:
+        return jsonify({"error": error}), 400
+    suggestions_mode = data.get("suggestions_mode", Config.ALT_SUGGESTIONS_MODE)
+    if suggestions_mode not in SUGGESTIONS_MODES:
+        return jsonify({"error": f"suggestions_mode must be one of {list(SUGGESTIONS_MODES)}"}), 400
     user_query = data.get("query", "")
-    session_id = request.remote_addr
+    session_id = current_session()
 
     parsed = parse_query(user_query)
-    matched_clauses = retrieve_clauses(parsed)
-    decision = decide(parsed, matched_clauses)
+    decision = rule_fast_path(user_query, parsed, data.get("filters"))
+    if decision:
+        matched_clauses = decision["matched_clauses"]
+    else:
+        matched_clauses = retrieve_clauses(parsed, filters=data.get("filters"))
+        decision = decide(parsed, matched_clauses)
     response_json = format_response(user_query, parsed, matched_clauses, decision)
-    log_user_query(session_id, user_query, response_json)
+    log_user_query(session_id, user_query, dict(decision, parsed=parsed, matched_clauses=matched_clauses))
     update_session(session_id, user_query, response_json)
 
-    alt_suggestions = []
-    if decision.get("decision", "").lower() == "rejected":
-        alt_suggestions = fetch_alternates_from_external(parsed)
+    alt_suggestions, suggestions_token = suggestions_for(decision, parsed, suggestions_mode)
 
-    return jsonify({
+    payload = {
         "response": response_json,
-        "suggestions": alt_suggestions
-    })
+        "suggestions": alt_suggestions,
+        "suggestions_token": suggestions_token,
+        "cache": decision.get("cache"),
+        "path": decision.get("path", "llm"),
+        "session_id": session_id
+    }
+    if data.get("debug"):
+        payload["timings"] = request_timings()
+    return jsonify(payload)
+
+@app.route("/api/suggestions/<token>", methods=["GET"])
+def api_suggestions(token):
+    """
+    Follow-up for deferred suggestions: {"status": "pending" | "ready" | "unknown", "plans": [...]}.
+    "unknown" also covers a token issued by another worker (see `suggestions_for`).
+    """
+    return jsonify(alternatives.poll(token))
+
+def sse_event(event: str, payload) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+@app.route("/api/query/stream", methods=["POST"])
+def api_query_stream():
+    """
+    Server-Sent Events version of /api/query: `parsed` and `clauses` are sent
+    immediately, then one `token` event per decoded piece, then `decision`
+    (with time-to-first-token stats) and finally `suggestions` if rejected.
+    A claim the rule index answers gets no `token` events, as on /api/query.
+    """
+    data = json_object()
+    if data is None:
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    error = filters_error(data.get("filters"))
+    if error:
+        return jsonify({"error": error}), 400
+    user_query = data.get("query", "")
+    session_id = current_session()
+
+    parsed = parse_query(user_query)
+    fast_decision = rule_fast_path(user_query, parsed, data.get("filters"))
+    if fast_decision:
+        matched_clauses = fast_decision["matched_clauses"]
+    else:
+        matched_clauses = retrieve_clauses(parsed, filters=data.get("filters"))
+
+    def events():
+        yield sse_event("parsed", parsed)
+        yield sse_event("clauses", matched_clauses)
+
+        decision = fast_decision or {}
+        if not fast_decision:
+            for kind, payload in stream_llm_reasoning(parsed, matched_clauses):
+                if kind == "token":
+                    yield sse_event("token", {"text": payload})
+                else:
+                    decision = payload
+
+        response_json = format_response(user_query, parsed, matched_clauses, decision)
+        yield sse_event("decision", {"response": response_json, "cache": decision.get("cache"),
+                                     "path": decision.get("path", "llm"), "stats": decision.get("stats"),
+                                     "timings": request_timings()})
+        log_user_query(session_id, user_query, dict(decision, parsed=parsed, matched_clauses=matched_clauses))
+        update_session(session_id, user_query, response_json)
+
+        if decision.get("decision", "").lower() == "rejected":
+            yield sse_event("suggestions", fetch_alternates_from_external(parsed))
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/api/batch", methods=["POST"])
+def api_batch():
+    """
+    Body: {"queries": ["query text" | {"id": ..., "query": ..., "filters": {...}}, ...]}.
+    Claims are parsed, embedded, searched and decided BATCH_SIZE at a time;
+    results stream back as JSON lines (in input order) as each batch finishes.
+    """
+    data = json_object()
+    if data is None or not isinstance(data.get("queries", []), list):
+        return jsonify({"error": 'Body must be an object with a "queries" list'}), 400
+    queries = data.get("queries", [])
+    if len(queries) > Config.BATCH_MAX_QUERIES:
+        return jsonify({"error": f"At most {Config.BATCH_MAX_QUERIES} queries per batch"}), 400
+    # Everything is checked up front: a bad item must not abort the stream half way
+    records = []
+    for i, item in enumerate(queries):
+        error = record_error(item)
+        if error:
+            return jsonify({"error": f"Query {i}: {error}"}), 400
+        record = {"query": item} if isinstance(item, str) else dict(item)
+        record.setdefault("id", i)
+        error = filters_error(record.get("filters"))
+        if error:
+            return jsonify({"error": f"Query {record['id']}: {error}"}), 400
+        records.append(record)
+    session_id = current_session()
+
+    def results():
+        for start in range(0, len(records), Config.BATCH_SIZE):
+            for result in process_batch(records[start:start + Config.BATCH_SIZE]):
+                log_user_query(session_id, result["query"], result)
+                yield json.dumps(result, default=str) + "\n"
+
+    return Response(stream_with_context(results()), mimetype="application/x-ndjson")
 
 @app.route("/api/context", methods=["GET"])
 def api_context():
-    session_id = request.remote_addr
+    session_id = current_session()
     return jsonify(get_session_context(session_id))
 
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape target: stage/request histograms, LLM token counters, cache gauges."""
+    if not metrics.ENABLED:
+        return Response("metrics disabled\n", status=404, content_type="text/plain")
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     app.run(debug=True)
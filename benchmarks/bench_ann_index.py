@@ -0,0 +1,84 @@
+"""
+Recall@k against the exact (flat) index plus p50/p99 single-query search
+latency and serialized size for every FAISS_INDEX_TYPE.
+
+Uses the vectors of the current index (--from-index) or a synthetic,
+clustered corpus so results are reproducible without documents.
+
+    python -m benchmarks.bench_ann_index --vectors 100000 --k 5
+    python -m benchmarks.bench_ann_index --from-index data/embeddings/faiss_index
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+from config import Config
+from engine.faiss_index import INDEX_TYPES, build_index, default_index_params, make_search_params
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors.astype(np.float32)
+
+def vectors_from_index(path: str) -> np.ndarray:
+    index = faiss.read_index(path)
+    ids = faiss.vector_to_array(index.id_map) if hasattr(index, "id_map") else np.arange(index.ntotal)
+    return np.vstack([index.reconstruct(int(i)) for i in ids]).astype(np.float32)
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / (len(truth) * k)
+
+def search_latencies(index, queries: np.ndarray, k: int, params) -> (np.ndarray, np.ndarray):
+    found = np.empty((len(queries), k), dtype="int64")
+    latencies = np.empty(len(queries))
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k, params=params)
+        latencies[i] = time.perf_counter() - start
+        found[i] = ids[0]
+    return found, latencies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=Config.EMBEDDING_DIM)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--from-index", help="benchmark on the vectors of an existing flat index")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+
+    corpus = vectors_from_index(args.from_index) if args.from_index else synthetic_vectors(args.vectors, args.dim)
+    rng = np.random.default_rng(1)
+    queries = corpus[rng.choice(len(corpus), args.queries)] + 0.05 * rng.standard_normal((args.queries, corpus.shape[1]), dtype=np.float32)
+    queries = queries.astype(np.float32)
+    ids = np.arange(len(corpus), dtype="int64")
+
+    print(f"📊 {len(corpus)} vectors x {corpus.shape[1]} dims, {args.queries} queries, k={args.k}")
+    truth = None
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        index, params = build_index(corpus, ids, default_index_params(index_type))
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        if index_type in ("ivf_flat", "ivf_pq"):
+            sweep = [("nprobe", v, make_search_params(index, nprobe=v)) for v in args.nprobe]
+        elif index_type == "hnsw":
+            sweep = [("efSearch", v, make_search_params(index, ef_search=v)) for v in args.ef_search]
+        else:
+            sweep = [("-", "", None)]
+
+        for knob, value, search_params in sweep:
+            found, latencies = search_latencies(index, queries, args.k, search_params)
+            if truth is None:
+                truth = found
+            print(
+                f"{index_type:9s} {knob:>8s}={str(value):4s} recall@{args.k}={recall_at_k(truth, found):.3f} "
+                f"p50={np.percentile(latencies, 50) * 1e3:.3f}ms p99={np.percentile(latencies, 99) * 1e3:.3f}ms "
+                f"size={size_mb:.1f}MB build={build_seconds:.1f}s"
+            )
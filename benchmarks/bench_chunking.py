@@ -0,0 +1,79 @@
+"""
+Peak memory, time and chunk quality of the streaming clause-aware chunker
+vs. the previous whole-document path (join all pages, split on whitespace,
+500/100-word windows) on synthetic numbered policy PDFs of growing length.
+Each run is a fresh process; peak memory is traced Python allocations.
+
+    python -m benchmarks.bench_chunking --clauses 100 400 1600
+"""
+import os
+import re
+import time
+import argparse
+import tempfile
+import tracemalloc
+from multiprocessing import get_context
+from pdfplumber import open as pdf_open
+from config import Config
+from benchmarks.synthetic import numbered_clauses, write_pdf
+from indexer.chunking import count_tokens, get_chunk_tokenizer, iter_document_chunks
+
+SENTENCE_FINAL = re.compile(r"[.;:!?]$")
+
+def legacy_chunks(path: str, chunk_size: int = 500, overlap: int = 100):
+    with pdf_open(path) as pdf:
+        text = "\n".join([page.extract_text() or "" for page in pdf.pages])
+    tokens = text.split()
+    return [{"text": " ".join(tokens[i:i + chunk_size])} for i in range(0, len(tokens), chunk_size - overlap)]
+
+def streaming_chunks(path: str):
+    return list(iter_document_chunks(path, Config.CHUNK_SIZE, Config.OVERLAP_SIZE))
+
+def _measure(mode: str, path: str, max_seq_length: int, results):
+    tokenizer = get_chunk_tokenizer()  # loaded before tracing: shared by both modes
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = legacy_chunks(path) if mode == "legacy" else streaming_chunks(path)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    lengths = [count_tokens(tokenizer, chunk["text"]) for chunk in chunks]
+    results.put({
+        "chunks": len(chunks),
+        "seconds": seconds,
+        "peak_mib": peak / 2**20,
+        "mid_sentence": sum(not SENTENCE_FINAL.search(chunk["text"]) for chunk in chunks) / max(len(chunks), 1),
+        "truncated": sum(n > max_seq_length for n in lengths) / max(len(lengths), 1),
+        "paged": sum("page_start" in chunk for chunk in chunks),
+    })
+
+def measure(mode: str, path: str, max_seq_length: int) -> dict:
+    ctx = get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(mode, path, max_seq_length, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clauses", type=int, nargs="+", default=[100, 400, 1600], help="clauses per document")
+    parser.add_argument("--max-seq-length", type=int, default=256, help="embedder input limit (tokens)")
+    args = parser.parse_args()
+
+    print(f"📊 Chunking: CHUNK_SIZE={Config.CHUNK_SIZE} tokens, OVERLAP_SIZE={Config.OVERLAP_SIZE}, "
+          f"tokenizer {Config.CHUNK_TOKENIZER}")
+    with tempfile.TemporaryDirectory(prefix="chunk-bench-") as directory:
+        for n in args.clauses:
+            path = os.path.join(directory, f"policy-{n}.pdf")
+            write_pdf(path, numbered_clauses(n))
+            with pdf_open(path) as pdf:
+                pages = len(pdf.pages)
+            print(f"   {n} clauses, {pages} pages, {os.path.getsize(path) / 2**20:.1f} MiB")
+            for mode in ("legacy", "streaming"):
+                r = measure(mode, path, args.max_seq_length)
+                print(f"      {mode:10s} {r['chunks']:5d} chunks  {r['seconds']:7.2f}s  peak {r['peak_mib']:7.1f} MiB  "
+                      f"mid-sentence {r['mid_sentence']:4.0%}  over {args.max_seq_length} tokens {r['truncated']:4.0%}  "
+                      f"with pages {r['paged']}")
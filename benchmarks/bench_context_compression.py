@@ -0,0 +1,63 @@
+"""
+Prompt tokens, compression time, LLM latency and decision agreement of
+compressed vs. uncompressed prompts over a fixed query set, using the real
+index and models. Decoding is greedy so the two runs are comparable.
+
+    python -m benchmarks.bench_context_compression --budgets 256 512 768 --top-k 5
+"""
+import argparse
+import time
+import numpy as np
+from engine.query_parser import parse_query
+from engine.retriever import retrieve_clauses
+from engine.reasoner import build_prompt, compress_context, get_llm, parse_llm_output
+
+QUERIES = [
+    "46M, knee surgery in Pune, 3-month policy",
+    "32 year old female, maternity hospitalization in Mumbai, 2 year policy",
+    "61M, kidney transplant in Delhi, 6 months policy",
+    "25F, MRI scan in Chennai, 1 year policy",
+    "54M, cataract surgery in Kolkata, 30 days policy",
+    "40F, dental treatment in Bangalore, 18 months policy",
+]
+
+def run(llm, parsed, clauses, max_tokens):
+    prompt = build_prompt(parsed, clauses)
+    prompt_tokens = len(llm.tokenizer(prompt)["input_ids"])
+    start = time.perf_counter()
+    output = llm.generate(prompt, max_tokens, temperature=0)
+    decision = str(parse_llm_output(output).get("decision", "unknown")).lower()
+    return prompt_tokens, time.perf_counter() - start, decision
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[256, 512, 768])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    args = parser.parse_args()
+
+    llm = get_llm()
+    cases = []
+    for query in QUERIES:
+        parsed = parse_query(query)
+        cases.append((parsed, retrieve_clauses(parsed, top_k=args.top_k)))
+
+    baseline = [run(llm, parsed, clauses, args.max_tokens) for parsed, clauses in cases]
+    print("\n📊 Context compression report")
+    print(f"   full      prompt {np.mean([b[0] for b in baseline]):7.0f} tokens  "
+          f"LLM {np.mean([b[1] for b in baseline]):6.2f}s")
+
+    for budget in args.budgets:
+        tokens, compress_ms, llm_seconds, agree = [], [], [], 0
+        for (parsed, clauses), (_, _, full_decision) in zip(cases, baseline):
+            start = time.perf_counter()
+            compressed = compress_context(parsed, clauses, token_budget=budget)
+            compress_ms.append((time.perf_counter() - start) * 1000)
+            prompt_tokens, seconds, decision = run(llm, parsed, compressed, args.max_tokens)
+            tokens.append(prompt_tokens)
+            llm_seconds.append(seconds)
+            agree += decision == full_decision
+        print(
+            f"   budget={budget:<4d} prompt {np.mean(tokens):7.0f} tokens  LLM {np.mean(llm_seconds):6.2f}s  "
+            f"compression {np.mean(compress_ms):6.1f}ms  agreement {agree}/{len(cases)}"
+        )
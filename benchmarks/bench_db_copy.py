@@ -0,0 +1,52 @@
+"""
+Rows/sec of the binary COPY loader vs. the row-at-a-time INSERT loop.
+
+Needs a reachable PostgreSQL with pgvector (see DB_* in .env). Rows go into a
+temporary copy of `indexed_chunks`, so nothing persists.
+
+    python -m benchmarks.bench_db_copy --rows 20000
+"""
+import argparse
+import time
+import numpy as np
+from config import Config
+from engine.db import get_connection, _insert_chunks, _copy_chunks
+
+def make_rows(n: int, dim: int):
+    rng = np.random.default_rng(0)
+    words = ["waiting", "period", "exclusion", "sub-limit", "hospitalisation", "clause", "surgery", "policy"]
+    metadata = [
+        {
+            "source": f"POLICY{i % 50:04d}.pdf",
+            "doc_type": "policy",
+            "chunk_id": i,
+            "text": " ".join(rng.choice(words, size=Config.CHUNK_SIZE))
+        }
+        for i in range(n)
+    ]
+    return metadata, rng.standard_normal((n, dim), dtype=np.float32)
+
+def time_loader(loader, metadata, embeddings) -> float:
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE bench_chunks (LIKE indexed_chunks INCLUDING DEFAULTS);")
+            cur.execute(f"ALTER TABLE bench_chunks ALTER COLUMN embedding TYPE VECTOR({embeddings.shape[1]});")
+            start = time.perf_counter()
+            loader(cur, metadata, embeddings, table="bench_chunks")
+            conn.commit()
+            elapsed = time.perf_counter() - start
+            cur.execute("DROP TABLE bench_chunks;")
+        conn.commit()
+    return elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=Config.EMBEDDING_DIM)
+    args = parser.parse_args()
+
+    metadata, embeddings = make_rows(args.rows, args.dim)
+
+    for name, loader in [("insert loop", _insert_chunks), ("binary COPY", _copy_chunks)]:
+        elapsed = time_loader(loader, metadata, embeddings)
+        print(f"⏱️ {name:12s}: {args.rows} rows in {elapsed:.2f}s ({args.rows / elapsed:,.0f} rows/s)")
@@ -0,0 +1,116 @@
+"""
+Per-worker memory and time-to-ready of FAISS_LOAD_MODE=read (every worker
+reads a private copy of the index) vs. mmap (workers share the file through
+the page cache), plus the time each worker takes to hot-reload after the
+indexer publishes a new version. Uses a synthetic published index; Linux
+only (reads /proc/self/smaps_rollup). The page cache is warmed first, so
+both modes load from memory.
+
+    python -m benchmarks.bench_index_loading --vectors 200000 --workers 4 --types flat ivf_flat
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import faiss
+import numpy as np
+from multiprocessing import get_context
+from config import Config
+from engine.chunk_store import ChunkStore, write_chunk_store
+from engine.faiss_index import INDEX_TYPES, build_index, default_index_params
+from engine.partitions import build_partitions, write_partitions
+from engine.rule_index import extract_rules, write_rule_index
+
+def memory_mb() -> dict:
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                values[key.lower()] = int(rest.split()[0]) / 1024
+    return {"rss": values["rss"], "pss": values["pss"], "private": values["private_clean"] + values["private_dirty"]}
+
+def publish(directory: str, index, count: int, version: int, index_type: str):
+    """Writes the files publish_index would, metadata first and manifest last."""
+    write_chunk_store([{"text": f"clause {i}", "source": f"doc{i % 50}.pdf", "doc_type": "policy", "chunk_id": i}
+                       for i in range(count)], os.path.join(directory, "chunks.tmp"), version)
+    os.replace(os.path.join(directory, "chunks.tmp"), os.path.join(directory, "chunk_store.bin"))
+    store = ChunkStore(os.path.join(directory, "chunk_store.bin"))
+    write_partitions(build_partitions(store), count, os.path.join(directory, "partitions.npz"))
+    write_rule_index(extract_rules(store), count, os.path.join(directory, "rule_index.json"))
+    store.close()
+    faiss.write_index(index, os.path.join(directory, "index.tmp"))
+    os.replace(os.path.join(directory, "index.tmp"), os.path.join(directory, "faiss_index"))
+    with open(os.path.join(directory, "manifest.tmp"), "w", encoding="utf-8") as f:
+        json.dump({"version": version, "ntotal": int(index.ntotal), "next_id": count,
+                   "index_params": {"type": index_type}, "files": {}}, f)
+    os.replace(os.path.join(directory, "manifest.tmp"), os.path.join(directory, "manifest.json"))
+
+def _worker(queries, barrier, results):
+    start = time.perf_counter()
+    from engine import retriever
+    retriever.reload_if_published()  # the first call loads the current version
+    ready = time.perf_counter() - start
+    load = retriever.index_stats()["load_seconds"]
+    retriever.SNAPSHOT.index.search(queries, 5)  # touches every vector of a flat index
+    barrier.wait()  # measure while every worker is alive so PSS splits shared pages
+    stats = dict(memory_mb(), ready=ready, load=load, mapped=retriever.index_stats()["mapped"])
+    barrier.wait()
+
+    while retriever.SNAPSHOT.version < 2:  # the parent publishes version 2 now
+        time.sleep(0.01)
+        retriever.reload_if_published()
+    stats["reload"] = retriever.index_stats()["load_seconds"]
+    results.put(stats)
+
+def measure(directory: str, mode: str, workers: int, index, count: int, index_type: str):
+    os.environ.update(FAISS_LOAD_MODE=mode, INDEX_RELOAD_SECONDS="0",
+                      FAISS_INDEX_PATH=os.path.join(directory, "faiss_index"),
+                      CHUNK_METADATA_PATH=os.path.join(directory, "chunk_store.bin"),
+                      INDEX_MANIFEST_PATH=os.path.join(directory, "manifest.json"),
+                      PARTITIONS_PATH=os.path.join(directory, "partitions.npz"),
+                      RULE_INDEX_PATH=os.path.join(directory, "rule_index.json"))
+    publish(directory, index, count, 1, index_type)
+    for name in ("faiss_index", "chunk_store.bin"):  # warm the page cache
+        with open(os.path.join(directory, name), "rb") as f:
+            while f.read(1 << 24):
+                pass
+
+    ctx = get_context("spawn")  # children read the environment above into Config
+    barrier = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    queries = np.random.default_rng(1).standard_normal((8, index.d)).astype("float32")
+    procs = [ctx.Process(target=_worker, args=(queries, barrier, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    barrier.wait()
+    barrier.wait()
+    publish(directory, index, count, 2, index_type)
+    stats = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--types", nargs="+", default=["flat", "ivf_flat"], choices=list(INDEX_TYPES))
+    args = parser.parse_args()
+
+    vectors = np.random.default_rng(0).standard_normal((args.vectors, Config.EMBEDDING_DIM)).astype("float32")
+    for index_type in args.types:
+        index, _ = build_index(vectors, np.arange(len(vectors)), default_index_params(index_type))
+        with tempfile.TemporaryDirectory(prefix="index-load-bench-") as directory:
+            publish(directory, index, len(vectors), 1, index_type)
+            size = os.path.getsize(os.path.join(directory, "faiss_index")) / 2**20
+            print(f"📊 {index_type}: {args.vectors} vectors, {size:.0f}MB index, {args.workers} workers")
+            for mode in ("read", "mmap"):
+                stats = measure(directory, mode, args.workers, index, len(vectors), index_type)
+                for i, s in enumerate(stats):
+                    print(f"   {mode:4s} worker {i}: ready {s['ready']:5.2f}s (index files {s['load'] * 1000:6.1f}ms)  "
+                          f"rss {s['rss']:5.0f}MB  pss {s['pss']:5.0f}MB  private {s['private']:5.0f}MB  "
+                          f"mapped {s['mapped']}  hot reload {s['reload'] * 1000:6.1f}ms")
+                print(f"   {mode:4s} total PSS {sum(s['pss'] for s in stats):.0f}MB, "
+                      f"private {sum(s['private'] for s in stats):.0f}MB")
@@ -0,0 +1,64 @@
+"""
+Throughput vs. latency of direct LocalLLM.generate calls and the
+micro-batching BatchScheduler at several concurrency levels.
+
+    python -m benchmarks.bench_llm_batching --concurrency 1 2 4 8 --requests 16 --max-tokens 64
+"""
+import argparse
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from engine.llm_local_runner import LocalLLM, BatchScheduler
+
+PROMPT = (
+    "A user has the following details:\n"
+    "Age: {age}, Procedure: knee surgery, Location: Pune, Policy Age: 3 months.\n\n"
+    "Respond in JSON format with keys: decision, amount, justification."
+)
+
+def run_load(call, concurrency: int, requests: int):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        call(PROMPT.format(age=20 + i % 50))
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return time.perf_counter() - start, np.array(latencies)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--max-batch", type=int, default=Config.LLM_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=Config.LLM_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    llm = LocalLLM()
+    scheduler = BatchScheduler(llm, args.max_batch, args.max_wait_ms)
+    modes = {
+        "direct": lambda prompt: llm.generate(prompt, max_tokens=args.max_tokens),
+        "batched": lambda prompt: scheduler.generate(prompt, max_tokens=args.max_tokens),
+    }
+
+    results = []
+    for concurrency in args.concurrency:
+        for mode, call in modes.items():
+            elapsed, latencies = run_load(call, concurrency, args.requests)
+            results.append(
+                f"{mode:8s} c={concurrency:<3d} {args.requests / elapsed:6.2f} req/s "
+                f"p50={np.percentile(latencies, 50):.2f}s p99={np.percentile(latencies, 99):.2f}s"
+            )
+
+    print("\n📊 Results")
+    print(f"   batches={scheduler.batches} avg size={scheduler.requests / max(scheduler.batches, 1):.2f}")
+    for line in results:
+        print("  ", line)
@@ -0,0 +1,52 @@
+"""
+Query latency of unfiltered vs. partition-filtered FAISS search as the
+corpus grows, on synthetic vectors spread over N insurer partitions.
+Filtered searches use the same ID selectors as retrieve_clauses.
+
+    python -m benchmarks.bench_partitions --sizes 10000 50000 200000 --partitions 20 --index-type flat
+"""
+import argparse
+import time
+import numpy as np
+from config import Config
+from engine.faiss_index import build_index, default_index_params, make_search_params, widened_search_params
+from engine.partitions import make_selector
+
+def timed_search(index, queries: np.ndarray, top_k: int, selector=None) -> float:
+    """Mean milliseconds per single-vector query (the retriever's access pattern)."""
+    start = time.perf_counter()
+    for query in queries:
+        params = make_search_params(index, selector=selector)
+        _, indices = index.search(query[None, :], top_k, params=params)
+        if selector is not None and (indices[0] >= 0).sum() < top_k:
+            index.search(query[None, :], top_k, params=widened_search_params(index, top_k, selector))
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--partitions", type=int, default=20)
+    parser.add_argument("--index-type", default=Config.FAISS_INDEX_TYPE)
+    parser.add_argument("--dim", type=int, default=Config.EMBEDDING_DIM)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim)).astype("float32")
+
+    print(f"📊 {args.index_type} index, {args.partitions} partitions, top_k={args.top_k}")
+    for n in args.sizes:
+        vectors = rng.standard_normal((n, args.dim)).astype("float32")
+        partition_of = rng.integers(0, args.partitions, n)
+        index, _ = build_index(vectors, np.arange(n), default_index_params(args.index_type))
+
+        one = make_selector(np.flatnonzero(partition_of == 0))
+        several = make_selector(np.flatnonzero(partition_of < max(1, args.partitions // 4)))
+        unfiltered = timed_search(index, queries, args.top_k)
+        filtered_one = timed_search(index, queries, args.top_k, one)
+        filtered_quarter = timed_search(index, queries, args.top_k, several)
+        print(
+            f"   n={n:<8d} unfiltered {unfiltered:7.3f}ms  one partition {filtered_one:7.3f}ms  "
+            f"quarter of partitions {filtered_quarter:7.3f}ms"
+        )
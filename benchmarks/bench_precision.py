@@ -0,0 +1,86 @@
+"""
+Tokens/sec, peak RSS and decision agreement with fp32 for each LLM_PRECISION
+mode over a fixed query set. Each mode runs in its own process so peak RSS
+is not polluted by the previous model. Decoding is greedy for comparability.
+
+    python -m benchmarks.bench_precision --modes fp32 bf16 int8 --max-tokens 128
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+QUERIES = [
+    {"age": 46, "procedure": "surgery", "location": "Pune", "policy_duration": "3 months"},
+    {"age": 32, "procedure": "hospitalization", "location": "Mumbai", "policy_duration": "2 years"},
+    {"age": 61, "procedure": "transplant", "location": "Delhi", "policy_duration": "6 months"},
+    {"age": 25, "procedure": "scan", "location": "Chennai", "policy_duration": "1 year"},
+    {"age": 54, "procedure": "therapy", "location": "Kolkata", "policy_duration": "30 days"},
+]
+
+CLAUSES = [
+    {"text": "Any disease contracted within 30 days of the policy start date is excluded, except accidents."},
+    {"text": "Joint replacement and other named surgeries have a waiting period of 24 months."},
+    {"text": "Organ donor expenses are covered up to the sum insured for the recipient's transplant."},
+    {"text": "Diagnostic scans are payable only when followed by in-patient hospitalisation."},
+]
+
+def run_mode(mode: str, max_tokens: int) -> dict:
+    """Runs inside a child process with LLM_PRECISION already applied."""
+    from engine.llm_local_runner import LocalLLM
+    from engine.reasoner import build_prompt, parse_llm_output, PROMPT_PREFIX
+
+    start = time.perf_counter()
+    llm = LocalLLM(precision=mode)
+    llm.cache_prefix(PROMPT_PREFIX)
+    load_seconds = time.perf_counter() - start
+
+    decisions, generated, seconds = [], 0, 0.0
+    for parsed in QUERIES:
+        prompt = build_prompt(parsed, CLAUSES)
+        start = time.perf_counter()
+        output = llm.generate(prompt, max_tokens, temperature=0)
+        seconds += time.perf_counter() - start
+        generated += len(llm.tokenizer(output, add_special_tokens=False)["input_ids"])
+        decisions.append(str(parse_llm_output(output).get("decision", "unknown")).lower())
+
+    return {
+        "mode": mode,
+        "load_seconds": load_seconds,
+        "tokens_per_second": generated / seconds if seconds else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "decisions": decisions,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print("RESULT " + json.dumps(run_mode(args.child, args.max_tokens)))
+        sys.exit(0)
+
+    results = {}
+    for mode in args.modes:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_precision", "--child", mode, "--max-tokens", str(args.max_tokens)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        line = next(l for l in output.splitlines() if l.startswith("RESULT "))
+        results[mode] = json.loads(line[len("RESULT "):])
+
+    baseline = results.get("fp32", {}).get("decisions")
+    print("\n📊 Precision report")
+    for mode, r in results.items():
+        agreement = "n/a"
+        if baseline:
+            agreement = f"{sum(a == b for a, b in zip(baseline, r['decisions'])) / len(baseline):.0%}"
+        print(
+            f"   {mode:5s} load {r['load_seconds']:.1f}s  {r['tokens_per_second']:.1f} tok/s  "
+            f"peak RSS {r['peak_rss_mb']:.0f}MB  agreement vs fp32 {agreement}"
+        )
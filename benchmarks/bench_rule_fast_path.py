@@ -0,0 +1,44 @@
+"""
+Fast-path hit rate and per-path latency of reason_over_query over a query
+set, using the real index, rule index and models.
+
+    python -m benchmarks.bench_rule_fast_path --repeat 1
+"""
+import argparse
+import time
+import numpy as np
+from engine.reasoner import fast_path_stats, preload, reason_over_query
+
+QUERIES = [
+    "46M, knee replacement in Pune, 3-month policy",
+    "46M, knee surgery in Pune, 3-month policy",
+    "50F, cataract surgery in Delhi, 3 year policy",
+    "55M, hernia surgery in Jaipur, 6 months policy",
+    "30M, cosmetic surgery in Mumbai, 2 year policy",
+    "32 year old female, maternity hospitalization in Mumbai, 2 year policy",
+    "61M, kidney transplant in Delhi, 6 months policy",
+    "25F, MRI scan in Chennai, 1 year policy",
+    "40F, dental treatment in Bangalore, 18 months policy",
+    "38F, hysterectomy in Lucknow, 4 year policy",
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    preload()  # keep model/index loading out of the first query's latency
+    seconds = {"rules": [], "llm": []}
+    for _ in range(args.repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            result = reason_over_query(query)
+            seconds[result.get("path", "llm")].append(time.perf_counter() - start)
+            print(f"   {result.get('path', 'llm'):5s} {str(result['decision']):9s} {query}")
+
+    stats = fast_path_stats()
+    print("\n📊 Rule fast path report")
+    print(f"   hit rate {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']})")
+    for path, times in seconds.items():
+        if times:
+            print(f"   {path:5s} n={len(times):<3d} mean {np.mean(times) * 1000:9.1f}ms  p95 {np.percentile(times, 95) * 1000:9.1f}ms")
@@ -0,0 +1,125 @@
+"""
+Session read/append latency with several worker processes sharing one
+session backend, as gunicorn workers do. Each worker runs --threads threads
+that pick random sessions and either read the history (get_session_history)
+or append a turn (add_to_session). Afterwards a fresh process checks that
+every session shows the appends of all workers.
+
+    python -m benchmarks.bench_sessions --workers 4 --threads 8 --ops 2000 --read-ratio 0.8
+"""
+import os
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import numpy as np
+from collections import Counter
+from multiprocessing import get_context
+
+# label → environment for the workers (Config is read at import, in each child)
+CONFIGS = {
+    "sqlite": {"SESSION_BACKEND": "sqlite"},
+    "sqlite-nocache-sync": {"SESSION_BACKEND": "sqlite", "SESSION_CACHE_TTL_SECONDS": "0", "SESSION_FLUSH_MS": "0"},
+    "memory": {"SESSION_BACKEND": "memory"},
+}
+
+def _worker(n, session_ids, args, barrier, results):
+    from engine.session_manager import add_to_session, flush_sessions, get_session_history, get_store
+
+    store = get_store()
+    for session_id in session_ids:
+        store.create(session_id, time.time())  # no-op for sessions another worker created
+    barrier.wait()
+
+    reads, appends, counts = [], [], Counter()
+    lock = threading.Lock()
+
+    def run(thread):
+        rng = random.Random(n * 1000 + thread)
+        local_reads, local_appends, local_counts = [], [], Counter()
+        for i in range(args.ops // args.threads):
+            session_id = rng.choice(session_ids)
+            start = time.perf_counter()
+            if rng.random() < args.read_ratio:
+                get_session_history(session_id)
+                local_reads.append((time.perf_counter() - start) * 1000)
+            else:
+                add_to_session(session_id, f"worker {n} query {i}", {"decision": "approved", "amount": i})
+                local_appends.append((time.perf_counter() - start) * 1000)
+                local_counts[session_id] += 1
+        with lock:
+            reads.extend(local_reads)
+            appends.extend(local_appends)
+            counts.update(local_counts)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(t,)) for t in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    flush_sessions()
+    results.put({"seconds": time.perf_counter() - start, "reads": reads, "appends": appends, "counts": dict(counts)})
+
+def _check(session_ids, expected, results):
+    from engine.session_store import MAX_HISTORY
+    from engine.session_manager import get_store
+    store = get_store()
+    consistent = 0
+    for session_id in session_ids:
+        history = store.get(session_id, time.time()) or []
+        consistent += len(history) == min(MAX_HISTORY, expected.get(session_id, 0))
+    results.put(consistent)
+
+def percentiles(samples) -> str:
+    if not samples:
+        return "n/a"
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return f"p50 {p50:7.3f}ms p95 {p95:7.3f}ms p99 {p99:7.3f}ms"
+
+def run_config(label: str, args, directory: str) -> dict:
+    os.environ.update(CONFIGS[label], SESSION_DB_PATH=os.path.join(directory, f"{label}.sqlite"))
+    ctx = get_context("spawn")  # children import config with this environment
+    session_ids = [uuid.uuid4().hex for _ in range(args.sessions)]
+    barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_worker, args=(n, session_ids, args, barrier, results)) for n in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    stats = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    expected = Counter()
+    for s in stats:
+        expected.update(s["counts"])
+    checker = ctx.Process(target=_check, args=(session_ids, dict(expected), results))
+    checker.start()
+    consistent = results.get()
+    checker.join()
+
+    reads = [ms for s in stats for ms in s["reads"]]
+    appends = [ms for s in stats for ms in s["appends"]]
+    ops_per_second = (len(reads) + len(appends)) / max(s["seconds"] for s in stats)
+    return {"ops_per_second": ops_per_second, "reads": reads, "appends": appends, "consistent": consistent}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker")
+    parser.add_argument("--ops", type=int, default=2000, help="operations per worker")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--read-ratio", type=float, default=0.8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="session-bench-") as directory:
+        print(f"📊 Sessions: {args.workers} workers × {args.threads} threads, {args.ops} ops/worker, "
+              f"{args.sessions} sessions, {args.read_ratio:.0%} reads")
+        for label in args.configs:
+            r = run_config(label, args, directory)
+            print(f"   {label:20s} {r['ops_per_second']:9.0f} ops/s  consistent {r['consistent']}/{args.sessions}")
+            print(f"   {'':20s} read   {percentiles(r['reads'])}")
+            print(f"   {'':20s} append {percentiles(r['appends'])}")
@@ -0,0 +1,72 @@
+"""
+Startup cost of the serving stack: import time of engine.reasoner, time to
+ready (import + load + warmup), and RSS/PSS per worker when N workers load
+models independently vs. preload-then-fork (PSS shows the shared pages).
+Linux only (reads /proc/self/smaps_rollup).
+
+    python -m benchmarks.bench_startup --workers 4
+"""
+import argparse
+import subprocess
+import sys
+import time
+from multiprocessing import get_context
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import engine.reasoner; print(time.perf_counter() - t)"
+READY_SNIPPET = (
+    "import time; t = time.perf_counter(); import engine.reasoner as r; r.warmup(); "
+    "print(time.perf_counter() - t)"
+)
+
+def memory_mb() -> dict:
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key.lower()] = int(rest.split()[0]) / 1024
+    return values
+
+def timed_subprocess(snippet: str) -> float:
+    output = subprocess.run([sys.executable, "-c", snippet], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def _worker(barrier, results, preloaded: bool):
+    start = time.perf_counter()
+    from engine.reasoner import warmup
+    warmup()
+    ready = time.perf_counter() - start
+    barrier.wait()  # measure while every worker is alive so PSS splits shared pages
+    results.put(dict(memory_mb(), ready=ready, preloaded=preloaded))
+    barrier.wait()
+
+def measure_workers(n: int, preload: bool):
+    ctx = get_context("fork" if preload else "spawn")
+    if preload:
+        from engine.reasoner import preload as preload_models
+        preload_models()
+    barrier = ctx.Barrier(n)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_worker, args=(barrier, results, preload)) for _ in range(n)]
+    for worker in workers:
+        worker.start()
+    stats = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"⏱️ import engine.reasoner: {timed_subprocess(IMPORT_SNIPPET):.2f}s")
+    print(f"⏱️ time to ready (import + load + warmup): {timed_subprocess(READY_SNIPPET):.2f}s")
+
+    # Independent first: the preload run loads models into this process
+    for preload in (False, True):
+        stats = measure_workers(args.workers, preload)
+        label = "preload+fork" if preload else "independent"
+        for i, s in enumerate(stats):
+            print(f"   {label:12s} worker {i}: ready {s['ready']:.2f}s rss {s['rss']:.0f}MB pss {s['pss']:.0f}MB")
+        print(f"📊 {label}: total PSS {sum(s['pss'] for s in stats):.0f}MB across {args.workers} workers")
@@ -0,0 +1,113 @@
+"""
+Deterministic stand-ins used by the benchmark suite: a stub LocalLLM with a
+fixed latency model and an in-memory replacement for the Postgres writes.
+"""
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Iterator, List
+from config import Config
+from engine import metrics
+
+class WhitespaceTokenizer:
+    """The part of the HF tokenizer interface the reasoner uses (token counting)."""
+    eos_token_id = 0
+    pad_token_id = 0
+
+    def __call__(self, texts, add_special_tokens: bool = True, **kwargs):
+        if isinstance(texts, str):
+            return {"input_ids": [0] * len(texts.split())}
+        return {"input_ids": [[0] * len(text.split()) for text in texts]}
+
+class StubLLM:
+    """
+    Drop-in for LocalLLM. Every generate call sleeps `prefill_ms` plus
+    `token_ms` per output token (a batched call pays this once, like a
+    batched forward pass) and answers with a decision derived from a hash of
+    the prompt, so runs are reproducible.
+    """
+
+    def __init__(self, prefill_ms: float = 50, token_ms: float = 2, output_tokens: int = 40):
+        self.prefill = prefill_ms / 1000
+        self.per_token = token_ms / 1000
+        self.output_tokens = output_tokens
+        self.tokenizer = WhitespaceTokenizer()
+        self.calls = 0
+
+    def _answer(self, prompt: str) -> str:
+        digest = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        approved = digest % 3 != 0
+        return json.dumps({
+            "decision": "approved" if approved else "rejected",
+            "amount": (digest % 20 + 1) * 5000 if approved else None,
+            "justification": f"Stub decision {digest % 1000} for the retrieved clauses.",
+        })
+
+    def _run(self, prompts: List[str], traces: List = None) -> List[str]:
+        self.calls += 1
+        time.sleep(self.prefill)
+        time.sleep(self.per_token * self.output_tokens)
+        if metrics.ENABLED:
+            prompt_tokens = [len(p.split()) for p in prompts]
+            metrics.record_generation(self.prefill, self.per_token * self.output_tokens,
+                                      sum(prompt_tokens), self.output_tokens * len(prompts),
+                                      [(trace, n, self.output_tokens) for trace, n in zip(traces, prompt_tokens)]
+                                      if traces is not None else None)
+        return [self._answer(prompt) for prompt in prompts]
+
+    def cache_prefix(self, prefix: str):
+        pass
+
+    def generate(self, prompt: str, max_tokens: int = Config.MAX_TOKENS, temperature: float = Config.TEMPERATURE,
+                 reuse_prefix: bool = True, structured: str = None) -> str:
+        return self._run([prompt])[0]
+
+    def generate_batch(self, prompts: List[str], max_tokens: int = Config.MAX_TOKENS,
+                       temperature: float = Config.TEMPERATURE, structured: str = None,
+                       traces: List = None) -> List[str]:
+        return self._run(prompts, traces)
+
+    def stream(self, prompt: str, max_tokens: int = Config.MAX_TOKENS,
+               temperature: float = Config.TEMPERATURE, structured: str = None) -> Iterator[str]:
+        time.sleep(self.prefill)
+        words = self._answer(prompt).split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.per_token * self.output_tokens / len(words))
+            yield word if i == 0 else " " + word
+
+def install_stub_llm(llm: StubLLM):
+    """Makes reasoner.get_llm() return `llm` (the BatchScheduler then wraps it too)."""
+    from engine import reasoner
+    reasoner._llm = llm
+
+class InMemoryDB:
+    """Stand-in for Postgres. Indexed chunks and query-log rows are kept in process memory."""
+
+    def __init__(self):
+        self.chunks: Dict[str, List[Dict]] = {}
+        self.queries: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def replace_chunks(self, stale_sources, metadata_list: List[Dict], embeddings):
+        with self._lock:
+            for source in list(self.chunks) if stale_sources is None else stale_sources:  # None = full rebuild
+                self.chunks.pop(source, None)
+            for meta in metadata_list:
+                self.chunks.setdefault(meta["source"], []).append(meta)
+
+    def write_query_log(self, writer, batch: List[tuple]):
+        with self._lock:
+            self.queries.extend(batch)
+        writer.written += len(batch)
+
+    def install(self):
+        """Routes the indexer's chunk writes and the query-log writer here."""
+        import engine.db as db
+        db.replace_chunks_in_db = self.replace_chunks
+        db.QueryLogWriter._write = lambda writer, batch: self.write_query_log(writer, batch)
+        try:
+            import indexer.chunk_and_embed as indexer
+            indexer.replace_chunks_in_db = self.replace_chunks
+        except ImportError:
+            pass
@@ -0,0 +1,311 @@
+"""
+Reproducible benchmark and load-test suite. For every corpus size it writes
+a synthetic policy corpus, then measures indexing throughput (run_indexing),
+retrieval latency (retrieve_clauses, cold and embedding-cached) and finally
+/api/query throughput and tail latency under concurrent load. The end-to-end
+run uses a deterministic stub LLM and an in-memory stand-in for Postgres;
+the embedding model and FAISS index are real. Each phase runs in a child
+process working in its own directory, so runs do not share caches.
+Engine settings come from the environment as usual (e.g. FAISS_INDEX_TYPE,
+RULE_FAST_PATH=False to send every query through retrieval and the LLM).
+
+    python -m benchmarks.suite --sizes 1000 10000 --concurrency 1 4 16 --out results.json
+    python -m benchmarks.suite --sizes 1000 --compare results.json  # exit 1 on regression
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# Every path the engine reads or writes, relative to the child's working directory
+WORKSPACE_PATHS = {
+    "FAISS_INDEX_PATH": "data/embeddings/faiss_index",
+    "CHUNK_METADATA_PATH": "data/embeddings/chunk_store.bin",
+    "INDEX_MANIFEST_PATH": "data/embeddings/manifest.json",
+    "PARTITIONS_PATH": "data/embeddings/partitions.npz",
+    "RULE_INDEX_PATH": "data/embeddings/rule_index.json",
+    "EMBED_CACHE_PATH": "data/embeddings/query_embedding_cache.sqlite",
+    "SESSION_DB_PATH": "data/sessions.sqlite",
+}
+
+# (metric path, higher is better) pairs checked by --compare
+COMPARED = [
+    ("indexing.chunks_per_second", True),
+    ("retrieval.cold.p95_ms", False),
+    ("retrieval.warm.p95_ms", False),
+    ("requests_per_second", True),
+    ("latency.p95_ms", False),
+    ("latency.p99_ms", False),
+]
+
+def percentiles(samples_ms) -> dict:
+    if not len(samples_ms):
+        return {}
+    values = np.asarray(samples_ms)
+    return {
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+def run_index_child(args) -> dict:
+    """Corpus → run_indexing → retrieve_clauses, inside the size's workspace."""
+    from benchmarks.synthetic import synthetic_queries, write_corpus
+    from benchmarks.stubs import InMemoryDB
+    from config import Config
+    import indexer.chunk_and_embed as indexer
+
+    start = time.perf_counter()
+    documents = write_corpus("data/policies", args.size, seed=args.seed)
+    corpus_seconds = time.perf_counter() - start
+
+    db = InMemoryDB()
+    db.install()
+    start = time.perf_counter()
+    indexer.run_indexing(Config.INDEX_WORKERS)
+    index_seconds = time.perf_counter() - start
+    chunks = sum(len(rows) for rows in db.chunks.values())
+
+    from engine.query_parser import parse_query
+    from engine.retriever import load_resources, retrieve_clauses
+    start = time.perf_counter()
+    load_resources()
+    load_seconds = time.perf_counter() - start
+
+    parsed = [parse_query(q) for q in synthetic_queries(args.queries, seed=args.seed + 1)]
+    retrieve_clauses(parsed[0], top_k=5)  # first search pays one-off allocations
+    retrieval = {}
+    for label in ("cold", "warm"):  # warm: query embeddings come from the cache, so this is search only
+        samples = []
+        for query in parsed:
+            start = time.perf_counter()
+            retrieve_clauses(query, top_k=5)
+            samples.append((time.perf_counter() - start) * 1000)
+        retrieval[label] = percentiles(samples)
+
+    return {
+        "size": args.size,
+        "documents": len(documents),
+        "chunks": chunks,
+        "index_type": Config.FAISS_INDEX_TYPE,
+        "corpus_seconds": round(corpus_seconds, 3),
+        "indexing": {
+            "seconds": round(index_seconds, 3),
+            "documents_per_second": round(len(documents) / index_seconds, 2),
+            "chunks_per_second": round(chunks / index_seconds, 2),
+            "workers": Config.INDEX_WORKERS,
+        },
+        "load_seconds": round(load_seconds, 3),
+        "retrieval": dict(retrieval, queries=len(parsed)),
+    }
+
+def _server_timing(header: str) -> dict:
+    stages = {}
+    for part in filter(None, (p.strip() for p in (header or "").split(","))):
+        name, _, duration = part.partition(";dur=")
+        stages[name] = float(duration or 0)
+    return stages
+
+def run_e2e_child(args) -> dict:
+    """Serves app.py from a threaded WSGI server and drives /api/query at each concurrency level."""
+    import requests
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from benchmarks.stubs import InMemoryDB, StubLLM, install_stub_llm
+    from benchmarks.synthetic import synthetic_queries
+
+    db = InMemoryDB()
+    db.install()
+    llm = StubLLM(args.llm_prefill_ms, args.llm_token_ms, args.llm_tokens)
+    install_stub_llm(llm)
+
+    from app import app
+    from engine.reasoner import warmup
+    warmup()
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/query"
+    local = threading.local()
+
+    def send(query):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = local.session.post(url, json={"query": query, "suggestions_mode": "deferred"}, timeout=300)
+            body = response.json() if response.ok else {}
+            return ((time.perf_counter() - start) * 1000, response.status_code, body.get("path"),
+                    body.get("cache"), _server_timing(response.headers.get("Server-Timing")))
+        except Exception:
+            return (time.perf_counter() - start) * 1000, None, None, None, {}
+
+    for query in synthetic_queries(4, seed=args.seed + 99):
+        send(query)
+
+    levels = []
+    for n, concurrency in enumerate(args.concurrency):
+        # A fresh query set per level so earlier levels do not warm the decision cache
+        queries = synthetic_queries(args.requests, seed=args.seed + 100 + n)
+        calls_before = llm.calls
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send, queries))
+        wall = time.perf_counter() - start
+
+        ok = [r for r in results if r[1] == 200]
+        stages = {}
+        for r in ok:
+            for stage, ms in r[4].items():
+                stages.setdefault(stage, []).append(ms)
+        levels.append({
+            "concurrency": concurrency,
+            "requests": len(results),
+            "errors": len(results) - len(ok),
+            "seconds": round(wall, 3),
+            "requests_per_second": round(len(results) / wall, 2),
+            "latency": percentiles([r[0] for r in ok]),
+            "paths": {p: sum(1 for r in ok if r[2] == p) for p in sorted({str(r[2]) for r in ok})},
+            "cache": {c: sum(1 for r in ok if str(r[3]) == c) for c in sorted({str(r[3]) for r in ok})},
+            "llm_calls": llm.calls - calls_before,
+            "stages": {stage: percentiles(ms) for stage, ms in sorted(stages.items())},
+        })
+
+    server.shutdown()
+    return {"size": args.size, "llm": {"prefill_ms": args.llm_prefill_ms, "token_ms": args.llm_token_ms,
+                                        "output_tokens": args.llm_tokens},
+            "query_log_rows": len(db.queries), "levels": levels}
+
+def run_child(mode: str, workspace: str, args) -> dict:
+    """Runs this module with --child in `workspace`; engine paths resolve inside it."""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, **WORKSPACE_PATHS,
+               PYTHONPATH=os.pathsep.join(filter(None, [repo, os.environ.get("PYTHONPATH")])))
+    env.update(ALT_API_URL="http://127.0.0.1:9/api/alternatives", ALT_API_TIMEOUT_SECONDS="0.2",
+               PRELOAD_MODELS="False", INDEX_WORKERS=str(args.index_workers))
+    command = [sys.executable, "-m", "benchmarks.suite", "--child", mode, "--size", str(args.size),
+               "--seed", str(args.seed), "--queries", str(args.queries), "--requests", str(args.requests),
+               "--llm-prefill-ms", str(args.llm_prefill_ms), "--llm-token-ms", str(args.llm_token_ms),
+               "--llm-tokens", str(args.llm_tokens), "--concurrency", *map(str, args.concurrency)]
+    os.makedirs(os.path.join(workspace, "data", "embeddings"), exist_ok=True)
+    output = subprocess.run(command, cwd=workspace, env=env, capture_output=True, text=True)
+    if output.returncode:
+        sys.stderr.write(output.stderr[-4000:])
+        raise RuntimeError(f"{mode} benchmark for size {args.size} failed (exit {output.returncode})")
+    line = next(l for l in output.stdout.splitlines() if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+def metadata(args) -> dict:
+    from config import Config
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "embedding_model": Config.EMBEDDING_MODEL_NAME,
+        "faiss_index_type": Config.FAISS_INDEX_TYPE,
+        "args": {k: v for k, v in vars(args).items() if k not in ("child", "compare", "out")},
+    }
+
+def _lookup(record: dict, path: str):
+    for key in path.split("."):
+        record = record.get(key) if isinstance(record, dict) else None
+    return record
+
+def compare(current: dict, baseline: dict, tolerance: float) -> bool:
+    """Prints current vs. baseline for the COMPARED metrics; False if any regressed beyond `tolerance`."""
+    pairs = [(f"size={r['size']}", r, next((b for b in baseline.get("indexing", []) if b["size"] == r["size"]), None))
+             for r in current.get("indexing", [])]
+    base_levels = {l["concurrency"]: l for l in (baseline.get("e2e") or {}).get("levels", [])}
+    pairs += [(f"e2e c={l['concurrency']}", l, base_levels.get(l["concurrency"]))
+              for l in (current.get("e2e") or {}).get("levels", [])]
+
+    ok = True
+    print("\n📊 Comparison with baseline")
+    for label, record, base in pairs:
+        for path, higher_is_better in COMPARED:
+            value, reference = _lookup(record, path), _lookup(base or {}, path)
+            if value is None or not reference:
+                continue
+            change = value / reference - 1
+            regressed = -change > tolerance if higher_is_better else change > tolerance
+            ok &= not regressed
+            print(f"   {'❌' if regressed else '✅'} {label:12s} {path:30s} {reference:10.2f} → {value:10.2f} ({change:+.1%})")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="corpus sizes in chunks")
+    parser.add_argument("--queries", type=int, default=200, help="retrieval queries per size")
+    parser.add_argument("--e2e-size", type=int, help="corpus size served in the load test (default: first size)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="/api/query requests per concurrency level")
+    parser.add_argument("--llm-prefill-ms", type=float, default=50)
+    parser.add_argument("--llm-token-ms", type=float, default=2)
+    parser.add_argument("--llm-tokens", type=int, default=40)
+    parser.add_argument("--index-workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workspace", help="keep corpora and indexes here instead of a temp dir")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="baseline results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_index_child(args) if args.child == "index" else run_e2e_child(args)
+        print("RESULT " + json.dumps(result))
+        sys.exit(0)
+
+    root = args.workspace or tempfile.mkdtemp(prefix="policy-bench-")
+    results = {"meta": metadata(args), "indexing": [], "e2e": None}
+    try:
+        for size in args.sizes:
+            args.size = size
+            print(f"🏗️ size={size}: corpus, indexing, retrieval")
+            run = run_child("index", os.path.join(root, str(size)), args)
+            results["indexing"].append(run)
+            print(f"   {run['chunks']} chunks in {run['indexing']['seconds']:.1f}s "
+                  f"({run['indexing']['chunks_per_second']:.0f} chunks/s), retrieval p95 "
+                  f"cold {run['retrieval']['cold']['p95_ms']:.2f}ms warm {run['retrieval']['warm']['p95_ms']:.2f}ms")
+
+        args.size = args.e2e_size or args.sizes[0]
+        if args.size not in args.sizes:
+            run_child("index", os.path.join(root, str(args.size)), args)
+        print(f"🚦 /api/query load test on size={args.size}")
+        results["e2e"] = run_child("e2e", os.path.join(root, str(args.size)), args)
+        for level in results["e2e"]["levels"]:
+            print(f"   concurrency={level['concurrency']:<3d} {level['requests_per_second']:8.1f} req/s  "
+                  f"p50 {level['latency'].get('p50_ms', 0):8.1f}ms  p95 {level['latency'].get('p95_ms', 0):8.1f}ms  "
+                  f"p99 {level['latency'].get('p99_ms', 0):8.1f}ms  errors {level['errors']}  paths {level['paths']}")
+    finally:
+        if not args.workspace:
+            shutil.rmtree(root, ignore_errors=True)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,121 @@
+"""
+Deterministic synthetic policy corpus and claim queries for the benchmark
+suite. Documents are .docx files named like IRDAI UINs so the doc_type,
+source and insurer partitions and the rule index see realistic input.
+"""
+import os
+import random
+import textwrap
+from typing import List
+from docx import Document
+from config import Config
+
+INSURERS = ["BAJ", "HDF", "ICI", "CHO", "EDL", "SBI", "TAT", "NIA"]
+PROCEDURES = [
+    "knee replacement", "hip replacement", "cataract surgery", "hernia repair", "hysterectomy",
+    "tonsillectomy", "kidney stone removal", "gall bladder removal", "spinal surgery", "dental treatment",
+    "maternity hospitalization", "MRI scan", "chemotherapy", "angioplasty", "appendectomy", "physiotherapy",
+    "sinusitis surgery", "varicose veins treatment", "bariatric surgery", "cosmetic surgery",
+]
+CITIES = ["Pune", "Mumbai", "Delhi", "Chennai", "Kolkata", "Bangalore", "Hyderabad", "Jaipur", "Lucknow", "Goa"]
+CLAUSES = [
+    "Expenses related to the treatment of {proc} are covered after a waiting period of {months} months "
+    "of continuous coverage from the first policy inception date.",
+    "Claims for {proc} are payable up to a maximum of Rs. {amount:,} per policy year, subject to the sum insured.",
+    "Section {section}: {proc} taken as day care treatment is covered, including pre-hospitalisation "
+    "expenses for {days} days and post-hospitalisation expenses for {post} days.",
+    "Room rent during hospitalisation for {proc} is limited to {percent} percent of the sum insured per day.",
+    "Any claim for {proc} within the first {days} days of the policy start date is not payable, "
+    "except for accidental injuries.",
+    "The insured shall intimate the company within {hours} hours of admission for {proc}; "
+    "cashless facility is available only at network hospitals.",
+    "Co-payment of {percent} percent applies to every claim for {proc} where the insured person is above "
+    "{age} years of age at the time of admission.",
+]
+CLAUSES_PER_DOC = 120
+
+def _clause(rng: random.Random) -> str:
+    return rng.choice(CLAUSES).format(
+        proc=rng.choice(PROCEDURES), months=rng.choice([12, 24, 36, 48]), amount=rng.randrange(20, 500) * 1000,
+        section=f"{rng.randint(1, 9)}.{rng.randint(1, 20)}", days=rng.choice([15, 30, 60, 90]),
+        post=rng.choice([60, 90, 180]), percent=rng.choice([1, 2, 10, 20]), hours=rng.choice([24, 48, 72]),
+        age=rng.choice([60, 61, 65]),
+    )
+
+def _chunks_for(words: int) -> int:
+    # CHUNK_SIZE counts tokenizer tokens, about 1.3 per word of this text
+    stride = Config.CHUNK_SIZE - Config.OVERLAP_SIZE
+    return max(1, -(-int(words * 1.3) // stride))
+
+def write_corpus(directory: str, target_chunks: int, seed: int = 0) -> List[str]:
+    """Writes .docx policies into `directory` until they add up to about `target_chunks` indexer chunks."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths, chunks = [], 0
+    while chunks < target_chunks:
+        n = len(paths)
+        name = f"{INSURERS[n % len(INSURERS)]}HLIP{23000 + n:05d}V01{2223:04d}.docx"
+        clauses = [_clause(rng) for _ in range(CLAUSES_PER_DOC)]
+        document = Document()
+        for clause in clauses:
+            document.add_paragraph(clause)
+        document.save(os.path.join(directory, name))
+        paths.append(name)
+        chunks += _chunks_for(sum(len(c.split()) for c in clauses))
+    return paths
+
+def synthetic_queries(n: int, seed: int = 0) -> List[str]:
+    """Claim queries in the shape users send, e.g. "46M, knee replacement in Pune, 3 months policy"."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        duration = rng.choice([f"{rng.randint(1, 11)} months", f"{rng.randint(1, 5)} year"])
+        queries.append(f"{rng.randint(18, 80)}{rng.choice('MF')}, {rng.choice(PROCEDURES)} in "
+                       f"{rng.choice(CITIES)}, {duration} policy")
+    return queries
+
+def numbered_clauses(n: int, seed: int = 0) -> List[str]:
+    """`n` clauses numbered like a policy wording ("4.12 ..."), with an all-caps heading every 20."""
+    rng = random.Random(seed)
+    clauses = []
+    for i in range(n):
+        section, item = i // 20 + 1, i % 20 + 1
+        if item == 1:
+            clauses.append(f"SECTION {section} BENEFITS AND EXCLUSIONS")
+        clauses.append(f"{section}.{item} {_clause(rng)} {_clause(rng)}")
+    return clauses
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, clauses: List[str], lines_per_page: int = 60, width: int = 95):
+    """
+    Writes `clauses` as a plain Helvetica PDF, wrapped at `width` characters,
+    so clauses run across lines and page breaks like a real policy wording.
+    """
+    lines = [line for clause in clauses for line in textwrap.wrap(clause, width)]
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        content = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in page) + " ET"
+        stream = content.encode("latin-1", "replace")
+        kids.append(f"{len(objects) + 1} 0 R")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects) + 2} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
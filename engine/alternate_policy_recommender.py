@@ -0,0 +1,229 @@
+import os
+import time
+import uuid
+import threading
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from requests.adapters import HTTPAdapter
+from engine.lru_cache import LRUCache
+from engine.metrics import traced
+from config import Config
+
+class CircuitBreaker:
+    """
+    Closed → open after `failure_threshold` consecutive failures; while open
+    every call is refused for `reset_seconds`, then one trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = Config.ALT_BREAKER_FAILURES,
+                 reset_seconds: float = Config.ALT_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()  # (re)open, also after a failed trial
+
+def alternatives_key(parsed: Dict) -> Tuple:
+    return (
+        parsed.get("age"),
+        parsed.get("location"),
+        parsed.get("coverage", 30000),
+        parsed.get("plan_type", "Any"),
+    )
+
+class AlternativesClient:
+    """
+    Client for the external alternate-policy recommender. Connections are
+    pooled, answers are cached for ALT_CACHE_TTL_MINUTES per (age, state,
+    coverage, plan_type), concurrent lookups of the same key share one HTTP
+    call, and a circuit breaker stops calling a failing service. Every
+    failure degrades to an empty list of plans.
+    """
+
+    def __init__(self, url: str = Config.ALT_API_URL, timeout: float = Config.ALT_API_TIMEOUT_SECONDS,
+                 pool_size: int = Config.ALT_API_POOL_SIZE):
+        self.url = url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.cache = LRUCache(max_size=Config.ALT_CACHE_SIZE, ttl_minutes=Config.ALT_CACHE_TTL_MINUTES)
+        self.deferred = LRUCache(max_size=Config.ALT_CACHE_SIZE, ttl_minutes=Config.ALT_CACHE_TTL_MINUTES)
+        self.breaker = CircuitBreaker()
+        self.calls = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self._inflight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_process(self):
+        """Session sockets and executor threads do not survive a fork; recreate them per process."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    self._session.mount("http://", adapter)
+                    self._session.mount("https://", adapter)
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="alternatives")
+                    self._inflight = {}
+                    self._pid = os.getpid()
+
+    @traced("alternatives_http")
+    def _call(self, parsed: Dict) -> List[Dict]:
+        if not self.breaker.allow():
+            with self._lock:
+                self.short_circuited += 1
+            return []
+
+        age, state, coverage, plan_type = alternatives_key(parsed)
+        payload = {"age": age, "state": state, "coverage": coverage, "plan_type": plan_type}
+        with self._lock:
+            self.calls += 1
+        try:
+            res = self._session.post(self.url, json=payload, timeout=self.timeout)
+            res.raise_for_status()
+            plans = res.json().get("plans", [])
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            self.breaker.record_failure()
+            print(f"⚠️ Alternatives lookup failed ({self.breaker.state}): {e}")
+            return []
+
+        self.breaker.record_success()
+        self.cache.set(alternatives_key(parsed), plans)
+        return plans
+
+    def fetch_async(self, parsed: Dict) -> Future:
+        """Future of the plans for `parsed`; already resolved on a cache hit."""
+        self._ensure_process()
+        key = alternatives_key(parsed)
+        cached = self.cache.get(key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = self._executor.submit(self._call, parsed)
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
+
+    @traced("alternatives")
+    def fetch(self, parsed: Dict) -> List[Dict]:
+        """Blocking lookup, bounded by the request timeout."""
+        try:
+            return self.fetch_async(parsed).result(timeout=self.timeout + 1)
+        except Exception:
+            return []
+
+    def defer(self, parsed: Dict) -> str:
+        """Starts a background lookup and returns a token for `poll`."""
+        token = uuid.uuid4().hex
+        self.deferred.set(token, self.fetch_async(parsed))
+        return token
+
+    def poll(self, token: str) -> Dict:
+        future = self.deferred.get(token)
+        if future is None:
+            return {"status": "unknown", "plans": []}
+        if not future.done():
+            return {"status": "pending", "plans": None}
+        return {"status": "ready", "plans": future.result()}
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "breaker": self.breaker.state,
+            "cache": self.cache.stats(),
+        }
+
+# 🔬 Test against a local stub recommender: python -m engine.alternate_policy_recommender
+if __name__ == "__main__":
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    behaviour = {"mode": "ok", "hits": 0}
+
+    class StubRecommender(BaseHTTPRequestHandler):
+        def do_POST(self):
+            behaviour["hits"] += 1
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if behaviour["mode"] == "slow":
+                time.sleep(0.5)
+            if behaviour["mode"] == "fail":
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = json.dumps({"plans": [{"name": f"Plan for {payload['age']}", "state": payload["state"]}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRecommender)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = AlternativesClient(url=f"http://127.0.0.1:{server.server_port}/api/alternatives", timeout=0.2)
+    client.breaker = CircuitBreaker(failure_threshold=3, reset_seconds=1)
+    parsed = {"age": 46, "location": "Pune"}
+
+    print("🧾 Plans:", client.fetch(parsed))
+    start = time.perf_counter()
+    client.fetch(parsed)
+    print(f"⚡ Cached lookup: {(time.perf_counter() - start) * 1000:.2f}ms, stub hits={behaviour['hits']}")
+
+    behaviour["mode"] = "slow"
+    token = client.defer({"age": 30, "location": "Delhi"})
+    print("⏳ Deferred:", client.poll(token)["status"])
+    time.sleep(0.4)
+    print("⌛ After timeout:", client.poll(token))
+
+    behaviour["mode"] = "fail"
+    for age in range(50, 56):
+        client.fetch({"age": age, "location": "Mumbai"})
+    print("🔌 Breaker:", client.stats())
+
+    time.sleep(1.1)
+    behaviour["mode"] = "ok"
+    print("🔁 Half-open trial:", client.fetch({"age": 60, "location": "Goa"}), client.breaker.state)
+    server.shutdown()
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+from typing import Dict, Iterator, List, Optional
+from config import Config
+from engine.reasoner import reason_over_queries
+
+def record_error(item) -> Optional[str]:
+    """Why a batch item is not a claim ("query text" or {"query": "text", ...}), or None when it is."""
+    if isinstance(item, str):
+        return None
+    if not isinstance(item, dict):
+        return "must be a query string or an object with a \"query\""
+    if not isinstance(item.get("query"), str) or not item["query"].strip():
+        return "needs a non-empty string \"query\""
+    return None
+
+def read_requests(input_path: str) -> Iterator[Dict]:
+    """
+    One claim per non-blank line: {"id": ..., "query": ..., "filters": {...}}
+    or a bare JSON string. An invalid line becomes a record with an "error",
+    answered by an error row so results stay aligned with requests.
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            error = record_error(record)
+            if error:
+                record = {"id": record.get("id", line_number) if isinstance(record, dict) else line_number,
+                          "query": None, "error": f"Line {line_number}: {error}"}
+            elif isinstance(record, str):
+                record = {"query": record}
+            record.setdefault("id", line_number)
+            yield record
+
+def completed_count(output_path: str) -> int:
+    """
+    Number of results already written. The output file is the checkpoint:
+    result N belongs to request N, and a torn last line from an interrupted
+    write is truncated so it is redone.
+    """
+    if not os.path.exists(output_path):
+        return 0
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            f.truncate(end)
+    return data[:end].count(b"\n")
+
+def process_batch(records: List[Dict]) -> List[Dict]:
+    """Decisions in record order; records carrying an "error" get an error row instead."""
+    valid = [r for r in records if "error" not in r]
+    results = iter(reason_over_queries([r["query"] for r in valid], [r.get("filters") for r in valid]))
+    return [{"id": record["id"], "query": record["query"], "error": record["error"]} if "error" in record
+            else dict(next(results), id=record["id"], query=record["query"]) for record in records]
+
+def run_batch_file(input_path: str, output_path: str, batch_size: int = Config.BATCH_SIZE):
+    """Processes `input_path` in batches, appending results to `output_path`; resumes where a previous run stopped."""
+    done = completed_count(output_path)
+    if done:
+        print(f"🔁 Resuming after {done} completed request(s)")
+
+    processed, start = 0, time.perf_counter()
+    batch = []
+    with open(output_path, "a", encoding="utf-8") as out:
+        def flush():
+            nonlocal processed
+            for result in process_batch(batch):
+                out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            os.fsync(out.fileno())  # a batch is durable before the next one starts
+            processed += len(batch)
+            batch.clear()
+            print(f"✅ {done + processed} done ({processed / (time.perf_counter() - start):.1f} req/s)")
+
+        for n, record in enumerate(read_requests(input_path)):
+            if n < done:
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    print(f"🏁 Finished: {done + processed} result(s) in {output_path}")
+
+# 🔁 Batch CLI
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Adjudicate a JSONL file of claims into a JSONL file of decisions")
+    parser.add_argument("input_path")
+    parser.add_argument("output_path")
+    parser.add_argument("--batch-size", type=int, default=Config.BATCH_SIZE)
+    args = parser.parse_args()
+    run_batch_file(args.input_path, args.output_path, args.batch_size)
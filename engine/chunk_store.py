@@ -0,0 +1,165 @@
+import os
+import json
+import mmap
+import struct
+import numpy as np
+from typing import Dict, List, Optional
+from config import Config
+
+# File layout:
+#   MAGIC | uint64 header length | JSON header | aligned column sections | UTF-8 text blob
+# Columns: offsets int64[n+1] into the text blob, source/doc_type codes into the
+# header's string tables, chunk_id, first/last page (0 = unknown) and a tombstone
+# flag. Position == FAISS vector ID.
+MAGIC = b"CHKSTOR1"
+_PREAMBLE = len(MAGIC) + 8
+_ALIGN = 8
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+def write_chunk_store(metadata: List[Dict], path: str, version: Optional[int] = None):
+    """
+    Serialize chunk metadata records (tombstones included) into the columnar
+    format. `version` is the index manifest version this store is published with.
+    """
+    n = len(metadata)
+    sources, doc_types = {}, {}
+    source_codes = np.empty(n, dtype="<i4")
+    doc_type_codes = np.empty(n, dtype="<i4")
+    chunk_ids = np.empty(n, dtype="<i8")
+    page_starts = np.zeros(n, dtype="<i4")
+    page_ends = np.zeros(n, dtype="<i4")
+    deleted = np.zeros(n, dtype="u1")
+    blobs = []
+
+    for i, meta in enumerate(metadata):
+        source_codes[i] = sources.setdefault(meta["source"], len(sources))
+        doc_type_codes[i] = doc_types.setdefault(meta.get("doc_type", "unknown"), len(doc_types))
+        chunk_ids[i] = meta.get("chunk_id", 0)
+        page_starts[i] = meta.get("page_start", 0)
+        page_ends[i] = meta.get("page_end", 0)
+        deleted[i] = bool(meta.get("deleted"))
+        blobs.append(meta.get("text", "").encode("utf-8"))
+
+    offsets = np.zeros(n + 1, dtype="<i8")
+    offsets[1:] = np.cumsum([len(blob) for blob in blobs], dtype=np.int64)
+
+    columns = [("offsets", offsets), ("source", source_codes), ("doc_type", doc_type_codes),
+               ("chunk_id", chunk_ids), ("page_start", page_starts), ("page_end", page_ends), ("deleted", deleted)]
+    sections, position = {}, 0
+    for name, column in columns:
+        sections[name] = {"offset": position, "dtype": column.dtype.str, "count": len(column)}
+        position = _align(position + column.nbytes)
+    sections["text"] = {"offset": position, "nbytes": int(offsets[-1])}
+
+    header = json.dumps({
+        "count": n,
+        "version": version,
+        "sources": list(sources),
+        "doc_types": list(doc_types),
+        "sections": sections,
+    }).encode("utf-8")
+    data_start = _align(_PREAMBLE + len(header))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, column in columns:
+            f.seek(data_start + sections[name]["offset"])
+            f.write(column.tobytes())
+        f.seek(data_start + sections["text"]["offset"])
+        for blob in blobs:
+            f.write(blob)
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of a chunk store file. Nothing is decoded
+    up front: columns are NumPy views over the mapping and text is decoded
+    per lookup, so worker processes share the pages through the OS page cache.
+    """
+
+    def __init__(self, path: str = Config.CHUNK_METADATA_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a chunk store (convert JSON metadata with `python -m engine.chunk_store`)")
+
+        header_len = struct.unpack_from("<Q", self._mm, len(MAGIC))[0]
+        header = json.loads(self._mm[_PREAMBLE:_PREAMBLE + header_len])
+        data_start = _align(_PREAMBLE + header_len)
+        sections = header["sections"]
+
+        def column(name):
+            section = sections[name]
+            return np.frombuffer(self._mm, dtype=section["dtype"], count=section["count"],
+                                 offset=data_start + section["offset"])
+
+        self.count = header["count"]
+        self.version = header.get("version")  # None for stores written outside publish_index
+        self.sources = header["sources"]
+        self.doc_types = header["doc_types"]
+        self.offsets = column("offsets")
+        self.source_codes = column("source")
+        self.doc_type_codes = column("doc_type")
+        self.chunk_ids = column("chunk_id")
+        # Stores written before page tracking have no page columns
+        self.page_starts = column("page_start") if "page_start" in sections else None
+        self.page_ends = column("page_end") if "page_end" in sections else None
+        self.deleted = column("deleted")
+        self._text_start = data_start + sections["text"]["offset"]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def is_deleted(self, i: int) -> bool:
+        return bool(self.deleted[i])
+
+    def text(self, i: int) -> str:
+        start = self._text_start + int(self.offsets[i])
+        end = self._text_start + int(self.offsets[i + 1])
+        return self._mm[start:end].decode("utf-8")
+
+    def __getitem__(self, i: int) -> Dict:
+        record = {
+            "text": self.text(i),
+            "source": self.sources[self.source_codes[i]],
+            "doc_type": self.doc_types[self.doc_type_codes[i]],
+            "chunk_id": int(self.chunk_ids[i]),
+        }
+        if self.page_starts is not None and self.page_starts[i]:
+            record["page_start"] = int(self.page_starts[i])
+            record["page_end"] = int(self.page_ends[i])
+        if self.deleted[i]:
+            record["deleted"] = True
+        return record
+
+    def to_records(self) -> List[Dict]:
+        return [self[i] for i in range(self.count)]
+
+    def close(self):
+        # Views must go before the mapping can be closed
+        self.offsets = self.source_codes = self.doc_type_codes = self.chunk_ids = self.deleted = None
+        self.page_starts = self.page_ends = None
+        self._mm.close()
+
+def convert_json_metadata(json_path: str, store_path: str = Config.CHUNK_METADATA_PATH):
+    """Convert a legacy chunk_metadata.json list into a chunk store file."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    tmp_path = f"{store_path}.tmp"
+    write_chunk_store(metadata, tmp_path)
+    os.replace(tmp_path, store_path)
+    print(f"✅ Converted {len(metadata)} records: {json_path} → {store_path}")
+
+# 🔁 Converter CLI
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert chunk_metadata.json to the memory-mapped chunk store")
+    parser.add_argument("json_path", nargs="?", default="data/embeddings/chunk_metadata.json")
+    parser.add_argument("store_path", nargs="?", default=Config.CHUNK_METADATA_PATH)
+    args = parser.parse_args()
+    convert_json_metadata(args.json_path, args.store_path)
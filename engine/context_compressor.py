@@ -0,0 +1,93 @@
+import re
+import numpy as np
+from typing import Callable, Dict, List
+from config import Config
+from engine.embedding_cache import normalize_query_text
+from engine.lru_cache import LRUCache
+
+# Sentence ends, but not inside clause numbers like "4.1.2" or "Rs. 5,000"
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+(?=[A-Z(\"'])")
+MAX_SENTENCE_WORDS = 60  # policy text without punctuation is cut into windows of this size
+
+# The same retrieved chunks recur across queries; cache their sentence
+# embeddings, keyed by (embedding model, normalized sentence)
+_sentence_vectors = LRUCache(max_size=Config.CONTEXT_SENTENCE_CACHE_SIZE, ttl_minutes=None)
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    for sentence in _SENTENCE_END.split(text):
+        words = sentence.split()
+        for i in range(0, len(words), MAX_SENTENCE_WORDS):
+            piece = " ".join(words[i:i + MAX_SENTENCE_WORDS])
+            if len(piece) >= Config.CONTEXT_MIN_SENTENCE_CHARS:
+                sentences.append(piece)
+    return sentences
+
+def _dedupe(sentences: List[Dict]) -> List[Dict]:
+    """
+    Drop repeated sentences and fragments of longer ones (chunk overlap cuts
+    sentences at arbitrary word boundaries). Keeps the first occurrence.
+    """
+    by_length = sorted(sentences, key=lambda s: -len(s["key"]))
+    kept = []
+    for sentence in by_length:
+        if not any(sentence["key"] in other["key"] for other in kept):
+            kept.append(sentence)
+    return sorted(kept, key=lambda s: s["order"])
+
+def sentence_vectors(sentences: List[str], encode: Callable[[List[str]], np.ndarray],
+                     keys: List[str] = None, model_name: str = None) -> np.ndarray:
+    """
+    Unit-normalized embeddings of `sentences` by `model_name` (default:
+    EMBEDDING_MODEL_NAME), cached under `keys` (default: the sentences
+    themselves); only misses are encoded, in one batch.
+    """
+    model_name = model_name or Config.EMBEDDING_MODEL_NAME
+    keys = [(model_name, key) for key in keys or sentences]
+    vectors = [_sentence_vectors.get(k) for k in keys]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        encoded = np.asarray(encode([sentences[i] for i in missing]), dtype=np.float32)
+        encoded /= np.linalg.norm(encoded, axis=1, keepdims=True) + 1e-12
+        for i, vector in zip(missing, encoded):
+            vector.setflags(write=False)
+            _sentence_vectors.set(keys[i], vector)
+            vectors[i] = vector
+    return np.vstack(vectors)
+
+def compress_clauses(query_vector: np.ndarray, clauses: List[Dict],
+                     encode: Callable[[List[str]], np.ndarray],
+                     count_tokens: Callable[[List[str]], List[int]],
+                     token_budget: int = Config.CONTEXT_TOKEN_BUDGET, model_name: str = None) -> List[Dict]:
+    """
+    Keep the sentences of the retrieved clauses most similar to the query,
+    up to `token_budget` tokens, in their original order. Returns clause
+    dicts shaped like the input (text replaced); clauses left with no
+    sentences are dropped. The best sentence is always kept.
+    """
+    sentences = []
+    for clause_index, clause in enumerate(clauses):
+        for text in split_sentences(clause["text"]):
+            sentences.append({"clause": clause_index, "order": len(sentences),
+                              "text": text, "key": normalize_query_text(text)})
+    sentences = _dedupe(sentences)
+    if not sentences:
+        return clauses
+
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) + 1e-12)
+    scores = sentence_vectors([s["text"] for s in sentences], encode, [s["key"] for s in sentences],
+                              model_name) @ query
+    tokens = count_tokens([s["text"] for s in sentences])
+
+    chosen, used = set(), 0
+    for i in np.argsort(-scores):
+        if not chosen or used + tokens[i] <= token_budget:
+            chosen.add(int(i))
+            used += tokens[i]
+
+    compressed = {}
+    for i, sentence in enumerate(sentences):
+        if i in chosen:
+            compressed.setdefault(sentence["clause"], []).append(sentence["text"])
+    return [dict(clauses[c], text=" ".join(texts)) for c, texts in sorted(compressed.items())]
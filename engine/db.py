@@ -1,7 +1,27 @@
+import io
+import os
+import re
+import math
+import time
+import queue
+import atexit
+import struct
+import threading
+import numpy as np
 import psycopg2
-from psycopg2.extras import Json
-from typing import List, Dict, Any
+from contextlib import contextmanager
+from datetime import datetime
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from typing import List, Dict, Any, Optional
 from config import Config
+from engine.metrics import register_collector, traced
+
+# PostgreSQL binary COPY framing
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_COPY_TRAILER = struct.pack("!h", -1)
+_CHUNK_COLUMNS = "(source, doc_type, chunk_id, text, embedding)"
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
 
 def get_connection():
     return psycopg2.connect(
@@ -12,6 +32,38 @@ def get_connection():
         port=Config.DB_PORT
     )
 
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ThreadedConnectionPool:
+    """Per-process pool: connections inherited across a fork must not be reused."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool_pid = os.getpid()
+                _pool = ThreadedConnectionPool(
+                    Config.DB_POOL_MIN,
+                    Config.DB_POOL_MAX,
+                    dbname=Config.DB_NAME,
+                    user=Config.DB_USER,
+                    password=Config.DB_PASSWORD,
+                    host=Config.DB_HOST,
+                    port=Config.DB_PORT
+                )
+    return _pool
+
+@contextmanager
+def pooled_connection():
+    """Borrow a connection from the shared pool; rolled back if left uncommitted."""
+    conn = get_pool().getconn()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        get_pool().putconn(conn)
+
 def create_tables():
     with get_connection() as conn:
         with conn.cursor() as cur:
@@ -35,30 +87,261 @@ def create_tables():
                     doc_type TEXT,
                     chunk_id INT,
                     text TEXT,
-                    embedding VECTOR(768)
+                    embedding VECTOR(%s)
+                );
+            """ % Config.EMBEDDING_DIM)
+            # Used when SESSION_BACKEND=postgres (see engine/session_store.py)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    created_at DOUBLE PRECISION,
+                    updated_at DOUBLE PRECISION
                 );
             """)
-        conn.commit()
-
-def log_user_query(session_id: str, user_query: str, reasoning_result: Dict[str, Any]):
-    with get_connection() as conn:
-        with conn.cursor() as cur:
             cur.execute("""
-                INSERT INTO queries (
-                    session_id, user_query, parsed_query,
-                    decision, amount, justification, matched_clauses
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s);
-            """, (
-                session_id,
-                user_query,
-                Json(reasoning_result.get("parsed", {})),
-                reasoning_result.get("decision", "unknown"),
-                reasoning_result.get("amount"),
-                reasoning_result.get("justification"),
-                Json(reasoning_result.get("matched_clauses", []))
-            ))
+                CREATE TABLE IF NOT EXISTS session_turns (
+                    seq BIGSERIAL PRIMARY KEY,
+                    session_id TEXT,
+                    turn_id TEXT,
+                    query TEXT,
+                    response TEXT,
+                    created_at DOUBLE PRECISION
+                );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS session_turns_by_session ON session_turns (session_id, seq);")
+            cur.execute("CREATE INDEX IF NOT EXISTS sessions_by_activity ON sessions (updated_at);")
         conn.commit()
 
+class QueryLogWriter:
+    """
+    Write-behind logger for the `queries` table. Requests only enqueue a
+    record (non-blocking); a daemon thread drains the queue and inserts rows
+    in multi-row batches when `batch_size` records are waiting or every
+    `flush_seconds`. When the queue is full new records are dropped and
+    counted, so a slow database never stalls a request.
+    """
+
+    def __init__(self, max_queue: int = Config.QUERY_LOG_QUEUE_SIZE,
+                 batch_size: int = Config.QUERY_LOG_BATCH_SIZE,
+                 flush_seconds: float = Config.QUERY_LOG_FLUSH_SECONDS):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads do not survive fork: a preloaded worker starts its own
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    if self._pid is None:
+                        atexit.register(self.close)
+                    self._pid = os.getpid()
+                    self._stop = threading.Event()
+                    self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, record: tuple) -> bool:
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _drain(self, first=None) -> List[tuple]:
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, rows: List[tuple]):
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO queries (
+                        session_id, user_query, parsed_query, decision,
+                        amount, justification, matched_clauses, timestamp
+                    ) VALUES %s;
+                """, rows, page_size=self.batch_size)
+            conn.commit()
+
+    @traced("query_log_write")  # background thread: histogram only, not in request traces
+    def _write(self, batch: List[tuple]):
+        rows = [
+            (session_id, user_query, Json(parsed), decision, amount, justification, Json(clauses), logged_at)
+            for session_id, user_query, parsed, decision, amount, justification, clauses, logged_at in batch
+        ]
+        try:
+            self._insert(rows)
+            self.written += len(rows)
+            return
+        except Exception as e:
+            if len(rows) == 1:
+                self.failed += 1
+                print("❌ Failed to write a query log row:", e)
+                return
+            print(f"⚠️ Batch of {len(rows)} query log rows failed, retrying row by row:", e)
+        # One bad row fails the whole INSERT; only that row should be lost
+        for row in rows:
+            try:
+                self._insert([row])
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print("❌ Failed to write a query log row:", e)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self.queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                continue
+            # Below the size threshold, give the batch until the deadline to fill up
+            deadline = time.monotonic() + self.flush_seconds
+            while self.queue.qsize() < self.batch_size - 1 and time.monotonic() < deadline and not self._stop.is_set():
+                time.sleep(min(0.01, self.flush_seconds))
+            self._write(self._drain(first))
+
+    def flush(self):
+        """Synchronously write everything currently queued."""
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._write(batch)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds + 1)
+        self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+query_log_writer = QueryLogWriter()
+register_collector("query_log", query_log_writer.stats)
+
+def numeric_amount(value: Any) -> Optional[float]:
+    """LLM amounts as a NUMERIC value: "₹40,000" → 40000.0; "N/A", None or garbage → None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, str):
+        match = _NUMBER.search(value.replace(",", ""))
+        return float(match.group(0)) if match else None
+    return None
+
+@traced("log_user_query")
+def log_user_query(session_id: str, user_query: str, reasoning_result: Dict[str, Any]) -> bool:
+    """Enqueue a query log record; returns False if it was dropped."""
+    if not Config.ENABLE_LOGGING:
+        return False
+    return query_log_writer.submit((
+        session_id,
+        user_query,
+        reasoning_result.get("parsed", {}),
+        reasoning_result.get("decision", "unknown"),
+        numeric_amount(reasoning_result.get("amount")),
+        reasoning_result.get("justification"),
+        reasoning_result.get("matched_clauses", []),
+        datetime.now()
+    ))
+
+def _insert_chunks(cur, metadata_list: List[Dict[str, Any]], embeddings: Any, table: str = "indexed_chunks"):
+    """Row-at-a-time INSERT loop. Kept as the baseline for benchmarks/bench_db_copy.py."""
+    for meta, emb in zip(metadata_list, embeddings):
+        cur.execute(f"""
+            INSERT INTO {table} {_CHUNK_COLUMNS}
+            VALUES (%s, %s, %s, %s, %s);
+        """, (
+            meta["source"],
+            meta.get("doc_type", "unknown"),
+            meta.get("chunk_id", 0),
+            meta["text"],
+            emb.tolist()
+        ))
+
+def get_embedding_column_dim(cur, table: str = "indexed_chunks") -> Optional[int]:
+    """Declared dimension of the pgvector `embedding` column (None if unconstrained)."""
+    cur.execute("""
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = 'embedding';
+    """, (table,))
+    row = cur.fetchone()
+    return row[0] if row and row[0] > 0 else None
+
+def _encode_copy_batch(metadata_batch: List[Dict[str, Any]], vectors: np.ndarray) -> io.BytesIO:
+    """
+    Encode rows in PostgreSQL binary COPY format. pgvector's binary form is
+    int16 dim, int16 unused, then big-endian float4s, so each vector is written
+    straight from the array buffer without converting to Python floats.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=">f4")
+    dim = vectors.shape[1]
+    vector_header = struct.pack("!ihh", 4 + 4 * dim, dim, 0)
+    buf = io.BytesIO()
+    buf.write(_COPY_HEADER)
+    for meta, vec in zip(metadata_batch, vectors):
+        source = meta["source"].encode("utf-8")
+        doc_type = meta.get("doc_type", "unknown").encode("utf-8")
+        text = meta["text"].replace("\x00", "").encode("utf-8")  # NUL is not valid in TEXT
+        buf.write(struct.pack("!hi", 5, len(source)))
+        buf.write(source)
+        buf.write(struct.pack("!i", len(doc_type)))
+        buf.write(doc_type)
+        buf.write(struct.pack("!ii", 4, meta.get("chunk_id", 0)))
+        buf.write(struct.pack("!i", len(text)))
+        buf.write(text)
+        buf.write(vector_header)
+        buf.write(vec.tobytes())
+    buf.write(_COPY_TRAILER)
+    buf.seek(0)
+    return buf
+
+def _copy_chunks(cur, metadata_list: List[Dict[str, Any]], embeddings: Any,
+                 table: str = "indexed_chunks", batch_rows: int = Config.DB_COPY_BATCH_ROWS):
+    """Bulk-load chunks with binary COPY in batches of `batch_rows`."""
+    if not len(metadata_list):
+        return
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2 or len(embeddings) != len(metadata_list):
+        raise ValueError(f"Expected {len(metadata_list)} embeddings as a 2-D array, got shape {embeddings.shape}")
+
+    expected_dim = get_embedding_column_dim(cur, table)
+    if expected_dim is not None and embeddings.shape[1] != expected_dim:
+        raise ValueError(
+            f"Embedding dimension {embeddings.shape[1]} does not match {table}.embedding VECTOR({expected_dim}); "
+            f"set EMBEDDING_DIM to the model's dimension and recreate the table."
+        )
+
+    for start in range(0, len(metadata_list), batch_rows):
+        batch = _encode_copy_batch(metadata_list[start:start + batch_rows], embeddings[start:start + batch_rows])
+        cur.copy_expert(f"COPY {table} {_CHUNK_COLUMNS} FROM STDIN WITH (FORMAT binary)", batch)
+
 def save_chunks_to_db(metadata_list: List[Dict[str, Any]], embeddings: Any):
     """
     Save chunk metadata and their embeddings into the `indexed_chunks` table.
@@ -66,17 +349,21 @@ def save_chunks_to_db(metadata_list: List[Dict[str, Any]], embeddings: Any):
     """
     with get_connection() as conn:
         with conn.cursor() as cur:
-            for meta, emb in zip(metadata_list, embeddings):
-                cur.execute("""
-                    INSERT INTO indexed_chunks (source, doc_type, chunk_id, text, embedding)
-                    VALUES (%s, %s, %s, %s, %s);
-                """, (
-                    meta["source"],
-                    meta.get("doc_type", "unknown"),
-                    meta.get("chunk_id", 0),
-                    meta["text"],
-                    emb.tolist()
-                ))
+            _copy_chunks(cur, metadata_list, embeddings)
+        conn.commit()
+
+def replace_chunks_in_db(stale_sources: Optional[List[str]], metadata_list: List[Dict[str, Any]], embeddings: Any):
+    """
+    Delete the chunks of `stale_sources` (all chunks if None) and insert the new
+    ones in a single transaction, so readers never see a partially re-indexed source.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if stale_sources is None:
+                cur.execute("DELETE FROM indexed_chunks;")
+            elif stale_sources:
+                cur.execute("DELETE FROM indexed_chunks WHERE source = ANY(%s);", (list(stale_sources),))
+            _copy_chunks(cur, metadata_list, embeddings)
         conn.commit()
 
 # 🧪 Test
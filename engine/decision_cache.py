@@ -0,0 +1,131 @@
+import json
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from engine.lru_cache import LRUCache
+from config import Config
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution: the
+    first caller runs `fn`, later callers block until it finishes and share
+    its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key: str) -> Tuple[_Call, bool]:
+        """(call, leader): the leader must `finish` the call; everyone else may `wait` on it."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        return call, leader
+
+    def finish(self, key: str, call: _Call, result: Any = None, error: BaseException = None):
+        call.result, call.error = result, error
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+    @staticmethod
+    def wait(call: _Call) -> Any:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, shared) where `shared` is True for coalesced callers."""
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call), True
+        try:
+            result = fn()
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result, False
+
+def decision_fingerprint(parsed: Dict, matched_clauses: List[Dict], version: str) -> str:
+    """Stable hash of the parsed query, the retrieved chunk IDs and the index/model version."""
+    chunk_ids = [
+        clause.get("vector_id", hashlib.sha1(clause.get("text", "").encode("utf-8")).hexdigest())
+        for clause in matched_clauses
+    ]
+    payload = json.dumps({"parsed": parsed, "chunks": chunk_ids, "version": version}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class DecisionCache:
+    """LRU of LLM decisions with in-flight request coalescing."""
+    COUNTERS = {"hit": "hits", "coalesced": "coalesced", "miss": "misses"}
+
+    def __init__(self, max_size: int = Config.DECISION_CACHE_SIZE,
+                 ttl_minutes: int = Config.DECISION_CACHE_TTL_MINUTES):
+        self.cache = LRUCache(max_size=max_size, ttl_minutes=ttl_minutes)
+        self.flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached decision (a copy) or None; does not count as a lookup, see `record`."""
+        cached = self.cache.get(key)
+        return dict(cached) if cached is not None else None
+
+    def put(self, key: str, result: Dict):
+        self.cache.set(key, result)
+
+    def record(self, status: str, count: int = 1):
+        """Counts `count` lookups as "hit", "coalesced" or "miss"; for callers that bypass `get_or_compute`."""
+        counter = self.COUNTERS[status]
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + count)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict],
+                       cacheable: Callable[[Dict], bool] = None) -> Tuple[Dict, str]:
+        """
+        Returns (decision, status) with status one of "hit", "coalesced" or "miss".
+        Results rejected by `cacheable` are still shared with coalesced callers
+        but not stored.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.record("hit")
+            return cached, "hit"
+
+        def run():
+            result = compute()
+            if cacheable is None or cacheable(result):
+                self.put(key, result)
+            return result
+
+        result, shared = self.flight.do(key, run)
+        if shared:
+            self.record("coalesced")
+            return dict(result), "coalesced"
+        self.record("miss")
+        return dict(result), "miss"
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "evictions": self.cache.evictions,
+            "size": len(self.cache),
+        }
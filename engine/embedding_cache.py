@@ -0,0 +1,174 @@
+import os
+import re
+import sqlite3
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from engine.lru_cache import LRUCache
+from config import Config
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+class DiskEmbeddingStore:
+    """
+    SQLite-backed second level, shared by every process on the host. Rows are
+    tagged with the embedding model; opening the store with a different model
+    drops all rows. Size is bounded FIFO-style by rowid. The connection is
+    opened on first use in each process, never inherited across a fork.
+    """
+
+    def __init__(self, path: str, model_name: str, max_rows: int = Config.EMBED_CACHE_DISK_MAX_ROWS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.model_name = model_name
+        self.max_rows = max_rows
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection; call with `self._lock` held."""
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL;")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB);")
+
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'model';").fetchone()
+            if row is None or row[0] != self.model_name:
+                self._conn.execute("DELETE FROM embeddings;")
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('model', ?);", (self.model_name,))
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._connection().execute("SELECT vector FROM embeddings WHERE key = ?;", (key,)).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def set(self, key: str, vector: np.ndarray):
+        self.set_many({key: vector})
+
+    def set_many(self, vectors: Dict[str, np.ndarray]):
+        """Stores several vectors in one transaction."""
+        rows = [(key, np.ascontiguousarray(v, dtype=np.float32).tobytes()) for key, v in vectors.items()]
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?);", rows)
+            before = self._inserts
+            self._inserts += len(rows)
+            if self._inserts // 1000 != before // 1000:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE rowid <= (SELECT MAX(rowid) FROM embeddings) - ?;",
+                    (self.max_rows,)
+                )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM embeddings;")
+            conn.commit()
+
+class EmbeddingCache:
+    """
+    Two-level cache for query embeddings keyed by (model name, normalized
+    text): an in-process LRU in front of an optional on-disk store. Misses
+    embed the caller's original text; normalization only forms the key.
+    """
+
+    def __init__(self, model_name: str = Config.EMBEDDING_MODEL_NAME,
+                 max_size: int = Config.EMBED_CACHE_SIZE,
+                 disk_path: Optional[str] = Config.EMBED_CACHE_PATH):
+        self.model_name = model_name
+        self.memory = LRUCache(max_size=max_size, ttl_minutes=None)
+        self.disk = DiskEmbeddingStore(disk_path, model_name) if disk_path else None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def record(self, memory_hits: int = 0, disk_hits: int = 0, misses: int = 0):
+        """Counters are shared by every request thread of the worker."""
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += misses
+
+    def get_or_compute(self, text: str, compute: Callable[[str], np.ndarray]) -> np.ndarray:
+        """Returns the cached embedding of `text`, computing and storing it on a miss."""
+        key = normalize_query_text(text)
+        memory_key = (self.model_name, key)
+
+        vector = self.memory.get(memory_key)
+        if vector is not None:
+            self.record(memory_hits=1)
+            return vector
+
+        vector = self.disk.get(key) if self.disk else None
+        if vector is not None:
+            self.record(disk_hits=1)
+        else:
+            self.record(misses=1)
+            vector = np.asarray(compute(text), dtype=np.float32)
+            if self.disk:
+                self.disk.set(key, vector)
+
+        vector.setflags(write=False)  # shared between callers
+        self.memory.set(memory_key, vector)
+        return vector
+
+    def get_or_compute_many(self, texts: List[str],
+                            compute_many: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Batch version of `get_or_compute`: every miss is embedded in one `compute_many` call."""
+        keys = [normalize_query_text(text) for text in texts]
+        vectors = [None] * len(keys)
+        missing = {}
+        memory_hits = disk_hits = 0
+        for i, key in enumerate(keys):
+            vector = self.memory.get((self.model_name, key))
+            if vector is not None:
+                memory_hits += 1
+            else:
+                vector = self.disk.get(key) if self.disk else None
+                if vector is not None:
+                    disk_hits += 1
+                    vector.setflags(write=False)
+                    self.memory.set((self.model_name, key), vector)
+                else:
+                    missing.setdefault(key, []).append(i)
+                    continue
+            vectors[i] = vector
+
+        self.record(memory_hits, disk_hits, len(missing))
+        if missing:
+            computed = np.asarray(compute_many([texts[positions[0]] for positions in missing.values()]),
+                                  dtype=np.float32)
+            if self.disk:
+                self.disk.set_many(dict(zip(missing, computed)))
+            for (key, positions), vector in zip(missing.items(), computed):
+                vector = vector.copy()  # own buffer, not a view pinning the whole batch
+                vector.setflags(write=False)
+                self.memory.set((self.model_name, key), vector)
+                for i in positions:
+                    vectors[i] = vector
+        return np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions,
+            "size": len(self.memory),
+        }
@@ -0,0 +1,131 @@
+import faiss
+import numpy as np
+from typing import Dict, Optional
+from config import Config
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+LOAD_MODES = ("mmap", "read")
+
+# Read-only mmap flag per index type: flat codes (IndexFlat, HNSW storage) map
+# with IO_FLAG_MMAP_IFC, IVF inverted lists with IO_FLAG_MMAP. FAISS rejects
+# both together on IVF, and older builds lack IO_FLAG_MMAP_IFC.
+_MMAP_FLAGS = {
+    "flat": "IO_FLAG_MMAP_IFC",
+    "hnsw": "IO_FLAG_MMAP_IFC",
+    "ivf_flat": "IO_FLAG_MMAP",
+    "ivf_pq": "IO_FLAG_MMAP",
+}
+
+def default_index_params(index_type: str = Config.FAISS_INDEX_TYPE) -> Dict:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE '{index_type}', expected one of {INDEX_TYPES}")
+    return {
+        "type": index_type,
+        "nlist": Config.FAISS_IVF_NLIST,
+        "pq_m": Config.FAISS_PQ_M,
+        "pq_nbits": Config.FAISS_PQ_NBITS,
+        "hnsw_m": Config.FAISS_HNSW_M,
+        "ef_construction": Config.FAISS_HNSW_EF_CONSTRUCTION,
+        "train_sample": Config.FAISS_TRAIN_SAMPLE,
+    }
+
+def _resolve_params(params: Dict, dim: int, n: int) -> Dict:
+    """
+    Shrink/adjust requested parameters so they are valid for `n` vectors of
+    width `dim`. "type" is the type actually built; "requested_type" keeps
+    the configured one so a fallback is not mistaken for a config change.
+    """
+    params = dict(params, dim=dim, requested_type=params.get("requested_type", params["type"]))
+    index_type = params["type"]
+
+    if index_type == "ivf_pq" and (dim % params["pq_m"] or n < 2 ** params["pq_nbits"]):
+        print(f"⚠️ IVF-PQ needs dim % pq_m == 0 and at least {2 ** params['pq_nbits']} vectors, using IVF-Flat")
+        index_type = params["type"] = "ivf_flat"
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # FAISS wants ~39 training points per centroid
+        params["nlist"] = max(1, min(params["nlist"], n // 39))
+
+    return params
+
+def factory_string(params: Dict) -> str:
+    index_type = params["type"]
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "ivf_flat":
+        return f"IDMap2,IVF{params['nlist']},Flat"
+    if index_type == "ivf_pq":
+        return f"IDMap2,IVF{params['nlist']},PQ{params['pq_m']}x{params['pq_nbits']}"
+    return f"IDMap2,HNSW{params['hnsw_m']},Flat"
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, params: Optional[Dict] = None):
+    """
+    Build an ID-mapped FAISS index of the configured type, training IVF
+    variants on a random sample. Returns (index, resolved_params); the params
+    are stored in the index manifest alongside the index.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    params = _resolve_params(params or default_index_params(), vectors.shape[1], len(vectors))
+
+    index = faiss.index_factory(params["dim"], factory_string(params), faiss.METRIC_L2)
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efConstruction = params["ef_construction"]
+
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > params["train_sample"]:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), params["train_sample"], replace=False)]
+        print(f"🎓 Training {params['type']} index on {len(sample)} vectors...")
+        index.train(sample)
+
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index, params
+
+def read_index(path: str, index_type: Optional[str] = None, mode: str = Config.FAISS_LOAD_MODE):
+    """
+    Load an index for searching. In "mmap" mode the vectors stay in the file
+    and are paged in through the OS page cache, so every worker on the host
+    shares one copy; the index must not be modified. Unknown or unsupported
+    types are read into memory. Returns (index, mapped).
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown FAISS_LOAD_MODE '{mode}', expected one of {LOAD_MODES}")
+    flag = getattr(faiss, _MMAP_FLAGS.get(index_type, ""), None) if mode == "mmap" else None
+    if flag is not None:
+        return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY), True
+    return faiss.read_index(path), False
+
+def supports_removal(index) -> bool:
+    """HNSW graphs cannot delete vectors; callers rebuild instead."""
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    return not isinstance(inner, faiss.IndexHNSW)
+
+def make_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector=None):
+    """
+    Per-call search parameters (thread-safe, unlike mutating the index).
+    `selector` (a faiss.IDSelector over vector IDs) restricts the search to
+    a partition; the caller must keep it alive while the params are used.
+    """
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or Config.FAISS_NPROBE)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search or Config.FAISS_EF_SEARCH)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+def widened_search_params(index, top_k: int, selector=None):
+    """
+    Parameters that look further than the configured trade-off: every IVF
+    list, or a wide HNSW beam. Used when a filtered search comes back short
+    because few partition members sit in the probed lists/neighbourhood.
+    """
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if isinstance(inner, faiss.IndexIVF):
+        return make_search_params(index, nprobe=inner.nlist, selector=selector)
+    if isinstance(inner, faiss.IndexHNSW):
+        return make_search_params(index, ef_search=max(4 * Config.FAISS_EF_SEARCH, top_k), selector=selector)
+    return make_search_params(index, selector=selector)
@@ -1,5 +1,5 @@
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 def format_decision_response(reasoning_result: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -14,12 +14,19 @@ def format_decision_response(reasoning_result: Dict[str, Any]) -> Dict[str, Any]
             {
                 "source": clause["source"],
                 "doc_type": clause.get("doc_type", "unknown"),
+                "pages": [clause["page_start"], clause["page_end"]] if clause.get("page_start") else None,
                 "text_snippet": clause["text"][:300] + "..." if len(clause["text"]) > 300 else clause["text"]
             }
             for clause in reasoning_result.get("matched_clauses", [])
         ]
     }
 
+def format_response(user_query: str, parsed: Dict[str, Any], matched_clauses: List[Dict[str, Any]],
+                    decision: Dict[str, Any]) -> Dict[str, Any]:
+    """Formatted API/UI response for one query and its decision."""
+    result = dict(decision, parsed=parsed, matched_clauses=matched_clauses)
+    return dict(format_decision_response(result), query=user_query)
+
 def format_pretty_print(response_dict: Dict[str, Any]) -> str:
     """
     Returns a readable, indented JSON string version of the response (for logs/UI).
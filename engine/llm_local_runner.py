@@ -1,40 +1,321 @@
 import os
+import copy
+import time
+import hashlib
+import queue
+import threading
 import torch
+from concurrent.futures import Future
+from typing import Iterator, List
 from config import Config
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from transformers import (
+    AutoModelForCausalLM, AutoTokenizer, DynamicCache, LogitsProcessor, LogitsProcessorList, StoppingCriteriaList,
+    TextIteratorStreamer
+)
+from engine import metrics
+from engine.structured_output import OUTPUT_MODES, DecisionGrammar, DecisionGrammarProcessor, JsonObjectStop
+
+PRECISIONS = ("fp32", "bf16", "int8")
+
+def _quantized_cache_path(model_path: str) -> str:
+    """Cache file name tied to the model files and torch version, so stale weights are never reused."""
+    files = [os.path.join(root, f) for root, _, names in os.walk(model_path) for f in names] or [model_path]
+    newest = max((os.path.getmtime(f) for f in files if os.path.exists(f)), default=0)
+    stamp = hashlib.sha1(f"{os.path.abspath(model_path)}:{newest}:{torch.__version__}".encode()).hexdigest()[:12]
+    name = os.path.basename(os.path.normpath(model_path))
+    return os.path.join(Config.LLM_QUANTIZED_CACHE_DIR, f"{name}-int8-{stamp}.pt")
+
+def load_model(model_path: str, precision: str = Config.LLM_PRECISION):
+    """
+    fp32: weights as stored. bf16: half the memory, native on recent CPUs.
+    int8: dynamic quantization of every nn.Linear; the quantized module is
+    cached on disk so later starts skip the fp32 load and requantization.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown LLM_PRECISION '{precision}', expected one of {PRECISIONS}")
+
+    if precision == "bf16":
+        return AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.bfloat16)
+
+    if precision == "int8":
+        cache_path = _quantized_cache_path(model_path)
+        if os.path.exists(cache_path):
+            print(f"📦 Loading cached int8 weights: {cache_path}")
+            return torch.load(cache_path, weights_only=False)
+
+        model = AutoModelForCausalLM.from_pretrained(model_path)
+        print("🗜️ Quantizing linear layers to int8...")
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        os.makedirs(Config.LLM_QUANTIZED_CACHE_DIR, exist_ok=True)
+        torch.save(model, f"{cache_path}.tmp")
+        os.replace(f"{cache_path}.tmp", cache_path)
+        print(f"✅ Cached int8 weights at: {cache_path}")
+        return model
+
+    return AutoModelForCausalLM.from_pretrained(model_path)
+
+class FirstTokenTimer(LogitsProcessor):
+    """Notes when logits for the first new token exist, i.e. where prefill ends and decode starts."""
+
+    def __init__(self):
+        self.at = None
+
+    def __call__(self, input_ids, scores):
+        if self.at is None:
+            self.at = time.perf_counter()
+        return scores
+
+def _first_token_timer(kwargs: dict):
+    """Adds a FirstTokenTimer to the generate kwargs when metrics are enabled."""
+    if not metrics.ENABLED:
+        return None
+    timer = FirstTokenTimer()
+    kwargs["logits_processor"] = LogitsProcessorList([timer] + list(kwargs.get("logits_processor", [])))
+    return timer
+
+def _record_generation(first_token_at, start: float, prompt_tokens: int, generated_tokens: int, traces=None):
+    end = time.perf_counter()
+    first_token_at = first_token_at or end
+    metrics.record_generation(first_token_at - start, end - first_token_at, prompt_tokens, generated_tokens, traces)
 
 class LocalLLM:
-    def __init__(self, model_path: str = Config.LOCAL_MODEL_PATH, use_gpu: bool = Config.USE_GPU):
-        print(f"🚀 Loading local model from: {model_path}")
+    def __init__(self, model_path: str = Config.LOCAL_MODEL_PATH, use_gpu: bool = Config.USE_GPU,
+                 precision: str = Config.LLM_PRECISION):
+        print(f"🚀 Loading local model from: {model_path} ({precision})")
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.model = AutoModelForCausalLM.from_pretrained(model_path)
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"  # decoder-only: pad before the prompt
+        self.precision = precision
+        self.model = load_model(model_path, precision)
 
-        if use_gpu and torch.cuda.is_available():
+        if use_gpu and precision == "int8":
+            print("⚠️ Dynamic int8 quantization is CPU-only, ignoring USE_GPU")
+        elif use_gpu and torch.cuda.is_available():
             self.model = self.model.to("cuda")
             print("⚡ Using GPU")
         else:
             print("🧠 Using CPU")
 
-        self.generator = pipeline(
-            "text-generation",
-            model=self.model,
-            tokenizer=self.tokenizer,
-            device=0 if use_gpu and torch.cuda.is_available() else -1
-        )
+        self.model.eval()
+        self._prefix_text = None
+        self._prefix_ids = None
+        self._prefix_cache = None
+        self._grammar = None
 
-    def generate(self, prompt: str, max_tokens: int = Config.MAX_TOKENS, temperature: float = Config.TEMPERATURE) -> str:
-        print("📨 Prompt to LLM:", prompt[:200])
-        output = self.generator(
-            prompt,
+    def _generation_kwargs(self, max_tokens: int, temperature: float, structured: str = None) -> dict:
+        """
+        `structured`: "off" decodes up to max_tokens, "stop" ends each sequence
+        when its first JSON object closes, "grammar" additionally restricts
+        tokens to the decision schema. Defaults to LLM_STRUCTURED_OUTPUT.
+        """
+        structured = structured or Config.LLM_STRUCTURED_OUTPUT
+        if structured not in OUTPUT_MODES:
+            raise ValueError(f"Unknown LLM_STRUCTURED_OUTPUT '{structured}', expected one of {OUTPUT_MODES}")
+
+        kwargs = dict(
             max_new_tokens=max_tokens,
-            do_sample=True,
-            temperature=temperature,
-            top_k=50,
-            top_p=0.95,
             eos_token_id=self.tokenizer.eos_token_id,
             pad_token_id=self.tokenizer.pad_token_id,
         )
-        return output[0]['generated_text'][len(prompt):].strip()
+        if temperature > 0:
+            kwargs.update(do_sample=True, temperature=temperature, top_k=50, top_p=0.95)
+        else:
+            kwargs.update(do_sample=False)  # temperature 0 = greedy
+
+        if structured != "off":
+            kwargs["stopping_criteria"] = StoppingCriteriaList([JsonObjectStop(self.tokenizer)])
+        if structured == "grammar":
+            if self._grammar is None:
+                self._grammar = DecisionGrammar(self.tokenizer)  # token masks are cached here across calls
+            kwargs["logits_processor"] = LogitsProcessorList([
+                DecisionGrammarProcessor(self._grammar, max_tokens, [self.tokenizer.eos_token_id])
+            ])
+        return kwargs
+
+    def cache_prefix(self, prefix: str):
+        """
+        Precompute `past_key_values` for a constant prompt prefix. Prompts that
+        start with it only prefill their own suffix; the prefix cache is copied
+        per request because generation extends it in place.
+        """
+        ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self.model.device)
+        with torch.no_grad():
+            output = self.model(input_ids=ids, past_key_values=DynamicCache(), use_cache=True)
+        self._prefix_text = prefix
+        self._prefix_ids = ids
+        self._prefix_cache = output.past_key_values
+        print(f"🧩 Cached KV for {ids.shape[1]}-token prompt prefix")
+
+    def encode_prompt(self, prompt: str, reuse_prefix: bool = True):
+        """
+        Returns (input_ids, past_key_values). Prompts starting with the cached
+        prefix are tokenized as prefix + suffix, with or without the cache,
+        so cached and cold prefills see exactly the same tokens.
+        """
+        if self._prefix_text is not None and prompt.startswith(self._prefix_text):
+            suffix_ids = self.tokenizer(
+                prompt[len(self._prefix_text):], add_special_tokens=False, return_tensors="pt"
+            ).input_ids.to(self.model.device)
+            input_ids = torch.cat([self._prefix_ids, suffix_ids], dim=1)
+            return input_ids, copy.deepcopy(self._prefix_cache) if reuse_prefix else None
+        return self.tokenizer(prompt, return_tensors="pt").input_ids.to(self.model.device), None
+
+    def generate(self, prompt: str, max_tokens: int = Config.MAX_TOKENS, temperature: float = Config.TEMPERATURE,
+                 reuse_prefix: bool = True, structured: str = None) -> str:
+        print("📨 Prompt to LLM:", prompt[:200])
+        input_ids, past_key_values = self.encode_prompt(prompt, reuse_prefix)
+        kwargs = self._generation_kwargs(max_tokens, temperature, structured)
+        timer = _first_token_timer(kwargs)
+        start = time.perf_counter()
+        with torch.no_grad():
+            output_ids = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=past_key_values,
+                **kwargs
+            )
+        if timer:
+            _record_generation(timer.at, start, input_ids.shape[1], output_ids.shape[1] - input_ids.shape[1])
+        return self.tokenizer.decode(output_ids[0, input_ids.shape[1]:], skip_special_tokens=True).strip()
+
+    def generate_batch(self, prompts: List[str], max_tokens: int = Config.MAX_TOKENS,
+                       temperature: float = Config.TEMPERATURE, structured: str = None,
+                       traces: List = None) -> List[str]:
+        """
+        Runs several prompts through one left-padded `generate` call. Left
+        padding shifts the shared prefix, so only single prompts reuse its cache,
+        but every prompt is tokenized by `encode_prompt` so a claim gets the same
+        input tokens whether or not it was batched.
+        `traces` (one request trace per prompt, for callers on other threads)
+        receive the timings and each prompt's own token counts.
+        """
+        if len(prompts) == 1:
+            with metrics.use_trace(traces[0] if traces else metrics.current_trace()):
+                return [self.generate(prompts[0], max_tokens, temperature, structured=structured)]
+
+        print(f"📨 Batch of {len(prompts)} prompt(s) to LLM:", prompts[0][:200])
+        encoded = [self.encode_prompt(prompt, reuse_prefix=False)[0][0] for prompt in prompts]
+        width = max(len(ids) for ids in encoded)
+        input_ids = torch.full((len(encoded), width), self.tokenizer.pad_token_id,
+                               dtype=encoded[0].dtype, device=self.model.device)
+        attention_mask = torch.zeros_like(input_ids)
+        for row, ids in enumerate(encoded):
+            input_ids[row, width - len(ids):] = ids
+            attention_mask[row, width - len(ids):] = 1
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        kwargs = self._generation_kwargs(max_tokens, temperature, structured)
+        timer = _first_token_timer(kwargs)
+        start = time.perf_counter()
+        with torch.no_grad():
+            output_ids = self.model.generate(**inputs, **kwargs)
+        new_tokens = output_ids[:, inputs["input_ids"].shape[1]:]
+        if timer:
+            prompt_tokens = inputs["attention_mask"].sum(dim=1).tolist()
+            generated_tokens = (new_tokens != self.tokenizer.pad_token_id).sum(dim=1).tolist()
+            _record_generation(timer.at, start, sum(prompt_tokens), sum(generated_tokens),
+                               list(zip(traces, prompt_tokens, generated_tokens)) if traces is not None else None)
+        return [text.strip() for text in self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+    def stream(self, prompt: str, max_tokens: int = Config.MAX_TOKENS,
+               temperature: float = Config.TEMPERATURE, structured: str = None) -> Iterator[str]:
+        """Yields decoded text pieces as tokens are generated (generation runs in a thread)."""
+        print("📨 Streaming prompt to LLM:", prompt[:200])
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        input_ids, past_key_values = self.encode_prompt(prompt)
+        worker = threading.Thread(
+            target=self.model.generate,
+            kwargs=dict(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=past_key_values,
+                streamer=streamer,
+                **self._generation_kwargs(max_tokens, temperature, structured)
+            ),
+            daemon=True
+        )
+        start, first_token_at, pieces = time.perf_counter(), None, []
+        worker.start()
+        for text in streamer:
+            if text:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                if metrics.ENABLED:
+                    pieces.append(text)
+                yield text
+        worker.join()
+        if metrics.ENABLED:
+            generated = self.tokenizer("".join(pieces), add_special_tokens=False)["input_ids"]
+            _record_generation(first_token_at, start, input_ids.shape[1], len(generated))
+
+class BatchScheduler:
+    """
+    Micro-batching front end for LocalLLM. Concurrent callers submit prompts;
+    a single worker thread gathers requests that share generation settings
+    for up to `max_wait_ms` (or until `max_batch_size`), runs them as one
+    batched `generate` call and resolves each caller's future. Each request
+    carries its caller's metrics trace, so the prefill/decode split and token
+    counts still reach the request that asked.
+    """
+
+    def __init__(self, llm: LocalLLM, max_batch_size: int = Config.LLM_MAX_BATCH_SIZE,
+                 max_wait_ms: float = Config.LLM_MAX_WAIT_MS):
+        self.llm = llm
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="llm-batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, max_tokens: int = Config.MAX_TOKENS,
+               temperature: float = Config.TEMPERATURE) -> Future:
+        future = Future()
+        self._queue.put((prompt, (max_tokens, temperature), future, metrics.current_trace()))
+        return future
+
+    def generate(self, prompt: str, max_tokens: int = Config.MAX_TOKENS,
+                 temperature: float = Config.TEMPERATURE) -> str:
+        return self.submit(prompt, max_tokens, temperature).result()
+
+    def _run(self):
+        backlog = []  # requests with other settings, picked up by a later batch
+        while True:
+            first = backlog.pop(0) if backlog else self._queue.get()
+            settings = first[1]
+            batch = [first] + [item for item in backlog if item[1] == settings][:self.max_batch_size - 1]
+            backlog = [item for item in backlog if not any(item is b for b in batch)]
+
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                (batch if item[1] == settings else backlog).append(item)
+
+            self._execute(batch, settings)
+
+    def _execute(self, batch, settings):
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        max_tokens, temperature = settings
+        try:
+            outputs = self.llm.generate_batch([item[0] for item in batch], max_tokens, temperature,
+                                              traces=[item[3] for item in batch])
+        except Exception as e:
+            for item in batch:
+                item[2].set_exception(e)
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        for item, output in zip(batch, outputs):
+            item[2].set_result(output)
 
 # 🔬 Test CLI (optional)
 if __name__ == "__main__":
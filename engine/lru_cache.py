@@ -1,37 +1,191 @@
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from config import Config
+import sys
 import time
+import threading
+
+def approx_size(value, _seen=None) -> int:
+    """Rough deep size in bytes of a cached value (containers, strings, NumPy arrays)."""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes + 96  # ndarray header
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k, _seen) + approx_size(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        size += sum(approx_size(item, _seen) for item in value)
+    return size
+
+class _Shard:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.last_sweep = time.time()
 
 class LRUCache:
-    def __init__(self, max_size=Config.CACHE_MAX_QUERIES, ttl_minutes=Config.SESSION_TTL_MINUTES):
-        self.cache = OrderedDict()
+    """
+    Thread-safe LRU with TTL. Keys are spread over lock-striped shards, each
+    holding its share of the entry (`max_size`) and byte (`max_bytes`)
+    budgets. Expired entries are removed on access, by an amortized per-shard
+    sweep every `sweep_seconds`, or by an optional background sweeper.
+    """
+
+    def __init__(self, max_size=Config.CACHE_MAX_QUERIES, ttl_minutes=Config.SESSION_TTL_MINUTES,
+                 max_bytes=Config.CACHE_MAX_BYTES, shards=Config.CACHE_SHARDS,
+                 sweep_seconds=Config.CACHE_SWEEP_SECONDS):
         self.max_size = max_size
-        self.ttl = ttl_minutes * 60  # convert to seconds
+        self.max_bytes = max_bytes
+        self.ttl = ttl_minutes * 60 if ttl_minutes is not None else None  # seconds; None = never expire
+        self.sweep_seconds = sweep_seconds
+
+        # Small caches keep a single shard so per-shard capacity stays meaningful
+        num_shards = max(1, min(shards, max_size // 16 if max_size else shards))
+        self._shards = [_Shard() for _ in range(num_shards)]
+        self._shard_max_size = -(-max_size // num_shards) if max_size else None
+        self._shard_max_bytes = max_bytes // num_shards if max_bytes else None
+
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._sweeper = None
+
+    def _shard(self, key) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _is_expired(self, entry, now=None):
+        return self.ttl is not None and (now or time.time()) - entry["timestamp"] > self.ttl
+
+    def _count(self, hits=0, misses=0, evictions=0, expirations=0):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+            self.evictions += evictions
+            self.expirations += expirations
 
-    def _is_expired(self, entry):
-        return time.time() - entry["timestamp"] > self.ttl
+    def _remove(self, shard: _Shard, key):
+        entry = shard.entries.pop(key)
+        shard.bytes -= entry["size"]
+
+    def _sweep_shard(self, shard: _Shard, now: float) -> int:
+        # Caller holds shard.lock
+        shard.last_sweep = now
+        if self.ttl is None:
+            return 0
+        expired = [key for key, entry in shard.entries.items() if self._is_expired(entry, now)]
+        for key in expired:
+            self._remove(shard, key)
+        return len(expired)
+
+    def _maybe_sweep(self, shard: _Shard, now: float) -> int:
+        if self.ttl is not None and now - shard.last_sweep > self.sweep_seconds:
+            return self._sweep_shard(shard, now)
+        return 0
 
     def get(self, key):
-        if key in self.cache:
-            entry = self.cache.pop(key)
-            if not self._is_expired(entry):
-                # Move to end to show recent use
-                self.cache[key] = entry
-                return entry["value"]
-        return None
+        shard = self._shard(key)
+        now = time.time()
+        hit = False
+        value = None
+        with shard.lock:
+            expired = self._maybe_sweep(shard, now)
+            entry = shard.entries.get(key)
+            if entry is not None:
+                if self._is_expired(entry, now):
+                    self._remove(shard, key)
+                    expired += 1
+                else:
+                    shard.entries.move_to_end(key)  # Mark as recently used
+                    hit = True
+                    value = entry["value"]
+        self._count(hits=int(hit), misses=int(not hit), expirations=expired)
+        return value
 
     def set(self, key, value):
-        if key in self.cache:
-            self.cache.pop(key)
-        elif len(self.cache) >= self.max_size:
-            self.cache.popitem(last=False)  # Remove LRU
-        self.cache[key] = {"value": value, "timestamp": time.time()}
+        shard = self._shard(key)
+        now = time.time()
+        size = approx_size(value)
+        evicted = 0
+        with shard.lock:
+            expired = self._maybe_sweep(shard, now)
+            if key in shard.entries:
+                self._remove(shard, key)
+            shard.entries[key] = {"value": value, "timestamp": now, "size": size}
+            shard.bytes += size
+            while len(shard.entries) > 1 and (
+                (self._shard_max_size and len(shard.entries) > self._shard_max_size)
+                or (self._shard_max_bytes and shard.bytes > self._shard_max_bytes)
+            ):
+                _, entry = shard.entries.popitem(last=False)  # Remove LRU
+                shard.bytes -= entry["size"]
+                evicted += 1
+        self._count(evictions=evicted, expirations=expired)
+
+    def delete(self, key):
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.entries:
+                self._remove(shard, key)
 
     def clear(self):
-        self.cache.clear()
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.bytes = 0
+
+    def sweep(self) -> int:
+        """Removes every expired entry now; returns how many were dropped."""
+        now = time.time()
+        expired = 0
+        for shard in self._shards:
+            with shard.lock:
+                expired += self._sweep_shard(shard, now)
+        self._count(expirations=expired)
+        return expired
+
+    def start_sweeper(self, interval_seconds=None):
+        """Starts a daemon thread that sweeps expired entries periodically."""
+        if self._sweeper is not None:
+            return
+        interval = interval_seconds or self.sweep_seconds
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.sweep()
+
+        self._sweeper = threading.Thread(target=loop, name="lru-cache-sweeper", daemon=True)
+        self._sweeper.start()
 
     def get_all_keys(self):
-        return list(self.cache.keys())
+        keys = []
+        for shard in self._shards:
+            with shard.lock:
+                keys.extend(shard.entries.keys())
+        return keys
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def stats(self):
+        with self._stats_lock:
+            counters = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+        counters["entries"] = len(self)
+        counters["bytes"] = sum(shard.bytes for shard in self._shards)
+        return counters
 
 # Global shared instance
 session_cache = LRUCache()
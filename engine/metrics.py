@@ -0,0 +1,271 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+from config import Config
+
+# Read once: with METRICS_ENABLED off, `traced` returns functions unwrapped
+# and `stage` a shared no-op context, so the pipeline pays nothing
+ENABLED = Config.METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+HELP = {
+    "policy_stage_seconds": "Time spent in each pipeline stage",
+    "policy_request_seconds": "HTTP request duration per endpoint, including streamed bodies",
+    "policy_requests_total": "HTTP requests per endpoint and status",
+    "policy_llm_prompt_tokens_total": "Prompt tokens sent to the LLM",
+    "policy_llm_generated_tokens_total": "Tokens generated by the LLM",
+    "policy_llm_decode_tokens_per_second": "Decode throughput per generate call (tokens after the first)",
+}
+
+class Histogram:
+    """Cumulative Prometheus buckets plus a window of recent samples for p50/p95/p99."""
+
+    def __init__(self, buckets: Tuple[float, ...], window: int = Config.METRICS_WINDOW):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self) -> Dict[float, float]:
+        values = sorted(self.recent)
+        if not values:
+            return {}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in QUANTILES}
+
+# Per-process registry: (metric name, sorted label items) → value
+_histograms: Dict[Tuple[str, tuple], Histogram] = {}
+_counters: Dict[Tuple[str, tuple], float] = {}
+_collectors: Dict[str, Callable[[], Dict]] = {}
+_lock = threading.Lock()
+
+def observe(name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+def inc(name: str, amount: float = 1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def register_collector(name: str, stats: Callable[[], Dict]):
+    """`stats()` is called on every scrape; its numeric values become `policy_<name>_<key>` gauges."""
+    _collectors[name] = stats
+
+def rss_bytes() -> int:
+    """Resident set size of this process, including shared pages such as a mapped index (Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+# Scrapes reach one worker at a time: the pid tells them apart
+register_collector("process", lambda: {"pid": os.getpid(), "rss_bytes": rss_bytes()})
+
+def quantiles(name: str, **labels) -> Dict[float, float]:
+    with _lock:
+        histogram = _histograms.get((name, tuple(sorted(labels.items()))))
+        return histogram.quantiles() if histogram else {}
+
+class Trace:
+    """Stage timings and token counts of one request."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name: str, amount: float):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def to_dict(self) -> Dict:
+        return dict({"stages_ms": {k: round(v * 1000, 2) for k, v in self.stages.items()}}, **self.counts)
+
+    def server_timing(self) -> str:
+        """`Server-Timing` header value, shown per request by browser dev tools."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+
+def begin_trace() -> Optional[Trace]:
+    if not ENABLED:
+        return None
+    trace = Trace()
+    _trace.set(trace)
+    return trace
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+@contextmanager
+def use_trace(trace: Optional[Trace]):
+    """Makes `trace` the current one inside the block, e.g. for work done on behalf of another thread's request."""
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+def record_stage(stage: str, seconds: float):
+    observe("policy_stage_seconds", seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record_stage(self.name, time.perf_counter() - self.start)
+
+_NOOP = nullcontext()
+
+def stage(name: str):
+    """`with stage("search"): ...` times a block into the stage histogram and the request trace."""
+    return _Stage(name) if ENABLED else _NOOP
+
+def traced(name: str):
+    """Decorator form of `stage` for plain (non-generator) functions."""
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def trace_generation(trace: Optional[Trace], prefill_seconds: float, decode_seconds: float,
+                     prompt_tokens: int, generated_tokens: int):
+    """Adds one generate call's prefill/decode split and token counts to a request trace."""
+    if trace is None:
+        return
+    trace.add("llm_prefill", prefill_seconds)
+    trace.add("llm_decode", decode_seconds)
+    trace.count("prompt_tokens", prompt_tokens)
+    trace.count("generated_tokens", generated_tokens)
+    if decode_seconds > 0 and generated_tokens > 1:
+        trace.counts["tokens_per_second"] = round((generated_tokens - 1) / decode_seconds, 1)
+
+def record_generation(prefill_seconds: float, decode_seconds: float, prompt_tokens: int, generated_tokens: int,
+                      traces: List[Tuple[Optional[Trace], int, int]] = None):
+    """
+    Prefill/decode split and token counts of one LLM generate call. The
+    request traces default to the current one; a call batched for several
+    requests on another thread passes (trace, prompt tokens, generated
+    tokens) for each caller instead.
+    """
+    observe("policy_stage_seconds", prefill_seconds, stage="llm_prefill")
+    observe("policy_stage_seconds", decode_seconds, stage="llm_decode")
+    inc("policy_llm_prompt_tokens_total", prompt_tokens)
+    inc("policy_llm_generated_tokens_total", generated_tokens)
+    if decode_seconds > 0 and generated_tokens > 1:
+        observe("policy_llm_decode_tokens_per_second", (generated_tokens - 1) / decode_seconds, RATE_BUCKETS)
+    if traces is None:
+        traces = [(_trace.get(), prompt_tokens, generated_tokens)]
+    for trace, trace_prompt_tokens, trace_generated_tokens in traces:
+        trace_generation(trace, prefill_seconds, decode_seconds, trace_prompt_tokens, trace_generated_tokens)
+
+def _labels(items, **extra) -> str:
+    pairs = list(items) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _with_hit_rate(stats: Dict) -> Dict:
+    hits = sum(v for k, v in stats.items() if k.endswith("hits") and isinstance(v, (int, float)))
+    if "hit_rate" not in stats and "misses" in stats and hits + stats["misses"]:
+        stats = dict(stats, hit_rate=hits / (hits + stats["misses"]))
+    return stats
+
+def _flatten(stats: Dict, prefix: str) -> Dict[str, float]:
+    flat = {}
+    for key, value in _with_hit_rate(stats).items():
+        name = f"{prefix}_{key}".replace("-", "_")
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def render() -> str:
+    """All metrics of this process in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+        snapshot = [(key, h.buckets, list(h.counts), h.sum, h.count, h.quantiles(), list(h.recent))
+                    for key, h in histograms]
+
+    last = None
+    for (name, labels), buckets, counts, total, count, window, recent in snapshot:
+        if name != last:
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            last = name
+        cumulative = 0
+        for bound, n in zip(list(buckets) + ["+Inf"], counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+
+    # Quantiles over the last METRICS_WINDOW samples, as a separate summary family
+    last = None
+    for (name, labels), *_, window, recent in snapshot:
+        if name != last:
+            lines += [f"# HELP {name}_recent {HELP.get(name, name)} (last {Config.METRICS_WINDOW} samples)",
+                      f"# TYPE {name}_recent summary"]
+            last = name
+        for q, value in window.items():
+            lines.append(f"{name}_recent{_labels(labels, quantile=q)} {value}")
+        lines.append(f"{name}_recent_sum{_labels(labels)} {sum(recent)}")
+        lines.append(f"{name}_recent_count{_labels(labels)} {len(recent)}")
+
+    last = None
+    for (name, labels), value in counters:
+        if name != last:
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} counter"]
+            last = name
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+    for collector, stats in sorted(_collectors.items()):
+        try:
+            values = _flatten(stats() or {}, f"policy_{collector}")
+        except Exception as e:
+            print(f"⚠️ Metrics collector '{collector}' failed: {e}")
+            continue
+        for name, value in values.items():
+            lines += [f"# HELP {name} From {collector} stats", f"# TYPE {name} gauge", f"{name} {value}"]
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,87 @@
+import os
+import re
+import faiss
+import numpy as np
+from typing import Dict, Iterable, Optional, Union
+from config import Config
+from engine.chunk_store import ChunkStore
+
+# Partition keys look like "doc_type:policy", "source:policies/HDFHLIP23024V072223.pdf", "insurer:HDF".
+# Sources are paths below the data root; the bare file name is a partition too
+# (covering every folder that has a file of that name).
+PARTITION_FIELDS = ("doc_type", "source", "insurer")
+
+# IRDAI product UIN: 3-letter insurer code, product line, serial, version and
+# filing year, e.g. HDF HLIP 23024 V07 2223
+_UIN = re.compile(r"^([A-Z]{3})[A-Z]{2,5}\d{5}V\d{6}")
+
+def insurer_code(source: str) -> str:
+    match = _UIN.match(os.path.basename(source).upper())
+    return match.group(1) if match else "unknown"
+
+def build_partitions(store: ChunkStore) -> Dict[str, np.ndarray]:
+    """Sorted live vector IDs per partition key, computed from the store's code columns."""
+    live = np.flatnonzero(store.deleted == 0)
+    source_codes = store.source_codes[live]
+    doc_type_codes = store.doc_type_codes[live]
+    partitions = {}
+
+    for code, doc_type in enumerate(store.doc_types):
+        partitions[f"doc_type:{doc_type}"] = live[doc_type_codes == code]
+    codes_by_insurer, codes_by_name = {}, {}
+    for code, source in enumerate(store.sources):
+        partitions[f"source:{source}"] = live[source_codes == code]
+        codes_by_insurer.setdefault(insurer_code(source), []).append(code)
+        if os.path.basename(source) != source:
+            codes_by_name.setdefault(os.path.basename(source), []).append(code)
+    for insurer, codes in codes_by_insurer.items():
+        partitions[f"insurer:{insurer}"] = live[np.isin(source_codes, codes)]
+    for name, codes in codes_by_name.items():
+        partitions.setdefault(f"source:{name}", live[np.isin(source_codes, codes)])
+
+    return {key: ids.astype("int64") for key, ids in partitions.items() if len(ids)}
+
+def write_partitions(partitions: Dict[str, np.ndarray], count: int, path: str):
+    """One .npz with flat ids + offsets; `count` ties it to the chunk store it came from."""
+    keys = sorted(partitions)
+    offsets = np.zeros(len(keys) + 1, dtype="int64")
+    offsets[1:] = np.cumsum([len(partitions[key]) for key in keys])
+    ids = np.concatenate([partitions[key] for key in keys]) if keys else np.empty(0, dtype="int64")
+    with open(path, "wb") as f:  # file object: np.savez would append ".npz" to a path
+        np.savez(f, keys=np.array(keys, dtype=str), offsets=offsets, ids=ids, count=np.int64(count))
+
+def load_partitions(store: ChunkStore, path: str = Config.PARTITIONS_PATH) -> Dict[str, np.ndarray]:
+    """Partitions written by the indexer, or rebuilt from the store if missing or stale."""
+    if os.path.exists(path):
+        with np.load(path) as data:
+            if int(data["count"]) == len(store):
+                keys, offsets, ids = data["keys"], data["offsets"], data["ids"]
+                return {str(key): ids[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+        print(f"⚠️ {path} does not match the chunk store, rebuilding partitions")
+    return build_partitions(store)
+
+def select_ids(partitions: Dict[str, np.ndarray],
+               filters: Optional[Dict[str, Union[str, Iterable[str]]]]) -> Optional[np.ndarray]:
+    """
+    IDs matching every filter field (a list of values matches any of them).
+    None means "no filter"; an empty array means nothing matches.
+    """
+    filters = {field: value for field, value in (filters or {}).items() if value}
+    if not filters:
+        return None
+
+    selected = None
+    for field, values in filters.items():
+        if field not in PARTITION_FIELDS:
+            raise ValueError(f"Unknown filter '{field}', expected one of {PARTITION_FIELDS}")
+        values = [values] if isinstance(values, str) else list(values)
+        if field == "insurer":
+            values = [value.upper() for value in values]
+        parts = [partitions.get(f"{field}:{value}", np.empty(0, dtype="int64")) for value in values]
+        ids = np.unique(np.concatenate(parts))
+        selected = ids if selected is None else np.intersect1d(selected, ids, assume_unique=True)
+    return selected
+
+def make_selector(ids: np.ndarray):
+    """Hash-set selector: FAISS only computes distances for member IDs."""
+    return faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype="int64"))
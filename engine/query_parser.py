@@ -1,5 +1,6 @@
 import re
 from typing import Dict
+from engine.metrics import traced
 
 # Regex patterns for key fields
 AGE_PATTERN = re.compile(r'(\d{1,3})\s*[-]?\s*(year\s*old|yo|yr|y/o|M|F)?', re.IGNORECASE)
@@ -7,6 +8,7 @@ PROCEDURE_PATTERN = re.compile(r"(surgery|treatment|operation|therapy|scan|trans
 LOCATION_PATTERN = re.compile(r"in\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)", re.IGNORECASE)
 DURATION_PATTERN = re.compile(r"(\d+)\s*[-]?\s*(month|year|day)s?", re.IGNORECASE)
 
+@traced("parse_query")
 def parse_query(query: str) -> Dict[str, str]:
     """Extracts age, procedure, location, and policy duration from query"""
     result = {
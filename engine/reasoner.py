@@ -1,9 +1,89 @@
+import os
+import json
+import time
+import threading
+from engine import retriever
 from engine.query_parser import parse_query
-from engine.retriever import retrieve_clauses
-from engine.llm_local_runner import LocalLLM
+from engine.retriever import retrieve_clauses, retrieve_clauses_batch
+from engine.context_compressor import compress_clauses
+from engine.rule_index import rule_decision
+from engine.decision_cache import DecisionCache, decision_fingerprint
+from engine.metrics import register_collector, stage, traced
+from config import Config
 
-llm = LocalLLM()
+# Built on first use (or by preload/warmup) so importing this module is cheap
+_llm = None
+_scheduler = None
+_scheduler_pid = None
+_llm_lock = threading.RLock()
 
+# Identical (parsed query, retrieved chunks, index/model) → identical prompt
+decision_cache = DecisionCache()
+
+# Queries answered from the rule index vs. sent down the retrieval + LLM path
+fast_path = {"hits": 0, "misses": 0}
+_fast_path_lock = threading.Lock()
+
+register_collector("decision_cache", lambda: decision_cache.stats())
+register_collector("rule_fast_path", lambda: fast_path_stats())
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                # torch/transformers are imported here, not at module import
+                from engine.llm_local_runner import LocalLLM
+                llm = LocalLLM()
+                if Config.LLM_PREFIX_CACHE:
+                    llm.cache_prefix(PROMPT_PREFIX)
+                _llm = llm
+    return _llm
+
+def get_scheduler():
+    """Per-process BatchScheduler; its worker thread does not survive a fork."""
+    global _scheduler, _scheduler_pid
+    if not Config.LLM_BATCHING_ENABLED:
+        return None
+    if _scheduler is None or _scheduler_pid != os.getpid():
+        with _llm_lock:
+            if _scheduler is None or _scheduler_pid != os.getpid():
+                from engine.llm_local_runner import BatchScheduler
+                _scheduler = BatchScheduler(get_llm())
+                _scheduler_pid = os.getpid()
+    return _scheduler
+
+def preload():
+    """
+    Loads model weights, embedding model and index without running them.
+    Call before forking workers so they share the read-only pages copy-on-write.
+    """
+    retriever.load_resources()
+    get_llm()
+
+def warmup():
+    """preload() plus one tiny forward pass per model; run in each worker after fork."""
+    preload()
+    retriever.warmup()
+    get_llm().generate_batch(["warmup"], max_tokens=1)
+
+def decision_version() -> str:
+    return (f"{retriever.index_version()}:{Config.EMBEDDING_MODEL_NAME}:{Config.LOCAL_MODEL_PATH}:"
+            f"{Config.LLM_PRECISION}:{Config.LLM_STRUCTURED_OUTPUT}:{Config.TEMPERATURE}:"
+            f"{Config.CONTEXT_COMPRESSION and Config.CONTEXT_TOKEN_BUDGET}")
+
+# Constant instructions come first so LocalLLM can reuse their KV cache
+PROMPT_PREFIX = (
+    "You are an insurance claims assistant. You will be given a user's details and "
+    "clauses retrieved from the insurance policy documents.\n"
+    "Based on the clauses, answer:\n"
+    "1. Is the procedure covered? (approved/rejected)\n"
+    "2. What is the payout amount if applicable?\n"
+    "3. Justify the decision by referring to clause(s).\n"
+    "Respond in JSON format with keys: decision, amount, justification.\n\n"
+)
+
+@traced("build_prompt")
 def build_prompt(parsed: dict, matched_clauses: list) -> str:
     """
     Construct a prompt for the local LLM based on parsed user input and matched policy clauses.
@@ -18,29 +98,48 @@ def build_prompt(parsed: dict, matched_clauses: list) -> str:
     clause_summary = "\n".join([f"- {c['text']}" for c in matched_clauses])
 
     prompt = (
+        f"{PROMPT_PREFIX}"
         f"A user has the following details:\n"
         f"{user_info}\n\n"
         f"The following clauses were retrieved from the insurance policy documents:\n"
         f"{clause_summary}\n\n"
-        f"Based on the clauses, answer:\n"
-        f"1. Is the procedure covered? (approved/rejected)\n"
-        f"2. What is the payout amount if applicable?\n"
-        f"3. Justify the decision by referring to clause(s).\n"
-        f"Respond in JSON format with keys: decision, amount, justification."
+        f"JSON response:\n"
     )
 
     return prompt
 
+@traced("compress_context")
+def compress_context(parsed: dict, matched_clauses: list, token_budget: int = Config.CONTEXT_TOKEN_BUDGET) -> list:
+    """
+    Query-relevant sentences of the retrieved clauses, packed into
+    `token_budget` LLM tokens (see engine/context_compressor.py). Returns the
+    clauses unchanged when CONTEXT_COMPRESSION is off.
+    """
+    if not Config.CONTEXT_COMPRESSION or not matched_clauses:
+        return matched_clauses
+    tokenizer = get_llm().tokenizer
+    return compress_clauses(
+        retriever.embed_query(retriever.query_text(parsed)),
+        matched_clauses,
+        encode=lambda sentences: retriever.MODEL.encode(sentences, convert_to_numpy=True),
+        count_tokens=lambda texts: [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]],
+        token_budget=token_budget,
+        model_name=Config.EMBEDDING_MODEL_NAME
+    )
+
 def run_llm_reasoning(parsed: dict, matched_clauses: list) -> dict:
     """
     Generate a decision using the local LLM.
     """
-    prompt = build_prompt(parsed, matched_clauses)
-    raw_output = llm.generate(prompt)
+    prompt = build_prompt(parsed, compress_context(parsed, matched_clauses))
+    scheduler = get_scheduler()
+    with stage("llm"):  # wall time incl. batch queueing; prefill/decode are recorded by LocalLLM
+        raw_output = scheduler.generate(prompt) if scheduler else get_llm().generate(prompt)
+    return parse_llm_output(raw_output)
 
+def parse_llm_output(raw_output: str) -> dict:
     # Fallback parser if LLM returns non-strict JSON
     try:
-        import json
         start = raw_output.find("{")
         end = raw_output.rfind("}") + 1
         json_block = raw_output[start:end]
@@ -52,36 +151,227 @@ def run_llm_reasoning(parsed: dict, matched_clauses: list) -> dict:
             "justification": f"Failed to parse LLM response: {e}\nRaw Output: {raw_output}"
         }
 
-def reason_over_query(raw_query: str) -> dict:
+def _cacheable(result: dict) -> bool:
+    return result.get("decision", "unknown") != "unknown"  # sampling may parse next time
+
+def decide(parsed: dict, matched_clauses: list) -> dict:
     """
-    Full pipeline: Parse → Retrieve → Reason → Return Decision
+    LLM decision for a parsed query, served from the decision cache when
+    possible. Concurrent identical requests share one generation. The
+    returned dict carries "cache": "hit" | "coalesced" | "miss" | "disabled".
     """
-    parsed = parse_query(raw_query)
-    matched_clauses = retrieve_clauses(parsed, top_k=5)
+    if not Config.DECISION_CACHE_ENABLED:
+        return dict(run_llm_reasoning(parsed, matched_clauses), cache="disabled")
+
+    key = decision_fingerprint(parsed, matched_clauses, decision_version())
+    result, status = decision_cache.get_or_compute(
+        key,
+        lambda: run_llm_reasoning(parsed, matched_clauses),
+        cacheable=_cacheable
+    )
+    result["cache"] = status
+    return result
+
+def _stream_generation(parsed: dict, matched_clauses: list):
+    """Yields ("token", text) pieces, then ("decision", parsed result with timing stats)."""
+    prompt = build_prompt(parsed, compress_context(parsed, matched_clauses))
+    start = time.perf_counter()
+    first_token_at = None
+    pieces = []
+    llm = get_llm()
+    for piece in llm.stream(prompt):
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        pieces.append(piece)
+        yield "token", piece
+    finished_at = time.perf_counter()
+
+    raw_output = "".join(pieces).strip()
+    yield "decision", dict(
+        parse_llm_output(raw_output),
+        stats={
+            "ttft_ms": round(((first_token_at or finished_at) - start) * 1000, 1),
+            "total_ms": round((finished_at - start) * 1000, 1),
+            "generated_tokens": len(llm.tokenizer(raw_output, add_special_tokens=False)["input_ids"]),
+        }
+    )
+
+def stream_llm_reasoning(parsed: dict, matched_clauses: list):
+    """
+    Streaming variant of `decide`: yields ("token", text) pieces as the LLM
+    decodes, then ("decision", result) where result also carries timing
+    stats (time-to-first-token, total time, generated tokens). Cached
+    decisions, and those of an identical stream already running, are
+    yielded without tokens. If that other stream fails or its client goes
+    away, this one generates for itself.
+    """
+    if not Config.DECISION_CACHE_ENABLED:
+        for kind, payload in _stream_generation(parsed, matched_clauses):
+            yield kind, dict(payload, cache="disabled") if kind == "decision" else payload
+        return
 
+    key = decision_fingerprint(parsed, matched_clauses, decision_version())
+    cached = decision_cache.get(key)
+    if cached is not None:
+        decision_cache.record("hit")
+        yield "decision", dict(cached, cache="hit")
+        return
+
+    call, leader = decision_cache.flight.begin(key)
+    if not leader:
+        try:
+            result = decision_cache.flight.wait(call)
+        except Exception:
+            result = None
+        if result is not None:
+            decision_cache.record("coalesced")
+            yield "decision", dict(result, cache="coalesced")
+            return
+
+    decision_cache.record("miss")
+    result, error = None, None
+    try:
+        for kind, payload in _stream_generation(parsed, matched_clauses):
+            if kind == "decision":
+                result = {k: v for k, v in payload.items() if k != "stats"}
+                if _cacheable(result):
+                    decision_cache.put(key, result)
+                payload = dict(payload, cache="miss")
+            yield kind, payload
+    except Exception as e:
+        error = e
+        raise
+    finally:  # also on GeneratorExit, when the client disconnects mid-stream
+        if leader:
+            decision_cache.flight.finish(key, call, result,
+                                         None if result is not None else error or RuntimeError("stream abandoned"))
+
+def decide_batch(parsed_list: list, clauses_list: list) -> list:
+    """
+    `decide` for many queries at once. Cached decisions are returned as hits,
+    duplicates within the batch share one generation ("coalesced" when the
+    cache is enabled, otherwise "disabled" like every other row), and the
+    remaining prompts go to the LLM together: through the BatchScheduler when
+    enabled, otherwise as `generate_batch` calls of LLM_MAX_BATCH_SIZE.
+    """
+    version = decision_version()
+    keys = [decision_fingerprint(parsed, clauses, version) for parsed, clauses in zip(parsed_list, clauses_list)]
+    results = [None] * len(keys)
+    pending = {}
+    for i, key in enumerate(keys):
+        cached = decision_cache.get(key) if Config.DECISION_CACHE_ENABLED else None
+        if cached is not None:
+            decision_cache.record("hit")
+            results[i] = dict(cached, cache="hit")
+        else:
+            pending.setdefault(key, []).append(i)
+
+    prompts = [build_prompt(parsed_list[rows[0]], compress_context(parsed_list[rows[0]], clauses_list[rows[0]]))
+               for rows in pending.values()]
+    scheduler = get_scheduler()
+    with stage("llm"):
+        if scheduler:
+            outputs = [future.result() for future in [scheduler.submit(prompt) for prompt in prompts]]
+        else:
+            size = max(1, Config.LLM_MAX_BATCH_SIZE)
+            outputs = [output for start in range(0, len(prompts), size)
+                       for output in get_llm().generate_batch(prompts[start:start + size])]
+
+    for (key, rows), output in zip(pending.items(), outputs):
+        result = parse_llm_output(output)
+        if not Config.DECISION_CACHE_ENABLED:
+            for i in rows:
+                results[i] = dict(result, cache="disabled")
+            continue
+        decision_cache.record("miss")
+        decision_cache.record("coalesced", len(rows) - 1)
+        if _cacheable(result):
+            decision_cache.put(key, result)
+        for n, i in enumerate(rows):
+            results[i] = dict(result, cache="miss" if n == 0 else "coalesced")
+    return results
+
+def _query_result(parsed: dict, matched_clauses: list, decision: dict = None) -> dict:
     if not matched_clauses:
         return {
             "decision": "unknown",
             "amount": None,
             "justification": "No relevant clauses found.",
             "matched_clauses": [],
-            "parsed": parsed
+            "parsed": parsed,
+            "path": "llm"
         }
-
-    result = run_llm_reasoning(parsed, matched_clauses)
-
     return {
-        "decision": result.get("decision", "unknown"),
-        "amount": result.get("amount"),
-        "justification": result.get("justification"),
+        "decision": decision.get("decision", "unknown"),
+        "amount": decision.get("amount"),
+        "justification": decision.get("justification"),
         "matched_clauses": matched_clauses,
-        "parsed": parsed
+        "parsed": parsed,
+        "cache": decision.get("cache"),
+        "path": decision.get("path", "llm")
     }
 
+def rule_fast_path(raw_query: str, parsed: dict, filters: dict = None):
+    """
+    Deterministic result from the rule index, with the cited chunks as
+    matched clauses, or None when the query needs retrieval + LLM. With
+    `filters`, only rules from documents in the filtered partition count.
+    """
+    if not Config.RULE_FAST_PATH:
+        return None
+    snapshot = retriever.current_snapshot()  # rules and cited chunks from the same version
+    with stage("rule_fast_path"):
+        decision = rule_decision(raw_query, parsed, snapshot.rules, retriever.filter_sources(filters, snapshot))
+    with _fast_path_lock:
+        fast_path["hits" if decision else "misses"] += 1
+    if decision is None:
+        return None
+    clauses = retriever.clauses_by_id([rule["vector_id"] for rule in decision["citations"]], snapshot)
+    return _query_result(parsed, clauses, dict(decision, path="rules"))
+
+def fast_path_stats() -> dict:
+    total = fast_path["hits"] + fast_path["misses"]
+    return dict(fast_path, hit_rate=fast_path["hits"] / total if total else 0.0)
+
+def reason_over_query(raw_query: str) -> dict:
+    """
+    Full pipeline: Parse → (Rule fast path | Retrieve → Reason) → Return Decision
+    """
+    parsed = parse_query(raw_query)
+    fast = rule_fast_path(raw_query, parsed)
+    if fast:
+        return fast
+
+    matched_clauses = retrieve_clauses(parsed, top_k=5)
+    if not matched_clauses:
+        return _query_result(parsed, matched_clauses)
+    return _query_result(parsed, matched_clauses, decide(parsed, matched_clauses))
+
+def reason_over_queries(raw_queries: list, filters: list = None) -> list:
+    """
+    Batch pipeline: parse every query, answer what the rule index can, embed
+    and search the rest together, then decide those with clauses in LLM
+    batches. `filters` is per query.
+    """
+    filters = filters or [None] * len(raw_queries)
+    parsed_list = [parse_query(raw_query) for raw_query in raw_queries]
+    results = [rule_fast_path(raw_query, parsed, query_filters)
+               for raw_query, parsed, query_filters in zip(raw_queries, parsed_list, filters)]
+
+    todo = [i for i, result in enumerate(results) if result is None]
+    clauses_list = retrieve_clauses_batch([parsed_list[i] for i in todo], top_k=5, filters=[filters[i] for i in todo])
+    with_clauses = [n for n, clauses in enumerate(clauses_list) if clauses]
+    decisions = dict(zip(with_clauses, decide_batch([parsed_list[todo[n]] for n in with_clauses],
+                                                    [clauses_list[n] for n in with_clauses])))
+    for n, i in enumerate(todo):
+        results[i] = _query_result(parsed_list[i], clauses_list[n], decisions.get(n))
+    return results
+
 # 🧪 CLI Test
 if __name__ == "__main__":
     query = "46M, knee surgery in Pune, 3-month policy"
     result = reason_over_query(query)
     from pprint import pprint
     pprint(result)
+    print("⚡ Rule fast path:", fast_path_stats())
 
@@ -1,48 +1,292 @@
-import faiss
-import numpy as np
+import os
 import json
-from sentence_transformers import SentenceTransformer
+import time
+import threading
+import numpy as np
+from typing import Dict, List, Optional
 from config import Config
+from engine.chunk_store import ChunkStore
+from engine.embedding_cache import EmbeddingCache
+from engine.faiss_index import make_search_params, read_index, widened_search_params
+from engine.lru_cache import LRUCache
+from engine.metrics import register_collector, traced
+from engine.partitions import load_partitions, make_selector, select_ids
+from engine.rule_index import load_rule_index
+
+class IndexSnapshot:
+    """
+    One published index version. Never modified: a hot reload builds a new
+    snapshot and swaps the SNAPSHOT reference, so a caller that reads it once
+    sees an index, store, partitions and rules that belong together.
+    """
+    __slots__ = ("index", "metadata", "partitions", "rules", "version")
 
-# Load embedding model
-MODEL = SentenceTransformer(Config.EMBEDDING_MODEL_NAME)
+    def __init__(self, index, metadata: ChunkStore, partitions: Dict, rules, version: int):
+        self.index = index  # memory-mapped when FAISS_LOAD_MODE=mmap and the index type supports it
+        self.metadata = metadata  # memory-mapped; position == FAISS vector ID, removed chunks are tombstoned
+        self.partitions = partitions  # "doc_type:policy" / "source:<file>" / "insurer:HDF" → sorted vector IDs
+        self.rules = rules  # waiting periods/exclusions/sub-limits per procedure keyword, for the LLM-free fast path
+        self.version = version  # bumped by the indexer on every publish; part of the decision cache key
 
-# Load FAISS index
-INDEX = faiss.read_index(Config.FAISS_INDEX_PATH)
+# Populated by load_resources() on first use, so importing this module is cheap
+MODEL = None
+EMBEDDING_CACHE = None  # query embeddings keyed by (model, normalized text)
+SNAPSHOT: Optional[IndexSnapshot] = None
 
-# Load metadata file (assumes same order as index)
-with open("data/embeddings/chunk_metadata.json", "r", encoding="utf-8") as f:
-    CHUNK_METADATA = json.load(f)
+# FAISS ID selectors per filter combination; building one is O(partition size)
+_selectors = LRUCache(max_size=256, ttl_minutes=None)
 
-def embed_query(text: str) -> np.ndarray:
-    return MODEL.encode([text])[0]
+_load_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_manifest_seen = None  # (inode, mtime, size) of the manifest the loaded version came from
+_next_reload_check = 0.0
+_index_stats = {"mapped": 0, "load_seconds": 0.0, "reloads": 0, "reload_failures": 0}
 
-def retrieve_clauses(parsed_query: dict, top_k: int = 5):
+register_collector("embedding_cache", lambda: EMBEDDING_CACHE.stats() if EMBEDDING_CACHE else {})
+
+def _manifest_signature():
+    try:
+        st = os.stat(Config.INDEX_MANIFEST_PATH)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+def _version_mismatch(manifest: Dict, store: ChunkStore, index) -> Optional[str]:
+    """Why the loaded files are not one published version, or None if they are."""
+    if not manifest:
+        return None  # indexed before manifests existed: nothing to check against
+    if store.version is not None and store.version != manifest["version"]:
+        return f"chunk store is version {store.version}, manifest is version {manifest['version']}"
+    if len(store) != manifest["next_id"]:
+        return f"chunk store has {len(store)} records, manifest expects {manifest['next_id']}"
+    if index.ntotal != manifest["ntotal"]:
+        return f"index has {index.ntotal} vectors, manifest expects {manifest['ntotal']}"
+    return None
+
+def load_index_files(attempts: int = 5) -> Dict:
     """
-    Takes structured query dict and returns top-k matched clause chunks
-    from the FAISS index with metadata.
+    Reads the manifest, chunk store and FAISS index and checks that they
+    belong to the same publish. The indexer renames files one by one
+    (publish_index), so a load that lands in between is retried.
     """
-    # Join structured fields to form semantic query
-    query_parts = [str(v) for v in parsed_query.values() if v]
-    full_query = " ".join(query_parts)
-    query_vector = embed_query(full_query)
+    problem = None
+    for attempt in range(attempts):
+        signature = _manifest_signature()
+        manifest = {}
+        if signature is not None:
+            with open(Config.INDEX_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        start = time.perf_counter()
+        store = ChunkStore(Config.CHUNK_METADATA_PATH)
+        index, mapped = read_index(Config.FAISS_INDEX_PATH, manifest.get("index_params", {}).get("type"))
+        problem = _version_mismatch(manifest, store, index)
+        if problem is None and _manifest_signature() != signature:
+            problem = "manifest changed while loading"
+        if problem is None:
+            return {"index": index, "metadata": store, "partitions": load_partitions(store),
+                    "rules": load_rule_index(store), "version": manifest.get("version", 0),
+                    "signature": signature, "mapped": mapped, "load_seconds": time.perf_counter() - start}
+        store.close()
+        time.sleep(0.2 * (attempt + 1))
+    raise RuntimeError(f"Index files do not form one published version ({problem}); re-run the indexer")
 
-    # Search FAISS
-    distances, indices = INDEX.search(np.array([query_vector]), top_k)
-    matched_chunks = []
+def _install(loaded: Dict):
+    global SNAPSHOT, _manifest_seen
+    SNAPSHOT = IndexSnapshot(loaded["index"], loaded["metadata"], loaded["partitions"],
+                             loaded["rules"], loaded["version"])  # one atomic swap; also marks resources ready
+    _selectors.clear()
+    _manifest_seen = loaded["signature"]
+    _index_stats.update(mapped=int(loaded["mapped"]), load_seconds=loaded["load_seconds"])
+    # Superseded stores and mapped indexes are released when in-flight requests drop their snapshot
+
+def reload_if_published() -> bool:
+    """
+    Hot reload: if the indexer published a new manifest since the current
+    version was loaded, load and install it. Other threads keep serving the
+    old version meanwhile; returns True if a new version was installed.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    try:
+        if _manifest_signature() == _manifest_seen:
+            return False
+        try:
+            loaded = load_index_files()
+        except Exception as e:
+            _index_stats["reload_failures"] += 1
+            print(f"⚠️ Index reload failed, still serving version {SNAPSHOT.version if SNAPSHOT else None}:", e)
+            return False
+        if SNAPSHOT is not None:
+            print(f"🔁 Reloaded index version {loaded['version']} ({loaded['index'].ntotal} vectors)")
+            _index_stats["reloads"] += 1
+        _install(loaded)
+        return True
+    finally:
+        _reload_lock.release()
+
+def load_resources():
+    """
+    Loads the embedding model, FAISS index and chunk metadata once per process,
+    then checks for a newly published index every INDEX_RELOAD_SECONDS.
+    """
+    global MODEL, EMBEDDING_CACHE, _next_reload_check
+    if SNAPSHOT is not None:
+        if Config.INDEX_RELOAD_SECONDS > 0 and time.monotonic() >= _next_reload_check:
+            _next_reload_check = time.monotonic() + Config.INDEX_RELOAD_SECONDS
+            reload_if_published()
+        return
+    with _load_lock:
+        if SNAPSHOT is not None:
+            return
+        from sentence_transformers import SentenceTransformer
+
+        MODEL = SentenceTransformer(Config.EMBEDDING_MODEL_NAME)
+        EMBEDDING_CACHE = EmbeddingCache(Config.EMBEDDING_MODEL_NAME)
+        _install(load_index_files())
+        _next_reload_check = time.monotonic() + Config.INDEX_RELOAD_SECONDS
+
+def current_snapshot() -> IndexSnapshot:
+    """The serving index version; read it once per operation and pass it along."""
+    load_resources()
+    return SNAPSHOT
+
+def index_stats() -> Dict:
+    snapshot = SNAPSHOT
+    if snapshot is None:
+        return {}
+    return dict(_index_stats, version=snapshot.version, vectors=snapshot.index.ntotal, chunks=len(snapshot.metadata))
+
+register_collector("index", index_stats)
+
+def index_version() -> int:
+    return current_snapshot().version
 
-    for idx in indices[0]:
-        if idx < len(CHUNK_METADATA):
-            meta = CHUNK_METADATA[idx]
+def warmup():
+    """Loads everything and runs one uncached encode + search so the first request is not cold."""
+    snapshot = current_snapshot()
+    vector = MODEL.encode(["warmup"])
+    snapshot.index.search(np.asarray(vector, dtype=np.float32), 1)
+
+def query_text(parsed_query: dict) -> str:
+    """Join structured fields to form the semantic query."""
+    return " ".join(str(v) for v in parsed_query.values() if v)
+
+@traced("embed")
+def embed_query(text: str) -> np.ndarray:
+    load_resources()
+    return EMBEDDING_CACHE.get_or_compute(text, lambda original: MODEL.encode([original])[0])
+
+def partition_selector(filters: dict, snapshot: IndexSnapshot):
+    """(selector, matching IDs) for a filter dict, or (None, None) when unfiltered."""
+    key = tuple(sorted((field, value if isinstance(value, str) else tuple(sorted(value)))
+                       for field, value in filters.items() if value))
+    partitions = snapshot.partitions
+    cached = _selectors.get(key)
+    if cached is None or cached[2] is not partitions:  # built before a hot reload
+        ids = select_ids(partitions, filters)
+        cached = (make_selector(ids) if ids is not None and len(ids) else None, ids, partitions)
+        _selectors.set(key, cached)
+    return cached[:2]
+
+@traced("embed")
+def embed_queries(texts: List[str]) -> np.ndarray:
+    """Embeddings for many query texts; cache misses are encoded in one `MODEL.encode` call."""
+    load_resources()
+    return EMBEDDING_CACHE.get_or_compute_many(
+        texts, lambda originals: MODEL.encode(originals, batch_size=64, convert_to_numpy=True)
+    )
+
+def _pages(meta: dict) -> dict:
+    return {"page_start": meta["page_start"], "page_end": meta["page_end"]} if "page_start" in meta else {}
+
+def _matched_chunks(store: ChunkStore, distances: np.ndarray, indices: np.ndarray) -> List[dict]:
+    matched_chunks = []
+    for idx, distance in zip(indices, distances):
+        if 0 <= idx < len(store) and not store.is_deleted(idx):
+            meta = store[idx]
             matched_chunks.append({
                 "text": meta["text"],
                 "source": meta["source"],
                 "doc_type": meta.get("doc_type", "unknown"),
-                "score": float(distances[0][np.where(indices[0] == idx)[0][0]])
+                "vector_id": int(idx),
+                "score": float(distance),
+                **_pages(meta)
             })
-
     return matched_chunks
 
+@traced("search")
+def search_vectors(query_vectors: np.ndarray, top_k: int = 5, nprobe: int = None, ef_search: int = None,
+                   filters: dict = None) -> List[List[dict]]:
+    """One multi-query FAISS search; returns the matched chunks per query row."""
+    snapshot = current_snapshot()  # one version throughout, even if a hot reload swaps it meanwhile
+    query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+    selector, ids = partition_selector(filters, snapshot) if filters else (None, None)
+    if ids is not None and not len(ids):
+        return [[] for _ in range(len(query_vectors))]
+
+    index = snapshot.index
+    params = make_search_params(index, nprobe, ef_search, selector=selector)
+    distances, indices = index.search(query_vectors, top_k, params=params)
+    if ids is not None:
+        short = np.flatnonzero((indices >= 0).sum(axis=1) < min(top_k, len(ids)))
+        if len(short):
+            distances[short], indices[short] = index.search(
+                query_vectors[short], top_k, params=widened_search_params(index, top_k, selector)
+            )
+    return [_matched_chunks(snapshot.metadata, d, i) for d, i in zip(distances, indices)]
+
+def filter_sources(filters: dict, snapshot: IndexSnapshot = None):
+    """Source documents inside a filter's partition (None when unfiltered)."""
+    snapshot = snapshot or current_snapshot()
+    ids = select_ids(snapshot.partitions, filters) if filters else None
+    if ids is None:
+        return None
+    store = snapshot.metadata
+    return {store.sources[code] for code in np.unique(store.source_codes[ids])}
+
+def clauses_by_id(vector_ids: List[int], snapshot: IndexSnapshot = None) -> List[dict]:
+    """Chunk records for known vector IDs, shaped like retrieve_clauses results (no score)."""
+    store = (snapshot or current_snapshot()).metadata
+    clauses = []
+    for idx in dict.fromkeys(vector_ids):
+        if 0 <= idx < len(store) and not store.is_deleted(idx):
+            meta = store[idx]
+            clauses.append({"text": meta["text"], "source": meta["source"], "doc_type": meta["doc_type"],
+                            "vector_id": int(idx), "score": None, **_pages(meta)})
+    return clauses
+
+def retrieve_clauses(parsed_query: dict, top_k: int = 5, nprobe: int = None, ef_search: int = None,
+                     filters: dict = None):
+    """
+    Takes structured query dict and returns top-k matched clause chunks
+    from the FAISS index with metadata. `nprobe` (IVF) and `ef_search` (HNSW)
+    override the configured speed/recall trade-off for this query.
+    `filters` ({"doc_type": ..., "source": ..., "insurer": ...}, values may be
+    lists) restricts the search to the matching partition.
+    """
+    query_vector = np.array([embed_query(query_text(parsed_query))])
+    return search_vectors(query_vector, top_k, nprobe, ef_search, filters)[0]
+
+def retrieve_clauses_batch(parsed_queries: List[dict], top_k: int = 5, nprobe: int = None,
+                           ef_search: int = None, filters: List[dict] = None) -> List[List[dict]]:
+    """
+    Batch version of retrieve_clauses: all queries are embedded together and
+    searched with one index search per distinct filter (per-query `filters`).
+    """
+    vectors = embed_queries([query_text(parsed) for parsed in parsed_queries])
+    filters = filters or [None] * len(parsed_queries)
+
+    groups = {}
+    for i, query_filters in enumerate(filters):
+        key = json.dumps(query_filters or {}, sort_keys=True)
+        groups.setdefault(key, (query_filters, []))[1].append(i)
+
+    results = [None] * len(parsed_queries)
+    for query_filters, rows in groups.values():
+        for row, chunks in zip(rows, search_vectors(vectors[rows], top_k, nprobe, ef_search, query_filters)):
+            results[row] = chunks
+    return results
+
 # 🧪 Example
 if __name__ == "__main__":
     example = {
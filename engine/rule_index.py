@@ -0,0 +1,257 @@
+import os
+import re
+import json
+from typing import Dict, List, Optional
+from config import Config
+from engine.chunk_store import ChunkStore
+from engine.context_compressor import split_sentences
+
+# Canonical procedure/condition keyword → phrases that name it in policies and queries
+PROCEDURE_KEYWORDS = {
+    "joint replacement": ["joint replacement", "knee replacement", "hip replacement", "arthroplasty"],
+    "knee": ["knee"],
+    "cataract": ["cataract"],
+    "hernia": ["hernia"],
+    "hysterectomy": ["hysterectomy"],
+    "tonsillectomy": ["tonsillectomy", "tonsillitis"],
+    "adenoidectomy": ["adenoidectomy"],
+    "sinusitis": ["sinusitis", "nasal septum"],
+    "piles": ["piles", "haemorrhoids", "hemorrhoids", "fistula", "fissure"],
+    "gall bladder": ["gall bladder", "gallbladder", "cholecystectomy", "gall stone", "gallstone"],
+    "kidney stone": ["kidney stone", "renal stone", "urinary calculi", "lithotripsy"],
+    "prostate": ["prostate", "prostatic"],
+    "varicose veins": ["varicose"],
+    "spine": ["spinal", "spine", "disc prolapse", "intervertebral"],
+    "ulcer": ["ulcer"],
+    "maternity": ["maternity", "childbirth", "pregnancy", "delivery"],
+    "dental": ["dental"],
+    "bariatric": ["bariatric", "obesity"],
+    "cosmetic": ["cosmetic", "plastic surgery"],
+    "physiotherapy": ["physiotherapy"],
+    "mental illness": ["mental illness", "psychiatric"],
+    "pre-existing disease": ["pre-existing disease", "pre-existing diseases"],
+}
+_PHRASES = [(keyword, re.compile(r"\b" + re.escape(phrase) + r"\b", re.IGNORECASE))
+            for keyword, phrases in PROCEDURE_KEYWORDS.items() for phrase in phrases]
+
+_SPECIFIED_SECTION = re.compile(r"specified disease\s*/?\s*procedure waiting period", re.IGNORECASE)
+_SECTION_END = re.compile(r"\(?Code\s*[-–]\s*Excl0?3\)?|30[- ]day waiting period", re.IGNORECASE)
+_UNTIL_EXPIRY = re.compile(r"(?:excluded|waiting period)[^.]{0,80}?(\d+)\s*(months?|years?)", re.IGNORECASE)
+_WAITING = re.compile(r"(\d+)\s*(days?|months?|years?)\s*(?:of\s+)?waiting period|waiting period of\s*(\d+)\s*(days?|months?|years?)",
+                      re.IGNORECASE)
+# "excluded from the (scope of this benefit)" narrows an add-on benefit, it is not a policy exclusion
+_EXCLUDED = re.compile(r"\b(?:are|is|shall be)\s+(?:not covered|excluded)\b(?!\s+from the\b)|\bnot payable\b",
+                       re.IGNORECASE)
+_SUB_LIMIT = re.compile(r"sub-?limit|limited to|maximum of|up to", re.IGNORECASE)
+_AMOUNT = re.compile(r"(?:Rs\.?|INR|₹)\s*([\d,]+(?:\.\d+)?)", re.IGNORECASE)
+# Durations in a query. "46 year old" / "aged 46 years" are the claimant's age; "3 month old
+# policy" / "policy of 3 months" are explicitly the policy's.
+_QUERY_DURATION = re.compile(r"(?<![\d.])(\d+)\s*-?\s*(day|month|year)s?\b(\s*-?\s*old\b)?"
+                             r"(\s*(?:policy|cover|insurance|plan)\b)?", re.IGNORECASE)
+_AGE_PREFIX = re.compile(r"\b(?:aged?|age of)\s*$", re.IGNORECASE)
+_POLICY_PREFIX = re.compile(r"\b(?:policy|cover|insurance|plan)\s*(?:is|of|for|since)?\s*:?\s*$", re.IGNORECASE)
+
+SECTION_WINDOW_CHARS = 4000  # how far after a "specified disease" header its procedure list may run
+MAX_RULE_SENTENCE_WORDS = 40
+NEAR_CHARS = 80  # a keyword this close before the verb/amount is its subject
+RULE_FORMAT = 2  # bump when extraction changes; older rule files are re-extracted on load
+
+def to_months(number: int, unit: str) -> float:
+    unit = unit.lower()
+    if unit.startswith("year"):
+        return number * 12.0
+    if unit.startswith("day"):
+        return number / 30.0
+    return float(number)
+
+def match_keywords(text: str) -> List[str]:
+    return sorted({keyword for keyword, pattern in _PHRASES if pattern.search(text)})
+
+def _near(sentence: str, keyword: str, position: int, after: int = None) -> bool:
+    """
+    True if a phrase of `keyword` ends at most NEAR_CHARS before `position`,
+    or, with `after`, starts at most NEAR_CHARS after that offset.
+    """
+    return any(0 <= position - match.end() <= NEAR_CHARS
+               or after is not None and 0 <= match.start() - after <= NEAR_CHARS
+               for name, pattern in _PHRASES if name == keyword
+               for match in pattern.finditer(sentence))
+
+def _rule(kind, keyword, source, vector_id, text, confidence, months=None, amount=None) -> Dict:
+    return {"kind": kind, "keyword": keyword, "months": months, "amount": amount,
+            "source": source, "vector_id": vector_id, "text": text[:400], "confidence": confidence}
+
+def extract_rules(store: ChunkStore) -> List[Dict]:
+    """
+    Waiting periods, exclusions and sub-limits stated next to a known
+    procedure keyword. Each chunk is read together with the next chunk of the
+    same document, since sections and procedure lists cross chunk borders.
+    """
+    rules = {}
+
+    def add(rule):
+        key = (rule["kind"], rule["keyword"], rule["source"])
+        if key not in rules or rule["confidence"] > rules[key]["confidence"]:
+            rules[key] = rule
+
+    live = [i for i in range(len(store)) if not store.is_deleted(i)]
+    for position, i in enumerate(live):
+        source = store.sources[store.source_codes[i]]
+        text = store.text(i)
+        following = live[position + 1] if position + 1 < len(live) else None
+        window = text
+        if following is not None and store.source_codes[following] == store.source_codes[i]:
+            window = f"{text} {store.text(following)}"
+
+        # Specified-disease section: one waiting period for a list of procedures
+        for header in _SPECIFIED_SECTION.finditer(text):
+            section = window[header.start():header.start() + SECTION_WINDOW_CHARS]
+            end = _SECTION_END.search(section, 40)
+            section = section[:end.start()] if end else section
+            period = _UNTIL_EXPIRY.search(section)
+            if not period:
+                continue
+            months = to_months(int(period.group(1)), period.group(2))
+            citation = next((s for s in split_sentences(section) if period.group(0) in s), section[:300])
+            for keyword in match_keywords(section[period.end():]):
+                add(_rule("waiting_period", keyword, source, i, citation, 0.8, months=months))
+
+        # Sentence-level rules: the keyword and the figure in the same sentence
+        for sentence in split_sentences(text):
+            keywords = match_keywords(sentence)
+            if not keywords:
+                continue
+            waiting = _WAITING.search(sentence) or _UNTIL_EXPIRY.search(sentence)
+            excluded = _EXCLUDED.search(sentence)
+            amount = _AMOUNT.search(sentence)
+            # Long "sentences" are usually flattened tables or two-column layout
+            tidy = len(sentence.split()) <= MAX_RULE_SENTENCE_WORDS
+            for keyword in keywords:
+                if waiting:
+                    number, unit = [g for g in waiting.groups() if g][:2]
+                    near = _near(sentence, keyword, waiting.start(), waiting.end())
+                    add(_rule("waiting_period", keyword, source, i, sentence, 0.9 if tidy and near else 0.5,
+                              months=to_months(int(number), unit)))
+                elif excluded:
+                    near = _near(sentence, keyword, excluded.start())
+                    add(_rule("exclusion", keyword, source, i, sentence, 0.85 if tidy and near else 0.5))
+                if amount and _SUB_LIMIT.search(sentence):
+                    near = _near(sentence, keyword, amount.start())
+                    add(_rule("sub_limit", keyword, source, i, sentence, 0.85 if tidy and near else 0.5,
+                              amount=float(amount.group(1).replace(",", ""))))
+
+    return sorted(rules.values(), key=lambda r: (r["keyword"], r["kind"], r["source"]))
+
+def write_rule_index(rules: List[Dict], count: int, path: str):
+    """`count` ties the rules to the chunk store they were extracted from."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"format": RULE_FORMAT, "count": count, "rules": rules}, f)
+
+class RuleIndex:
+    """Rules grouped by keyword, as loaded by the retriever."""
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = rules
+        self.by_keyword: Dict[str, List[Dict]] = {}
+        for rule in rules:
+            self.by_keyword.setdefault(rule["keyword"], []).append(rule)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def lookup(self, keywords: List[str], sources: Optional[set] = None,
+               min_confidence: float = Config.RULE_MIN_CONFIDENCE) -> List[Dict]:
+        """Confident rules for `keywords`; with `sources` (even empty), only rules from those documents."""
+        return [rule for keyword in keywords for rule in self.by_keyword.get(keyword, [])
+                if rule["confidence"] >= min_confidence and (sources is None or rule["source"] in sources)]
+
+def load_rule_index(store: ChunkStore, path: str = Config.RULE_INDEX_PATH) -> RuleIndex:
+    """Rules written by the indexer, or re-extracted from the store if missing or stale."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") == RULE_FORMAT and data.get("count") == len(store):
+            return RuleIndex(data["rules"])
+        print(f"⚠️ {path} is stale or does not match the chunk store, re-extracting rules")
+    return RuleIndex(extract_rules(store))
+
+def policy_months(raw_query: str, parsed: Dict) -> Optional[float]:
+    """
+    Policy age in months when the query states exactly one duration that
+    cannot be the claimant's age, else None. `parse_query` takes the first
+    duration, so "46 year old male ... 3-month policy" parses as 46 years.
+    """
+    durations = set()
+    for match in _QUERY_DURATION.finditer(raw_query):
+        number, unit = int(match.group(1)), match.group(2)
+        policy = match.group(4) or _POLICY_PREFIX.search(raw_query[:match.start()])
+        if not policy and (match.group(3) or _AGE_PREFIX.search(raw_query[:match.start()])):
+            continue
+        if not policy and unit.lower() == "year" and number == parsed.get("age"):
+            return None  # "46 years, knee surgery": the claimant's age, or a policy as old as them?
+        durations.add(to_months(number, unit))
+    return durations.pop() if len(durations) == 1 else None
+
+def _cite(rule: Dict) -> str:
+    return f"{rule['source']}: \"{rule['text']}\""
+
+def rule_decision(raw_query: str, parsed: Dict, rule_index: RuleIndex, sources: Optional[set] = None) -> Optional[Dict]:
+    """
+    Deterministic decision when the query names a procedure with an explicit
+    rule in the retrieved policies: an exclusion rejects; waiting periods
+    approve or reject against the policy age. `sources` (None: every
+    document) is the requested partition; rules outside it never count.
+    Returns None (ask the LLM) when nothing matches, the policy age is
+    ambiguous, or the rules disagree.
+    """
+    keywords = match_keywords(f"{raw_query} {parsed.get('procedure') or ''}")
+    rules = rule_index.lookup(keywords, sources) if keywords else []
+    if not rules:
+        return None
+
+    exclusions = [r for r in rules if r["kind"] == "exclusion"]
+    if exclusions and len(exclusions) != len(rules):
+        return None  # excluded by one clause, but covered after a wait or up to a limit by another
+    if exclusions:
+        return {
+            "decision": "rejected",
+            "amount": None,
+            "justification": "Excluded by the policy: " + "; ".join(_cite(r) for r in exclusions),
+            "citations": exclusions,
+        }
+
+    waiting = [r for r in rules if r["kind"] == "waiting_period"]
+    months = policy_months(raw_query, parsed)
+    if not waiting or months is None:
+        return None
+    served = [r["months"] <= months for r in waiting]
+    if any(served) != all(served):
+        return None  # policies disagree for this policy age
+
+    sub_limits = [r for r in rules if r["kind"] == "sub_limit"]
+    longest = max(waiting, key=lambda r: r["months"])
+    if not all(served):
+        return {
+            "decision": "rejected",
+            "amount": None,
+            "justification": (f"The policy is {months:g} months old, within the {longest['months']:g}-month "
+                              f"waiting period for {longest['keyword']}: {_cite(longest)}"),
+            "citations": waiting,
+        }
+    return {
+        "decision": "approved",
+        "amount": min(r["amount"] for r in sub_limits) if sub_limits else None,
+        "justification": (f"The {longest['months']:g}-month waiting period for {longest['keyword']} has been served "
+                          f"({months:g} months of cover): {_cite(longest)}"
+                          + "".join(f"; sub-limit {_cite(r)}" for r in sub_limits)),
+        "citations": waiting + sub_limits,
+    }
+
+# 🔬 Extraction report for the current chunk store
+if __name__ == "__main__":
+    store = ChunkStore(Config.CHUNK_METADATA_PATH)
+    rules = extract_rules(store)
+    print(f"📏 {len(rules)} rule(s) from {len(store)} chunk(s)")
+    for rule in rules:
+        figure = f"{rule['months']:g} months" if rule["months"] is not None else rule["amount"] or ""
+        print(f"   {rule['kind']:15s} {rule['keyword']:22s} {str(figure):12s} {rule['source']}")
@@ -1,42 +1,195 @@
+import os
+import time
 import uuid
-from collections import deque
-from typing import Dict, List, Optional
-from engine.lru_cache import session_cache  # ⬅️ Shared LRU store
+import atexit
+import threading
+from typing import Dict, List, Optional, Tuple
+from engine.lru_cache import LRUCache
+from engine.metrics import register_collector
+from engine.session_store import MAX_HISTORY, Turn, make_session_store
 from config import Config
 
-MAX_HISTORY = 5  # Keep last 5 exchanges per session
+class SessionWriter:
+    """
+    Write-behind for session turns. Appends are buffered and written in one
+    transaction when SESSION_WRITE_BATCH turns are waiting or after
+    SESSION_FLUSH_MS; with SESSION_FLUSH_MS=0 every append is written
+    synchronously. Unwritten turns stay visible to this worker via `pending`.
+    """
+
+    def __init__(self, store, batch_size: int = Config.SESSION_WRITE_BATCH,
+                 flush_ms: float = Config.SESSION_FLUSH_MS):
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_ms / 1000
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self._buffer: List[Turn] = []
+        self._inflight: List[Turn] = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._last_purge = time.time()
+
+    def _ensure_started(self):
+        # Threads do not survive fork: every worker runs its own writer
+        if self._thread is None or self._pid != os.getpid():
+            with self._cond:
+                if self._thread is None or self._pid != os.getpid():
+                    if self._pid is None:
+                        atexit.register(self.flush)
+                    self._pid = os.getpid()
+                    self._buffer, self._inflight = [], []
+                    self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+                    self._thread.start()
+
+    def append(self, turn: Turn):
+        if self.flush_seconds <= 0:
+            self._write([turn])
+            return
+        self._ensure_started()
+        with self._cond:
+            self._buffer.append(turn)
+            self._cond.notify()
+
+    def pending(self, session_id: str) -> List[Turn]:
+        with self._cond:
+            return [turn for turn in self._inflight + self._buffer if turn[0] == session_id]
+
+    def _take(self) -> List[Turn]:
+        # Caller holds self._cond; taken turns stay readable until written
+        batch, self._buffer = self._buffer, []
+        self._inflight = batch
+        return batch
+
+    def _write(self, batch: List[Turn]):
+        try:
+            self.store.append_many(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"❌ Failed to write {len(batch)} session turn(s):", e)
+
+        now = time.time()
+        if now - self._last_purge > Config.CACHE_SWEEP_SECONDS:
+            self._last_purge = now
+            try:
+                self.store.purge(now - Config.SESSION_TTL_MINUTES * 60)
+            except Exception as e:
+                print("⚠️ Session purge failed:", e)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._buffer)
+                # Below the size threshold, give the batch until the deadline to fill up
+                self._cond.wait_for(lambda: len(self._buffer) >= self.batch_size, timeout=self.flush_seconds)
+                batch = self._take()
+            self._write(batch)
+            with self._cond:
+                self._inflight = []
+
+    def flush(self):
+        """Synchronously write everything buffered in this process."""
+        with self._cond:
+            batch = self._take()
+        if batch:
+            self._write(batch)
+        with self._cond:
+            self._inflight = []
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            buffered = len(self._buffer)
+        return {"buffered": buffered, "written": self.written, "batches": self.batches, "failed": self.failed}
+
+# Created on first use, per process (SESSION_BACKEND: memory | sqlite | postgres)
+_store = None
+_writer = None
+_init_lock = threading.Lock()
+
+# Per-worker read-through cache: session ID → tuple of turns, or False if unknown.
+# Other workers' appends show up here after at most SESSION_CACHE_TTL_SECONDS.
+_history_cache = LRUCache(max_size=Config.SESSION_CACHE_SIZE, ttl_minutes=Config.SESSION_CACHE_TTL_SECONDS / 60)
+
+def get_store():
+    global _store, _writer
+    if _store is None:
+        with _init_lock:
+            if _store is None:
+                store = make_session_store(Config.SESSION_BACKEND)
+                _writer = SessionWriter(store)
+                _store = store
+    return _store
+
+def _history(session_id: str) -> Optional[Tuple[Dict, ...]]:
+    cached = _history_cache.get(session_id)
+    if cached is None:
+        turns = get_store().get(session_id, time.time())
+        if turns is not None:
+            known = {turn["turn_id"] for turn in turns}
+            turns += [{"turn_id": turn_id, "query": query, "response": response}
+                      for _, turn_id, query, response, _ in _writer.pending(session_id) if turn_id not in known]
+        cached = tuple(turns[-MAX_HISTORY:]) if turns is not None else False
+        _history_cache.set(session_id, cached)
+    return cached if cached is not False else None
 
 def start_session() -> str:
-    """Starts a new session and returns its UUID-based ID"""
-    session_id = str(uuid.uuid4())
-    session_cache.set(session_id, deque(maxlen=MAX_HISTORY))
+    """Issues a new random session ID; it is visible to every worker immediately."""
+    session_id = uuid.uuid4().hex
+    get_store().create(session_id, time.time())
+    _history_cache.set(session_id, ())
     return session_id
 
+def session_exists(session_id: str) -> bool:
+    return bool(session_id) and _history(session_id) is not None
+
+def resolve_session(session_id: Optional[str]) -> Tuple[str, bool]:
+    """(session ID, created): the given ID if it is live, otherwise a newly started session."""
+    if session_id and session_exists(session_id):
+        return session_id, False
+    return start_session(), True
+
 def get_session_history(session_id: str) -> List[Dict]:
     """Returns the query/response history for a session"""
-    history = session_cache.get(session_id)
-    return list(history) if history else []
+    return [{"query": turn["query"], "response": turn["response"]} for turn in _history(session_id) or ()]
 
 def add_to_session(session_id: str, user_query: str, system_response: Dict):
     """Adds an interaction to session history"""
-    history = session_cache.get(session_id)
+    get_store()
+    turn = (session_id, uuid.uuid4().hex, user_query, system_response, time.time())
+    cached = _history_cache.get(session_id)
+    if cached is not None:
+        entry = {"turn_id": turn[1], "query": user_query, "response": system_response}
+        _history_cache.set(session_id, ((cached or ()) + (entry,))[-MAX_HISTORY:])
+    _writer.append(turn)
 
-    if history is None:
-        history = deque(maxlen=MAX_HISTORY)
+def get_last_decision(session_id: str) -> Optional[Dict]:
+    """Returns the last system response from session"""
+    history = _history(session_id)
+    return history[-1]["response"] if history else None
 
-    history.append({
-        "query": user_query,
-        "response": system_response
-    })
+def update_session(session_id: str, user_query: str, system_response: Dict):
+    """Records an exchange, creating the session on first use."""
+    add_to_session(session_id, user_query, system_response)
 
-    session_cache.set(session_id, history)
+def get_session_context(session_id: str) -> Dict:
+    return {
+        "session_id": session_id,
+        "history": get_session_history(session_id),
+        "last_decision": get_last_decision(session_id),
+    }
 
-def get_last_decision(session_id: str) -> Optional[Dict]:
-    """Returns the last system response from session"""
-    history = session_cache.get(session_id)
-    if history and len(history) > 0:
-        return history[-1].get("response")
-    return None
+def flush_sessions():
+    if _writer is not None:
+        _writer.flush()
+
+def session_stats() -> Dict:
+    return dict(_writer.stats() if _writer else {}, cache=_history_cache.stats())
+
+register_collector("sessions", session_stats)
 
 # 🔬 Standalone Test
 if __name__ == "__main__":
@@ -50,3 +203,5 @@ if __name__ == "__main__":
 
     print("📜 Session History:", get_session_history(sid))
     print("🔁 Last Decision:", get_last_decision(sid))
+    flush_sessions()
+    print("💾 Stored:", get_store().get(sid, time.time()))
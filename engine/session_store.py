@@ -0,0 +1,163 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from config import Config
+
+MAX_HISTORY = 5  # Keep last 5 exchanges per session
+
+# (session_id, turn_id, query, response, created_at)
+Turn = Tuple[str, str, str, Dict, float]
+
+class MemorySessionStore:
+    """Per-process store on the shared LRU; only for a single worker or tests."""
+
+    def __init__(self):
+        from engine.lru_cache import session_cache
+        self.cache = session_cache
+        self._lock = threading.Lock()
+
+    def create(self, session_id: str, now: float):
+        self.cache.set(session_id, [])
+
+    def get(self, session_id: str, now: float) -> Optional[List[Dict]]:
+        turns = self.cache.get(session_id)
+        return list(turns) if turns is not None else None
+
+    def append_many(self, turns: List[Turn]):
+        with self._lock:
+            for session_id, turn_id, query, response, created_at in turns:
+                history = (self.cache.get(session_id) or []) + [
+                    {"turn_id": turn_id, "query": query, "response": response}
+                ]
+                self.cache.set(session_id, history[-MAX_HISTORY:])
+
+    def purge(self, before: float) -> int:
+        return self.cache.sweep()  # the LRU expires sessions after SESSION_TTL_MINUTES itself
+
+class _SQLSessionStore:
+    """
+    `sessions` (one row per issued ID, with last activity) and
+    `session_turns` (last MAX_HISTORY exchanges). Queries are written with
+    `?` placeholders; `PARAM` adapts them to the driver.
+    """
+    PARAM = "?"
+
+    def _transaction(self):
+        raise NotImplementedError
+
+    def _sql(self, statement: str) -> str:
+        return statement.replace("?", self.PARAM)
+
+    def create(self, session_id: str, now: float):
+        with self._transaction() as cur:
+            cur.execute(self._sql("INSERT INTO sessions (session_id, created_at, updated_at) VALUES (?, ?, ?) "
+                                  "ON CONFLICT (session_id) DO NOTHING;"), (session_id, now, now))
+
+    def get(self, session_id: str, now: float) -> Optional[List[Dict]]:
+        """Last MAX_HISTORY turns (oldest first), or None for an unknown or expired session."""
+        with self._transaction() as cur:
+            cur.execute(self._sql("SELECT updated_at FROM sessions WHERE session_id = ?;"), (session_id,))
+            row = cur.fetchone()
+            if row is None or row[0] < now - Config.SESSION_TTL_MINUTES * 60:
+                return None
+            cur.execute(self._sql("SELECT turn_id, query, response FROM session_turns WHERE session_id = ? "
+                                  "ORDER BY seq DESC LIMIT ?;"), (session_id, MAX_HISTORY))
+            rows = cur.fetchall()
+        return [{"turn_id": t, "query": q, "response": json.loads(r)} for t, q, r in reversed(rows)]
+
+    def append_many(self, turns: List[Turn]):
+        """One transaction: insert the turns, bump last activity, trim every touched session."""
+        if not turns:
+            return
+        latest = {}
+        for session_id, _, _, _, created_at in turns:
+            latest[session_id] = max(created_at, latest.get(session_id, 0))
+        with self._transaction() as cur:
+            cur.executemany(
+                self._sql("INSERT INTO session_turns (session_id, turn_id, query, response, created_at) "
+                          "VALUES (?, ?, ?, ?, ?);"),
+                [(s, t, q, json.dumps(r, default=str), c) for s, t, q, r, c in turns]
+            )
+            cur.executemany(
+                self._sql("INSERT INTO sessions (session_id, created_at, updated_at) VALUES (?, ?, ?) "
+                          "ON CONFLICT (session_id) DO UPDATE SET updated_at = excluded.updated_at;"),
+                [(s, ts, ts) for s, ts in latest.items()]
+            )
+            cur.executemany(
+                self._sql("DELETE FROM session_turns WHERE session_id = ? AND seq NOT IN ("
+                          "SELECT seq FROM session_turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?);"),
+                [(s, s, MAX_HISTORY) for s in latest]
+            )
+
+    def purge(self, before: float) -> int:
+        """Drops sessions inactive since `before` (epoch seconds) and their turns."""
+        with self._transaction() as cur:
+            cur.execute(self._sql("DELETE FROM session_turns WHERE session_id IN "
+                                  "(SELECT session_id FROM sessions WHERE updated_at < ?);"), (before,))
+            cur.execute(self._sql("DELETE FROM sessions WHERE updated_at < ?;"), (before,))
+            return cur.rowcount
+
+class SQLiteSessionStore(_SQLSessionStore):
+    """
+    SQLite in WAL mode: every worker process on the host shares the file,
+    readers never block the writer. Connections are opened per process, since
+    a connection inherited across fork must not be used.
+    """
+
+    def __init__(self, path: str = Config.SESSION_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        with self._transaction() as cur:
+            cur.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, "
+                        "created_at REAL, updated_at REAL);")
+            cur.execute("CREATE TABLE IF NOT EXISTS session_turns (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "session_id TEXT, turn_id TEXT, query TEXT, response TEXT, created_at REAL);")
+            cur.execute("CREATE INDEX IF NOT EXISTS session_turns_by_session ON session_turns (session_id, seq);")
+            cur.execute("CREATE INDEX IF NOT EXISTS sessions_by_activity ON sessions (updated_at);")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL;")
+                self._conn.execute("PRAGMA synchronous=NORMAL;")  # safe with WAL; fewer fsyncs
+                self._pid = os.getpid()
+            cur = self._conn.cursor()
+            try:
+                yield cur
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                cur.close()  # inside the lock: finalizing a cursor touches the shared connection
+
+class PostgresSessionStore(_SQLSessionStore):
+    """Sessions in the application database (tables created by engine.db.create_tables)."""
+    PARAM = "%s"
+
+    @contextmanager
+    def _transaction(self):
+        from engine.db import pooled_connection
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+            conn.commit()
+
+SESSION_BACKENDS = ("memory", "sqlite", "postgres")
+
+def make_session_store(backend: str = Config.SESSION_BACKEND):
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend == "postgres":
+        return PostgresSessionStore()
+    raise ValueError(f"Unknown SESSION_BACKEND '{backend}', expected one of {SESSION_BACKENDS}")
@@ -0,0 +1,212 @@
+import re
+import torch
+from typing import Dict, List, Optional, Tuple
+from transformers import LogitsProcessor, StoppingCriteria
+
+OUTPUT_MODES = ("off", "stop", "grammar")
+
+class JsonScanner:
+    """Tracks brace depth outside string literals; `done` once the first top-level object closes."""
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.done = False
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if self.done:
+                break
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"' and self.depth > 0:  # quotes in prose before the object don't count
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                self.done = self.depth == 0
+        return self.done
+
+class JsonObjectStop(StoppingCriteria):
+    """Ends each sequence as soon as its first balanced JSON object closes."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.scanners = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.scanners is None:
+            self.scanners = [JsonScanner() for _ in range(input_ids.shape[0])]
+        # Called once per new token; braces and quotes are whole ASCII tokens' text
+        for scanner, token in zip(self.scanners, input_ids[:, -1].tolist()):
+            if not scanner.done:
+                scanner.feed(self.tokenizer.decode([token], skip_special_tokens=True))
+        return torch.tensor([s.done for s in self.scanners], dtype=torch.bool, device=input_ids.device)
+
+# The decision object, emitted in exactly this layout
+DECISION_SCHEMA = (
+    ("literal", '{"decision": "'),
+    ("enum", ("approved", "rejected")),
+    ("literal", '", "amount": '),
+    ("number", None),
+    ("literal", ', "justification": "'),
+    ("string", None),
+    ("literal", '"}'),
+)
+
+# Amounts: up to 12 integer digits and 2 decimals, so greedy decoding cannot loop on digits
+_NUMBER_PREFIX = re.compile(r"(0|[1-9]\d{0,11})(\.\d{0,2})?")
+_NUMBER = re.compile(r"(0|[1-9]\d{0,11})(\.\d{1,2})?")
+
+State = Tuple[int, str]  # (segment index, text consumed within the segment)
+
+def token_texts(tokenizer, vocab_size: int) -> List[Optional[str]]:
+    """
+    Text each token id contributes when appended to a sequence. Decoding after
+    a sentinel keeps the leading space that SentencePiece drops at sequence
+    start. Special tokens and partial UTF-8 pieces map to None.
+    """
+    sentinel = tokenizer.encode("a", add_special_tokens=False)[0]
+    base = tokenizer.decode([sentinel], clean_up_tokenization_spaces=False)
+    decoded = tokenizer.batch_decode(
+        [[sentinel, i] for i in range(len(tokenizer))], clean_up_tokenization_spaces=False
+    )
+    special = set(tokenizer.all_special_ids)
+    texts = [None] * vocab_size
+    for i, text in enumerate(decoded[:vocab_size]):
+        if i in special or not text.startswith(base):
+            continue
+        text = text[len(base):]
+        if text and "\ufffd" not in text:
+            texts[i] = text
+    return texts
+
+class DecisionGrammar:
+    """
+    Character-level automaton for DECISION_SCHEMA plus per-state token masks.
+    Masks are cached by state signature (a few dozen per schema), so the
+    vocabulary scan happens once per signature for the life of the model.
+    """
+
+    def __init__(self, tokenizer, schema=DECISION_SCHEMA):
+        self.tokenizer = tokenizer
+        self.schema = schema
+        self.string_closer = next(i for i, (kind, _) in enumerate(schema) if kind == "string") + 1
+        self.texts = None
+        self._masks: Dict[tuple, torch.Tensor] = {}
+
+    def advance(self, state: Optional[State], text: str) -> Optional[State]:
+        """State after consuming `text`, or None if the text breaks the schema."""
+        if state is None:
+            return None
+        seg, buf = state
+        for ch in text:
+            while True:  # one character may finish a segment and start the next
+                if seg == len(self.schema):
+                    return None
+                kind, arg = self.schema[seg]
+                if kind == "literal":
+                    if arg[len(buf)] != ch:
+                        return None
+                    buf += ch
+                    if len(buf) == len(arg):
+                        seg, buf = seg + 1, ""
+                    break
+                if kind == "enum":
+                    buf += ch
+                    options = [o for o in arg if o.startswith(buf)]
+                    if not options:
+                        return None
+                    if options == [buf]:
+                        seg, buf = seg + 1, ""
+                    break
+                if kind == "number":
+                    candidate = buf + ch
+                    if _NUMBER_PREFIX.fullmatch(candidate) or "null".startswith(candidate):
+                        buf = candidate
+                        if buf == "null":
+                            seg, buf = seg + 1, ""
+                        break
+                    if _NUMBER.fullmatch(buf):
+                        seg, buf = seg + 1, ""
+                        continue  # the number ended; re-read ch in the next segment
+                    return None
+                # string: any printable text up to the closing quote, no escapes
+                if ch == '"':
+                    seg, buf = seg + 1, ""
+                    continue
+                if ch == "\\" or ord(ch) < 0x20:
+                    return None
+                break
+        return seg, buf
+
+    def is_complete(self, state: Optional[State]) -> bool:
+        return state is not None and state[0] == len(self.schema)
+
+    def _signature(self, state: State, closing: bool) -> tuple:
+        seg, buf = state
+        kind = self.schema[seg][0] if seg < len(self.schema) else "end"
+        if kind == "number" and buf and not "null".startswith(buf):
+            # only a leading zero and the digit counts change what may follow
+            buf = ("0" if buf[0] == "0" else "1") + re.sub(r"\d", "1", buf[1:])
+        return seg, buf, closing and kind == "string"
+
+    def allowed(self, state: State, remaining: int, vocab_size: int, eos_ids: List[int]) -> torch.Tensor:
+        """
+        Boolean mask over the vocabulary. Inside the justification string the
+        mask narrows to closing tokens once the token budget is nearly spent,
+        so the object is always finished.
+        """
+        closing = remaining <= len(self.schema[self.string_closer][1])
+        key = self._signature(state, closing)
+        mask = self._masks.get(key)
+        if mask is None:
+            if self.texts is None:
+                self.texts = token_texts(self.tokenizer, vocab_size)
+            mask = torch.zeros(vocab_size, dtype=torch.bool)
+            if self.is_complete(state):
+                mask[eos_ids] = True
+            else:
+                for i, text in enumerate(self.texts):
+                    if text is None:
+                        continue
+                    after = self.advance(state, text)
+                    if after is not None and (not key[2] or after[0] >= self.string_closer):
+                        mask[i] = True
+            self._masks[key] = mask
+        return mask
+
+class DecisionGrammarProcessor(LogitsProcessor):
+    """Masks every token that would take the output outside DECISION_SCHEMA; EOS only once it is complete."""
+
+    def __init__(self, grammar: DecisionGrammar, max_new_tokens: int, eos_ids: List[int]):
+        self.grammar = grammar
+        self.max_new_tokens = max_new_tokens
+        self.eos_ids = eos_ids
+        self.prompt_length = None
+        self.states = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1]
+            self.states = [(0, "")] * input_ids.shape[0]
+        generated = input_ids.shape[1] - self.prompt_length
+        if generated:
+            for row, token in enumerate(input_ids[:, -1].tolist()):
+                if token not in self.eos_ids:
+                    self.states[row] = self.grammar.advance(self.states[row], self.grammar.texts[token] or "")
+
+        vocab_size = scores.shape[-1]
+        for row, state in enumerate(self.states):
+            if state is None:
+                continue  # unreachable under the mask; leave the row unconstrained rather than fail
+            mask = self.grammar.allowed(state, self.max_new_tokens - generated, vocab_size, self.eos_ids)
+            scores[row] = scores[row].masked_fill(~mask.to(scores.device), float("-inf"))
+        return scores
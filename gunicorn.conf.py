@@ -0,0 +1,15 @@
+# gunicorn -c gunicorn.conf.py app:app
+from config import Config
+
+bind = "0.0.0.0:8000"
+workers = Config.WEB_WORKERS
+worker_class = "gthread"
+threads = Config.WEB_THREADS  # concurrent requests per worker feed the LLM batch scheduler
+timeout = Config.WEB_TIMEOUT_SECONDS  # CPU generation of MAX_TOKENS can take minutes
+preload_app = Config.PRELOAD_MODELS
+
+def post_fork(server, worker):
+    # Forward passes run only after fork: OpenMP thread pools are not fork-safe
+    if Config.WARMUP_ON_START:
+        from engine.reasoner import warmup
+        warmup()
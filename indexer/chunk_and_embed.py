@@ -1,102 +1,375 @@
 import os
 import json
+import time
+import hashlib
 import faiss
 import numpy as np
-from typing import List
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from sentence_transformers import SentenceTransformer
-from pdfplumber import open as pdf_open
-from docx import Document
 from config import Config
-from engine.db import save_chunks_to_db
+from engine.db import replace_chunks_in_db
+from engine.chunk_store import ChunkStore, write_chunk_store
+from engine.faiss_index import build_index, supports_removal
+from engine.partitions import build_partitions, write_partitions
+from engine.rule_index import extract_rules, write_rule_index
+from indexer.chunking import iter_document_chunks
 
-EMBEDDING_MODEL = SentenceTransformer(Config.EMBEDDING_MODEL_NAME)
+ROOT_DIRS = {
+    "data/policies/": "policy",
+    "data/contracts/": "contract",
+    "data/emails/": "email"
+}
 
-def extract_text_from_pdf(file_path):
-    with pdf_open(file_path) as pdf:
-        return "\n".join([page.extract_text() or "" for page in pdf.pages])
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+DATA_ROOT = "data"
 
-def extract_text_from_docx(file_path):
-    doc = Document(file_path)
-    return "\n".join([para.text for para in doc.paragraphs])
+def source_name(path: str) -> str:
+    """A chunk's `source`: its path below DATA_ROOT, so same-named files in different folders stay apart."""
+    return os.path.relpath(path, DATA_ROOT).replace(os.sep, "/")
 
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
-    tokens = text.split()
-    chunks = []
-    for i in range(0, len(tokens), chunk_size - overlap):
-        chunk = " ".join(tokens[i:i + chunk_size])
-        if chunk:
-            chunks.append(chunk)
-    return chunks
+# Loaded on first use so extraction workers never pay for the model
+_embedding_model = None
+
+def get_embedding_model() -> SentenceTransformer:
+    global _embedding_model
+    if _embedding_model is None:
+        _embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL_NAME)
+    return _embedding_model
 
 def embed_chunks(chunks: List[str]) -> np.ndarray:
-    return EMBEDDING_MODEL.encode(chunks, convert_to_numpy=True)
+    return get_embedding_model().encode(chunks, convert_to_numpy=True)
 
-def process_file(file_path, doc_type):
+def extract_and_chunk(file_path: str, doc_type: str) -> List[Dict]:
+    """
+    Extract and chunk a single document into metadata records (no embeddings).
+    Pages are streamed through the chunker (see indexer/chunking.py), so only
+    the finished chunks are held. Safe to run inside indexer worker processes.
+    """
     filename = os.path.basename(file_path)
     print(f"📄 Processing: {filename}")
 
-    if file_path.endswith(".pdf"):
-        text = extract_text_from_pdf(file_path)
-    elif file_path.endswith(".docx"):
-        text = extract_text_from_docx(file_path)
-    else:
+    if not file_path.endswith(SUPPORTED_EXTENSIONS):
         print(f"⚠️ Skipped unsupported file type: {file_path}")
-        return [], []
+        return []
 
-    if not text.strip():
+    metadata = [
+        {"text": chunk["text"], "source": source_name(file_path), "doc_type": doc_type, "chunk_id": i,
+         "page_start": chunk["page_start"], "page_end": chunk["page_end"]}
+        for i, chunk in enumerate(iter_document_chunks(file_path, Config.CHUNK_SIZE, Config.OVERLAP_SIZE))
+    ]
+    if not metadata:
         print(f"⚠️ Skipped empty document: {file_path}")
+    return metadata
+
+def process_file(file_path, doc_type):
+    metadata = extract_and_chunk(file_path, doc_type)
+    if not metadata:
         return [], []
 
-    chunks = chunk_text(text, Config.CHUNK_SIZE, Config.OVERLAP_SIZE)
-    embeddings = embed_chunks(chunks)
+    embeddings = embed_chunks([meta["text"] for meta in metadata])
+    return embeddings, metadata
 
-    metadata = [
-        {"text": chunk, "source": filename, "doc_type": doc_type, "chunk_id": i}
-        for i, chunk in enumerate(chunks)
-    ]
+def list_documents(root_dirs: Dict[str, str] = ROOT_DIRS) -> List[Tuple[str, str]]:
+    """Returns (path, doc_type) for every indexable file, in a stable order."""
+    documents = []
+    for folder, doc_type in root_dirs.items():
+        if not os.path.isdir(folder):
+            continue
+        for file in sorted(os.listdir(folder)):
+            if file.endswith(SUPPORTED_EXTENSIONS):
+                documents.append((os.path.join(folder, file), doc_type))
+    return documents
 
-    return embeddings, metadata
+class StageStats:
+    """Throughput counters for one indexing stage."""
 
-def build_faiss_index(all_embeddings: List[np.ndarray], save_path: str):
-    print("🔧 Building FAISS index...")
-    dimension = all_embeddings[0].shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    all_vectors = np.vstack(all_embeddings)
-    index.add(all_vectors)
-    faiss.write_index(index, save_path)
-    print(f"✅ FAISS index saved at: {save_path}")
-
-def save_metadata(metadata, save_path="data/embeddings/chunk_metadata.json"):
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=2)
-    print(f"✅ Metadata saved to: {save_path}")
-
-def run_indexing():
-    root_dirs = {
-        "data/policies/": "policy",
-        "data/contracts/": "contract",
-        "data/emails/": "email"
-    }
+    def __init__(self, name: str):
+        self.name = name
+        self.files = 0
+        self.chunks = 0
+        self.busy_seconds = 0.0
+
+    def add(self, files: int, chunks: int, seconds: float):
+        self.files += files
+        self.chunks += chunks
+        self.busy_seconds += seconds
 
+    def report(self, wall_seconds: float):
+        wall = max(wall_seconds, 1e-9)
+        print(
+            f"⏱️ {self.name}: {self.files} files, {self.chunks} chunks in {wall:.2f}s "
+            f"({self.files / wall:.2f} files/s, {self.chunks / wall:.1f} chunks/s, "
+            f"busy {self.busy_seconds:.2f}s)"
+        )
+
+def _extract_job(job: Tuple[str, str]) -> Tuple[List[Dict], float]:
+    path, doc_type = job
+    start = time.perf_counter()
+    metadata = extract_and_chunk(path, doc_type)
+    return metadata, time.perf_counter() - start
+
+def run_serial(documents: List[Tuple[str, str]]):
+    """Reference path: extract, chunk and embed one file at a time."""
     all_embeddings = []
     all_metadata = []
+    for path, doc_type in documents:
+        embeddings, metadata = process_file(path, doc_type)
+        if metadata:
+            all_embeddings.append(embeddings)
+            all_metadata.extend(metadata)
+    return all_embeddings, all_metadata
 
-    for folder, doc_type in root_dirs.items():
-        for file in os.listdir(folder):
-            if file.endswith(".pdf") or file.endswith(".docx"):
-                path = os.path.join(folder, file)
-                embeddings, metadata = process_file(path, doc_type)
-                if embeddings:
-                    all_embeddings.append(embeddings)
-                    all_metadata.extend(metadata)
-
-    if all_embeddings:
-        all_vectors = np.vstack(all_embeddings)
-        build_faiss_index(all_embeddings, Config.FAISS_INDEX_PATH)
-        save_metadata(all_metadata)
-        save_chunks_to_db(all_metadata, all_vectors)
-        print("✅ All embeddings and metadata saved.")
+def run_pipelined(documents: List[Tuple[str, str]],
+                  workers: int = Config.INDEX_WORKERS,
+                  batch_size: int = Config.INDEX_EMBED_BATCH_SIZE):
+    """
+    Extraction + chunking fan out over a process pool; a single embedding stage
+    in this process encodes chunks in large cross-document batches. Results are
+    consumed in document order, so metadata order matches `run_serial`.
+    """
+    extract_stats = StageStats("extract+chunk")
+    embed_stats = StageStats("embed")
+    all_embeddings = []
+    all_metadata = []
+    pending = []
+    pending_files = 0
+
+    def flush():
+        nonlocal pending_files
+        start = time.perf_counter()
+        vectors = embed_chunks([meta["text"] for meta in pending])
+        embed_stats.add(pending_files, len(pending), time.perf_counter() - start)
+        all_embeddings.append(vectors)
+        all_metadata.extend(pending)
+        pending.clear()
+        pending_files = 0
+
+    started = time.perf_counter()
+    extract_done = started
+    # spawn: workers must not inherit torch thread pools from the parent
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        for metadata, seconds in pool.map(_extract_job, documents):
+            extract_stats.add(1, len(metadata), seconds)
+            extract_done = time.perf_counter()
+            if metadata:
+                pending.extend(metadata)
+                pending_files += 1
+            if len(pending) >= batch_size:
+                flush()
+    if pending:
+        flush()
+
+    extract_stats.report(extract_done - started)
+    embed_stats.report(time.perf_counter() - started)
+    return all_embeddings, all_metadata
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(path: str = Config.INDEX_MANIFEST_PATH) -> Dict:
+    """
+    Manifest layout: {"version", "next_id", "ntotal", "files": {path: {"sha256", "source", "ids"}}}.
+    Vector IDs are positions in the metadata list, which only ever grows.
+    """
+    if not os.path.exists(path):
+        return {"version": 0, "next_id": 0, "ntotal": 0, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_tmp(path: str, writer) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    writer(tmp_path)
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    return tmp_path
+
+def _write_json(obj, **kwargs):
+    def writer(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, **kwargs)
+    return writer
+
+def build_faiss_index(all_embeddings: List[np.ndarray], start_id: int = 0):
+    print(f"🔧 Building FAISS index ({Config.FAISS_INDEX_TYPE})...")
+    all_vectors = np.vstack(all_embeddings)
+    return build_index(all_vectors, np.arange(start_id, start_id + len(all_vectors), dtype="int64"))
+
+def publish_index(index, metadata: List[Dict], manifest: Dict,
+                  stale_sources: Optional[List[str]], new_metadata: List[Dict], new_vectors):
+    """
+    Stage metadata, partitions, rules, index and manifest as temp files,
+    update `indexed_chunks` in one transaction, then rename into place.
+    The manifest goes last and marks the commit point; serving workers
+    watch it to hot-reload. Incremental updates only append IDs (tombstones
+    keep positions stable), but a full rebuild reassigns them, so readers
+    must take the index and metadata of one published version together
+    (the retriever checks both against the manifest).
+    """
+    manifest["version"] += 1
+    manifest["ntotal"] = int(index.ntotal)
+
+    metadata_tmp = _write_tmp(Config.CHUNK_METADATA_PATH,
+                              lambda tmp: write_chunk_store(metadata, tmp, manifest["version"]))
+    store = ChunkStore(metadata_tmp)
+    partitions = build_partitions(store)
+    rules = extract_rules(store)
+    store.close()
+    manifest["partitions"] = {key: len(ids) for key, ids in sorted(partitions.items())}
+    manifest["rules"] = len(rules)
+
+    staged = [
+        (metadata_tmp, Config.CHUNK_METADATA_PATH),
+        (_write_tmp(Config.PARTITIONS_PATH, lambda tmp: write_partitions(partitions, len(metadata), tmp)),
+         Config.PARTITIONS_PATH),
+        (_write_tmp(Config.RULE_INDEX_PATH, lambda tmp: write_rule_index(rules, len(metadata), tmp)),
+         Config.RULE_INDEX_PATH),
+        (_write_tmp(Config.FAISS_INDEX_PATH, lambda tmp: faiss.write_index(index, tmp)), Config.FAISS_INDEX_PATH),
+        (_write_tmp(Config.INDEX_MANIFEST_PATH, _write_json(manifest, indent=2)), Config.INDEX_MANIFEST_PATH),
+    ]
+
+    try:
+        replace_chunks_in_db(stale_sources, new_metadata, new_vectors)
+    except Exception:
+        for tmp_path, _ in staged:
+            os.remove(tmp_path)
+        raise
+
+    for tmp_path, final_path in staged:
+        os.replace(tmp_path, final_path)
+    print(f"✅ Published index version {manifest['version']} ({index.ntotal} vectors)")
+
+def _extract(documents: List[Tuple[str, str]], workers: int):
+    if not documents:
+        return [], []
+    if workers > 0:
+        return run_pipelined(documents, workers)
+    return run_serial(documents)
+
+def run_indexing(workers: int = Config.INDEX_WORKERS):
+    documents = list_documents()
+    all_embeddings, all_metadata = _extract(documents, workers)
+
+    if not all_embeddings:
+        print("⚠️ No chunks produced, nothing to index.")
+        return
+
+    all_vectors = np.vstack(all_embeddings)
+    index, index_params = build_faiss_index(all_embeddings)
+
+    manifest = load_manifest()
+    manifest.update({"next_id": len(all_metadata), "index_params": index_params, "files": {}})
+    ids_by_source = {}
+    for vector_id, meta in enumerate(all_metadata):
+        ids_by_source.setdefault(meta["source"], []).append(vector_id)
+    for path, _ in documents:
+        source = source_name(path)
+        manifest["files"][path] = {"sha256": file_sha256(path), "source": source, "ids": ids_by_source.get(source, [])}
+
+    publish_index(index, all_metadata, manifest, None, all_metadata, all_vectors)
+    print("✅ All embeddings and metadata saved.")
+
+def run_incremental_indexing(workers: int = Config.INDEX_WORKERS):
+    """
+    Re-index only new or changed files (by content hash) and drop chunks of
+    removed files. Falls back to a full build when no usable manifest exists.
+    """
+    manifest = load_manifest()
+    if not manifest["files"] or not os.path.exists(Config.FAISS_INDEX_PATH):
+        print("ℹ️ No manifest found, running a full build.")
+        return run_indexing(workers)
+
+    index = faiss.read_index(Config.FAISS_INDEX_PATH)
+    store = ChunkStore(Config.CHUNK_METADATA_PATH)
+    metadata = store.to_records()
+    store.close()
+    if index.ntotal != manifest["ntotal"] or len(metadata) != manifest["next_id"]:
+        print("⚠️ Index, metadata and manifest disagree, running a full build.")
+        return run_indexing(workers)
+    index_params = manifest.get("index_params", {})
+    if index_params.get("requested_type", index_params.get("type")) != Config.FAISS_INDEX_TYPE:
+        print(f"ℹ️ FAISS_INDEX_TYPE changed to {Config.FAISS_INDEX_TYPE}, running a full build.")
+        return run_indexing(workers)
+
+    documents = list_documents()
+    hashes = {path: file_sha256(path) for path, _ in documents}
+    changed = [(path, doc_type) for path, doc_type in documents
+               if manifest["files"].get(path, {}).get("sha256") != hashes[path]]
+    removed = [path for path in manifest["files"] if path not in hashes]
+
+    if not changed and not removed:
+        print("✅ Index is up to date.")
+        return
+
+    print(f"🔁 Incremental update: {len(changed)} new/changed, {len(removed)} removed")
+
+    stale = [path for path, _ in changed if path in manifest["files"]] + removed
+    # As recorded at indexing time: older manifests hold bare file names
+    stale_sources = sorted({manifest["files"][path]["source"] for path in stale})
+    stale_ids = [vector_id for path in stale for vector_id in manifest["files"][path]["ids"]]
+    if stale_ids and not supports_removal(index):
+        print("ℹ️ Index type cannot remove vectors, running a full build.")
+        return run_indexing(workers)
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype="int64"))
+        for vector_id in stale_ids:
+            tombstone = {key: metadata[vector_id][key] for key in ("source", "doc_type", "chunk_id")}
+            tombstone["deleted"] = True
+            metadata[vector_id] = tombstone
+    for path in removed:
+        del manifest["files"][path]
+
+    new_embeddings, new_metadata = _extract(changed, workers)
+    new_vectors = np.vstack(new_embeddings) if new_embeddings else np.empty((0, index.d), dtype="float32")
+
+    start_id = manifest["next_id"]
+    if len(new_metadata):
+        index.add_with_ids(new_vectors, np.arange(start_id, start_id + len(new_vectors), dtype="int64"))
+        metadata.extend(new_metadata)
+    manifest["next_id"] = start_id + len(new_metadata)
+
+    ids_by_source = {}
+    for offset, meta in enumerate(new_metadata):
+        ids_by_source.setdefault(meta["source"], []).append(start_id + offset)
+    for path, _ in changed:
+        source = source_name(path)
+        manifest["files"][path] = {"sha256": hashes[path], "source": source, "ids": ids_by_source.get(source, [])}
+
+    publish_index(index, metadata, manifest, stale_sources, new_metadata, new_vectors)
+
+def verify_pipeline(workers: int = Config.INDEX_WORKERS) -> bool:
+    """Checks that the pipelined indexer reproduces the serial output."""
+    documents = list_documents()
+    serial_embeddings, serial_metadata = run_serial(documents)
+    piped_embeddings, piped_metadata = run_pipelined(documents, max(workers, 1))
+
+    if serial_metadata != piped_metadata:
+        print("❌ Metadata differs between serial and pipelined indexing")
+        return False
+    if serial_metadata and not np.allclose(np.vstack(serial_embeddings), np.vstack(piped_embeddings), atol=1e-5):
+        print("❌ Embeddings differ between serial and pipelined indexing")
+        return False
+    print(f"✅ Pipelined output matches serial output ({len(serial_metadata)} chunks)")
+    return True
 
 if __name__ == "__main__":
-    run_indexing()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chunk, embed and index policy documents")
+    parser.add_argument("--workers", type=int, default=Config.INDEX_WORKERS, help="extraction processes (0 = serial)")
+    parser.add_argument("--incremental", action="store_true", help="only re-index new, changed or removed files")
+    parser.add_argument("--verify", action="store_true", help="compare pipelined output against the serial path")
+    args = parser.parse_args()
+
+    if args.verify:
+        verify_pipeline(args.workers)
+    elif args.incremental:
+        run_incremental_indexing(args.workers)
+    else:
+        run_indexing(args.workers)
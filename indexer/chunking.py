@@ -0,0 +1,149 @@
+"""
+Streaming extraction and clause-aware chunking. Documents are read one page
+(PDF) or paragraph (DOCX) at a time, grouped into clauses and packed into
+chunks of at most CHUNK_SIZE tokenizer tokens that end on clause (or, for an
+oversized clause, sentence) boundaries. Only the current page, clause and
+chunk are held in memory, whatever the length of the document.
+"""
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+from pdfplumber import open as pdf_open
+from docx import Document
+from config import Config
+
+# Lines that open a clause: "4.1.2 Waiting period", "12. Exclusions", "Section 3",
+# "Clause 7(b)", "(a) ...", "iv) ..." and all-caps headings. A wrapped line that
+# starts with a plain number ("30 days ...") is not a boundary.
+CLAUSE_START = re.compile(
+    r"^(?:\d{1,3}(?:\.\d{1,3})+\.?\s+\S"
+    r"|\d{1,3}\.\s+\S"
+    r"|(?i:section|clause|article|part|schedule|annexure|chapter)\s+[\dIVXLC]+\b"
+    r"|\(?(?:[a-z]|[ivx]{1,4})\)\s+\S"
+    r"|[A-Z][A-Z0-9 &,/()'-]{3,}$)"
+)
+# Sentence ends, but not inside clause numbers like "4.1.2" or "Rs. 5,000"
+SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+(?=[A-Z(\"'])")
+CHARS_PER_TOKEN = 4  # clauses longer than CHUNK_SIZE * this are cut at a line end while reading
+
+# (text, first page, last page)
+Clause = Tuple[str, int, int]
+
+# Loaded on first use, once per extraction process
+_tokenizer = None
+
+def get_chunk_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(Config.CHUNK_TOKENIZER)
+        tokenizer.model_max_length = 1 << 30  # only used for counting, never for model input
+        _tokenizer = tokenizer
+    return _tokenizer
+
+def iter_pdf_pages(file_path: str) -> Iterator[Tuple[int, str]]:
+    """Yields (page number, text); each page's layout objects are freed before the next is parsed."""
+    with pdf_open(file_path) as pdf:
+        for number, page in enumerate(pdf.pages, start=1):
+            text = page.extract_text() or ""
+            page.close()
+            yield number, text
+
+def iter_docx_pages(file_path: str) -> Iterator[Tuple[int, str]]:
+    """Yields (page number, paragraph text); pages advance at explicit and Word-rendered page breaks."""
+    page = 1
+    for para in Document(file_path).paragraphs:
+        yield page, para.text
+        page += len(para.rendered_page_breaks) + len(para._p.xpath("./w:r/w:br[@w:type='page']"))
+
+def iter_clauses(pages: Iterable[Tuple[int, str]], max_chars: int) -> Iterator[Clause]:
+    """
+    Groups lines into clauses running from one CLAUSE_START line to the next,
+    across page breaks. A clause that grows past `max_chars` is emitted early
+    at a line end so a document without numbering cannot pile up in memory.
+    """
+    lines, size, first_page, last_page = [], 0, 0, 0
+    for page, text in pages:
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if lines and (size > max_chars or CLAUSE_START.match(line)):
+                yield " ".join(lines), first_page, last_page
+                lines, size = [], 0
+            if not lines:
+                first_page = page
+            lines.append(line)
+            size += len(line) + 1
+            last_page = page
+    if lines:
+        yield " ".join(lines), first_page, last_page
+
+def count_tokens(tokenizer, text: str) -> int:
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+def split_oversized(text: str, tokenizer, max_tokens: int) -> List[Tuple[str, int]]:
+    """(piece, tokens) for the sentences of `text`; a sentence over `max_tokens` is cut at token offsets."""
+    pieces = []
+    for sentence in SENTENCE_END.split(text):
+        offsets = tokenizer(sentence, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        for i in range(0, len(offsets), max_tokens):
+            window = offsets[i:i + max_tokens]
+            pieces.append((sentence[window[0][0]:window[-1][1]], len(window)))
+    return pieces
+
+def carry_overlap(buffer: List[Tuple], tokenizer, overlap: int) -> Tuple[List[Tuple], int]:
+    """Trailing pieces of a finished chunk worth up to `overlap` tokens: whole clauses, else whole sentences."""
+    kept, kept_size = [], 0
+    for text, tokens, first_page, last_page in reversed(buffer):
+        if kept_size + tokens <= overlap:
+            kept.insert(0, (text, tokens, first_page, last_page))
+            kept_size += tokens
+            continue
+        for sentence in reversed(SENTENCE_END.split(text)):
+            sentence_tokens = count_tokens(tokenizer, sentence)
+            if kept_size + sentence_tokens > overlap:
+                break
+            kept.insert(0, (sentence, sentence_tokens, last_page, last_page))
+            kept_size += sentence_tokens
+        break
+    return kept, kept_size
+
+def chunk_clauses(clauses: Iterable[Clause], tokenizer, max_tokens: int = Config.CHUNK_SIZE,
+                  overlap: int = Config.OVERLAP_SIZE) -> Iterator[Dict]:
+    """
+    Packs clauses greedily into chunks of at most `max_tokens` tokens, breaking
+    only between clauses, or between sentences of a clause too long for one
+    chunk. Each chunk starts with the tail of the previous one, up to
+    `overlap` tokens of whole clauses or sentences.
+    Yields {"text", "page_start", "page_end"}.
+    """
+    buffer, size, carried = [], 0, 0  # buffer: (text, tokens, first page, last page)
+
+    def emit() -> Dict:
+        return {"text": " ".join(piece[0] for piece in buffer),
+                "page_start": buffer[0][2], "page_end": max(piece[3] for piece in buffer)}
+
+    for text, first_page, last_page in clauses:
+        tokens = count_tokens(tokenizer, text)
+        if tokens <= max_tokens:
+            pieces = [(text, tokens)]
+        else:
+            pieces = split_oversized(text, tokenizer, max_tokens)
+        for piece, piece_tokens in pieces:
+            if buffer and size + piece_tokens > max_tokens:
+                yield emit()
+                kept, kept_size = carry_overlap(buffer, tokenizer, overlap)
+                if kept_size + piece_tokens > max_tokens:
+                    kept, kept_size = [], 0
+                buffer, size, carried = kept, kept_size, len(kept)
+            buffer.append((piece, piece_tokens, first_page, last_page))
+            size += piece_tokens
+    if len(buffer) > carried:
+        yield emit()
+
+def iter_document_chunks(file_path: str, max_tokens: int = Config.CHUNK_SIZE,
+                         overlap: int = Config.OVERLAP_SIZE) -> Iterator[Dict]:
+    """Chunks of a .pdf or .docx file, in document order."""
+    pages = iter_pdf_pages(file_path) if file_path.endswith(".pdf") else iter_docx_pages(file_path)
+    clauses = iter_clauses(pages, max_tokens * CHARS_PER_TOKEN)
+    return chunk_clauses(clauses, get_chunk_tokenizer(), max_tokens, overlap)